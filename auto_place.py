@@ -0,0 +1,176 @@
+import math
+
+import numpy as np
+
+import cadence_to_visio_V2 as c2v
+
+# === 自动布局 ===
+# 网表里有、inst_info.txt 里没有的器件，按连接关系算出坐标和方向。
+# 解析式力导向（SimPL 风格），每轮迭代都是向量化的 O(n log n)：
+#   吸引：每个器件移向其所在网络重心的平均位置（星形模型，Jacobi 迭代）；
+#   排斥：按 x 排序切列、列内按 y 排序，得到保持相对顺序的均匀网格作为锚点，
+#         锚点权重逐轮加大，把器件逐步摊开；
+# 最后对齐到 PITCH 网格并避开已有（固定）器件占用的格子。
+# 已在 inst_info.txt 中的器件位置不变，只作为吸引的固定端点。
+
+ITERATIONS     = 40
+PITCH          = 1.25  # 自动布局的器件间距（版图单位，与示例 inst_info 的间距相当）
+MAX_NET_DEGREE = 32    # 扇出更大的网络（电源/地、使能等）不参与吸引，否则所有器件会被拉成一团
+SEED           = 0
+
+
+def _incidence(netlist, index):
+    skip = {n.upper() for n in c2v.BUS_NETS} | {n.upper() for n in c2v.EXCLUDED_NETS}
+    net_ids = {}
+    pdev, pnet, gate = [], [], []
+    for dev in netlist:
+        i = index.get(dev["name"])
+        if i is None:
+            continue
+        for pin, net in dev["pins"].items():
+            if pin.upper() in c2v.EXCLUDED_PINS or net.upper() in skip:
+                continue
+            pdev.append(i)
+            pnet.append(net_ids.setdefault(net, len(net_ids)))
+            gate.append(pin == "G")
+    pdev = np.array(pdev, dtype=np.int64)
+    pnet = np.array(pnet, dtype=np.int64)
+    gate = np.array(gate, dtype=bool)
+
+    # 去掉单引脚网络和超大扇出网络
+    ndeg = np.bincount(pnet, minlength=len(net_ids))
+    keep = (ndeg[pnet] >= 2) & (ndeg[pnet] <= MAX_NET_DEGREE)
+    return pdev[keep], pnet[keep], gate[keep], len(net_ids)
+
+
+def _net_centroids(pos, pdev, pnet, n_nets):
+    ndeg = np.maximum(np.bincount(pnet, minlength=n_nets), 1)
+    cx = np.bincount(pnet, weights=pos[pdev, 0], minlength=n_nets) / ndeg
+    cy = np.bincount(pnet, weights=pos[pdev, 1], minlength=n_nets) / ndeg
+    return cx, cy
+
+
+def _rank_spread(p, pitch):
+    """把点集摊成 cols × rows 的均匀网格，保持 x 次序和列内 y 次序"""
+    n = len(p)
+    cols = max(1, int(math.ceil(math.sqrt(n))))
+    rows = int(math.ceil(n / cols))
+    col = np.empty(n, dtype=np.int64)
+    col[np.argsort(p[:, 0], kind="stable")] = np.arange(n) // rows
+    row = np.empty(n, dtype=np.int64)
+    row[np.lexsort((p[:, 1], col))] = np.arange(n) % rows
+    center = p.mean(axis=0)
+    out = np.empty_like(p)
+    out[:, 0] = center[0] + (col - (cols - 1) / 2.0) * pitch
+    out[:, 1] = center[1] + (row - (rows - 1) / 2.0) * pitch
+    return out
+
+
+def _free_end(links, slot):
+    # 沿 links 走到这一行里第一个空格子（并查集找根，顺带路径压缩）
+    end = slot
+    while end in links:
+        end = links[end]
+    while slot != end:
+        links[slot], slot = end, links[slot]
+    return end
+
+
+def _legalize(desired, fixed_xy, pitch):
+    # 占用的格子 (sx, sy) 在 right / left 里指向同一行右边 / 左边的邻格，
+    # 某一行里离 sx 最近的空格子就是两个方向上的根，不用逐圈扫描
+    right, left = {}, {}
+
+    def occupy(sx, sy):
+        right[(sx, sy)] = (sx + 1, sy)
+        left[(sx, sy)] = (sx - 1, sy)
+
+    # 固定器件占用离它最近的格子（跨格时占用相邻的几个）
+    for x, y in fixed_xy:
+        for sx in {math.floor(x / pitch), math.ceil(x / pitch)}:
+            for sy in {math.floor(y / pitch), math.ceil(y / pitch)}:
+                if abs(sx * pitch - x) < 0.75 * pitch and abs(sy * pitch - y) < 0.75 * pitch:
+                    occupy(sx, sy)
+
+    slots = np.rint(desired / pitch).astype(np.int64)
+    out = []
+    for (sx, sy), (dx, dy) in zip(slots.tolist(), (desired / pitch).tolist()):
+        best = (sx, sy)
+        if best in right:
+            # 由近及远逐行找最近的空格子，行距已超过当前最优距离时停止
+            best, best_d2, k = None, math.inf, 0
+            while best is None or (k - 0.5) ** 2 < best_d2:
+                for y in {sy + k, sy - k}:
+                    for cx, _ in (_free_end(right, (sx, y)), _free_end(left, (sx, y))):
+                        d2 = (cx - dx) ** 2 + (y - dy) ** 2
+                        if d2 < best_d2:
+                            best, best_d2 = (cx, y), d2
+                k += 1
+        occupy(*best)
+        out.append((best[0] * pitch, best[1] * pitch))
+    return out
+
+
+def auto_place(instances, netlist, iterations=None, seed=SEED):
+    """返回补全了缺失器件的新 instances 字典（坐标为 DBU 整数）"""
+    missing = []
+    seen = set(instances)
+    for dev in netlist:
+        if dev["name"] not in seen:
+            seen.add(dev["name"])
+            missing.append(dev)
+    if not missing:
+        return instances
+
+    names = list(instances) + [dev["name"] for dev in missing]
+    index = {name: i for i, name in enumerate(names)}
+    n_fixed, n = len(instances), len(names)
+    free = np.arange(n_fixed, n)
+    pitch = c2v.to_dbu(PITCH * c2v.SCALE)
+    rng = np.random.default_rng(seed)
+
+    pos = np.zeros((n, 2))
+    if n_fixed:
+        pos[:n_fixed] = np.array([inst["xy"] for inst in instances.values()], dtype=float)
+        center = pos[:n_fixed].mean(axis=0)
+    else:
+        center = np.zeros(2)
+    spread = math.sqrt(len(free)) * pitch
+    pos[free] = center + rng.uniform(-spread / 2, spread / 2, size=(len(free), 2))
+
+    pdev, pnet, gate, n_nets = _incidence(netlist, index)
+    ddeg = np.bincount(pdev, minlength=n).astype(float)
+    anchor = pos[free].copy()
+    iterations = iterations or ITERATIONS
+    for it in range(iterations):
+        # 吸引：移向所在网络重心的平均值；锚点权重逐轮加大
+        cx, cy = _net_centroids(pos, pdev, pnet, n_nets)
+        tx = np.bincount(pdev, weights=cx[pnet], minlength=n)
+        ty = np.bincount(pdev, weights=cy[pnet], minlength=n)
+        w = 0.05 * (1.25 ** it)
+        d = ddeg[free]
+        pos[free, 0] = (tx[free] + w * anchor[:, 0]) / (d + w)
+        pos[free, 1] = (ty[free] + w * anchor[:, 1]) / (d + w)
+        # 排斥：均匀摊开
+        anchor = _rank_spread(pos[free], pitch)
+
+    placed = _legalize(anchor, pos[:n_fixed].tolist(), pitch)
+
+    # 方向：MOS 栅极朝向栅极网络的重心（R0 栅极在左，MY 栅极在右）
+    pos[free] = placed
+    cx, _ = _net_centroids(pos, pdev, pnet, n_nets)
+    gate_dx = np.zeros(n)
+    np.add.at(gate_dx, pdev[gate], cx[pnet[gate]] - pos[pdev[gate], 0])
+
+    result = dict(instances)
+    for k, dev in enumerate(missing):
+        i = n_fixed + k
+        x, y = placed[k]
+        orient = "MY" if dev["type"] in ("NMOS", "PMOS") and gate_dx[i] > 0 else "R0"
+        result[dev["name"]] = {
+            "name": dev["name"],
+            "type": dev["type"],
+            "xy": (int(x), int(y)),
+            "orient": orient,
+        }
+    return result
@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import cadence_to_visio_V2 as c2v
+import drawing_plan
+
+# === 批量转换 ===
+# 输入可以是：
+#   - 清单文件：.json（[{"cell", "netlist", "inst_info"}, ...]）
+#     或文本（每行 "cell netlist inst_info"，# 开头为注释），相对路径以清单所在目录为准；
+#   - 目录：每个子目录是一个 cell，里面放 netlist.txt 和 inst_info.txt（也可以是 .gz / .xz / .zst）。
+# 各 cell 在进程池里解析 + 布线。默认每个 cell 写出一份绘图计划（不需要 Visio）；
+# 加 --visio / --stub 时，计划在主进程里依次回放到同一个 Visio 会话并另存为文档。
+# 结束时打印每个 cell 的耗时和失败原因。
+# 工作进程异常退出（内存不足、解析器崩溃）会让整个进程池作废，见 compute_cells。
+
+
+def _find_input(d, filename):
+    # 解析器会自动识别压缩格式，这里只负责找到文件
+    for ext in ("", ".gz", ".xz", ".zst"):
+        path = os.path.join(d, os.path.basename(filename) + ext)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def load_jobs(source):
+    if os.path.isdir(source):
+        jobs = []
+        for cell in sorted(os.listdir(source)):
+            d = os.path.join(source, cell)
+            netlist = _find_input(d, c2v.NETLIST_FILE)
+            inst_info = _find_input(d, c2v.INPUT_FILE)
+            if netlist and inst_info:
+                jobs.append({"cell": cell, "netlist": netlist, "inst_info": inst_info})
+        return jobs
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        if source.endswith(".json"):
+            jobs = json.load(f)
+        else:
+            jobs = []
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                cell, netlist, inst_info = line.split()[:3]
+                jobs.append({"cell": cell, "netlist": netlist, "inst_info": inst_info})
+    for job in jobs:
+        job["netlist"] = os.path.join(base, job["netlist"])
+        job["inst_info"] = os.path.join(base, job["inst_info"])
+    return jobs
+
+
+# === 进程池里执行：解析 + 布线 ===
+def compute_cell(job, out_dir=None):
+    result = {"cell": job["cell"], "ok": False, "parse": 0.0, "route": 0.0, "render": 0.0}
+    try:
+        t0 = time.perf_counter()
+        instances = c2v.parse_instances(job["inst_info"])
+        netlist = c2v.parse_netlist(job["netlist"])
+        t1 = time.perf_counter()
+        plan = drawing_plan.build_plan(instances, netlist)
+        t2 = time.perf_counter()
+        result.update(parse=t1 - t0, route=t2 - t1,
+                      devices=len(plan["devices"]["name"]), wires=len(plan["wires"]["net"]))
+        if out_dir:
+            # 只回传耗时，计划直接落盘，避免大对象在进程间来回拷贝
+            drawing_plan.save_plan(plan, os.path.join(out_dir, f"{job['cell']}.plan.json.gz"))
+        else:
+            result["plan"] = plan
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+    return result
+
+
+def compute_cells(jobs, out_dir=None, workers=None):
+    """按完成顺序逐个产出 compute_cell 的结果。
+    进程池作废时还没完成的 cell 都拿不到结果，也不知道是哪个 cell 让进程退出的：
+    把它们逐个放进单独的进程重跑，正常的照常完成，再次崩溃的记为失败"""
+    broken = []
+    with ProcessPoolExecutor(workers) as pool:
+        futs = {pool.submit(compute_cell, job, out_dir): job for job in jobs}
+        for fut in as_completed(futs):
+            try:
+                yield fut.result()
+            except BrokenProcessPool:
+                broken.append(futs[fut])
+    if broken:
+        print(f"⚠️  工作进程异常退出，{len(broken)} 个 cell 逐个重跑")
+    for job in broken:
+        with ProcessPoolExecutor(1) as pool:
+            try:
+                yield pool.submit(compute_cell, job, out_dir).result()
+            except BrokenProcessPool as e:
+                yield {"cell": job["cell"], "ok": False, "parse": 0.0, "route": 0.0, "render": 0.0,
+                       "error": f"{type(e).__name__}: {e}"}
+
+
+def run_batch(jobs, out_dir, workers=None, backend=None, stencil=None):
+    os.makedirs(out_dir, exist_ok=True)
+    render = backend is not None
+    visio = masters = None
+    if render:
+        visio = c2v.open_visio(backend)
+        masters = c2v.load_masters(visio, stencil)
+
+    results = []
+    for result in compute_cells(jobs, None if render else out_dir, workers):
+        if render and result["ok"]:
+            # 共享的 Visio 会话只能串行使用
+            t0 = time.perf_counter()
+            try:
+                doc = visio.Documents.Add("")
+                drawing_plan.replay_plan(doc.Pages(1), result["plan"], masters)
+                doc.SaveAs(os.path.abspath(os.path.join(out_dir, f"{result['cell']}.vsdx")))
+                doc.Close()
+            except Exception as e:
+                result["ok"] = False
+                result["error"] = f"{type(e).__name__}: {e}"
+                result["traceback"] = traceback.format_exc()
+            result["render"] = time.perf_counter() - t0
+        result.pop("plan", None)
+        results.append(result)
+        print(f"{'✅' if result['ok'] else '❌'} {result['cell']}")
+    order = {job["cell"]: i for i, job in enumerate(jobs)}
+    results.sort(key=lambda r: order[r["cell"]])
+    return results
+
+
+def print_summary(results):
+    print(f"\n{'cell':<24}{'状态':<6}{'parse(s)':>10}{'route(s)':>10}{'render(s)':>11}{'器件':>8}  错误")
+    for r in results:
+        print(f"{r['cell']:<24}{'OK' if r['ok'] else 'FAIL':<8}{r['parse']:>10.3f}{r['route']:>10.3f}"
+              f"{r['render']:>11.3f}{r.get('devices', 0):>10}  {r.get('error', '')}")
+    failed = sum(not r["ok"] for r in results)
+    total = sum(r["parse"] + r["route"] + r["render"] for r in results)
+    print(f"\n共 {len(results)} 个 cell，失败 {failed} 个，累计耗时 {total:.3f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="批量转换多个 cell")
+    ap.add_argument("source", help="清单文件（.json / 文本）或目录")
+    ap.add_argument("-o", "--out-dir", default="batch_out")
+    ap.add_argument("-j", "--workers", type=int, default=None)
+    ap.add_argument("--visio", action="store_true", help="回放到同一个 Visio 会话并保存 .vsdx")
+    ap.add_argument("--stub", action="store_true", help="回放到本地替身（调试用）")
+    ap.add_argument("--stencil", default=None)
+    ap.add_argument("--summary", default=None, help="把汇总写成 JSON")
+    args = ap.parse_args()
+
+    backend = "stub" if args.stub else ("visio" if args.visio else None)
+    t0 = time.perf_counter()
+    results = run_batch(load_jobs(args.source), args.out_dir, args.workers, backend, args.stencil)
+    print_summary(results)
+    print(f"⏱️  总用时 {time.perf_counter() - t0:.3f}s")
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+    if any(not r["ok"] for r in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
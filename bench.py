@@ -0,0 +1,216 @@
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import lzma
+import os
+import platform
+import tempfile
+import time
+
+import cadence_to_visio_V2 as c2v
+import gen_design
+from visio_stub import NullApplication, StubApplication
+
+# === 基准测试 ===
+# 用 gen_design 生成 10²/10⁴/10⁶ 规模的合成设计，分阶段计时
+# （parse_instances / parse_netlist / auto_place / placement / collect / route / draw），
+# 绘制阶段跑在空渲染器或记录型替身上，不需要 Visio。
+# --save-baseline 保存结果，之后的运行与基线比较，任一阶段变慢超过 THRESHOLD 即报回退。
+# --compress gz,xz,zst 另外计时两个解析器读压缩输入（parse_netlist.gz 等），与纯文本对比吞吐。
+# --missing 0.1 让 inst_info.txt 漏掉一成器件，auto_place 阶段计时自动布局补坐标。
+# --route-workers 1,2,4 另外按进程数分别计时布线阶段（route.w2 等），打印相对单进程的加速比；
+# 只有迷宫布线会分给多个进程，配合 --maze 使用。
+
+SIZES       = (100, 10_000, 1_000_000)
+THRESHOLD   = 1.25   # 比基线慢 25% 以上视为回退
+MIN_SECONDS = 0.005  # 太短的阶段噪声大，不参与比较
+BASELINE    = r"bench_baseline.json"
+
+RENDERERS = {"null": NullApplication, "stub": StubApplication}
+
+
+def _zstd_compress(data):
+    import zstandard  # 可选依赖，只有 --compress zst 时才需要
+    return zstandard.ZstdCompressor().compress(data)
+
+
+COMPRESSORS = {"gz": gzip.compress, "xz": lzma.compress, "zst": _zstd_compress}
+
+
+def _timed(stages, name, fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    stages[name] = time.perf_counter() - t0
+    return result
+
+
+def bench_design(inst_path, net_path, renderer="null", workers=None, parse_workers=None):
+    stages = {}
+    instances = _timed(stages, "parse_instances", c2v.parse_instances, inst_path)
+    netlist = _timed(stages, "parse_netlist", c2v.parse_netlist, net_path, parse_workers)
+    instances = _timed(stages, "auto_place", c2v.complete_placement, instances, netlist)
+    pin_positions, bboxes = _timed(stages, "placement", c2v.compute_placement, instances)
+    buses = c2v.plan_buses(bboxes)
+    bus_nets = frozenset(bus["net"] for bus in buses)
+    net_to_points = _timed(stages, "collect", c2v.collect_net_points, netlist, pin_positions)
+    routed_nets = _timed(stages, "route", c2v.route_all_nets, net_to_points, bus_nets, workers,
+                         None, c2v.route_obstacles(bboxes))
+
+    app = RENDERERS[renderer]()
+    doc = app.Documents.Add("")
+    page = doc.Pages(1)
+    masters = c2v.load_masters(app)
+
+    def draw():
+        shapes_map = c2v.place_devices(page, instances, masters, bboxes)
+        bus_lines = c2v.draw_buses(page, buses)
+        for routed in routed_nets:
+            c2v.draw_routed_net(page, routed, shapes_map, bus_lines)
+
+    _timed(stages, "draw", draw)
+    stages["total"] = sum(stages.values())
+    return stages
+
+
+def compressed_copy(path, fmt):
+    out = f"{path}.{fmt}"
+    if not os.path.exists(out):
+        with open(path, "rb") as f:
+            data = COMPRESSORS[fmt](f.read())
+        with open(out, "wb") as f:
+            f.write(data)
+    return out
+
+
+def bench_compressed(inst_path, net_path, formats):
+    """两个解析器读各压缩格式的耗时；内容和纯文本相同，可以直接和 parse_* 阶段比较"""
+    stages = {}
+    for fmt in formats:
+        _timed(stages, f"parse_instances.{fmt}", c2v.parse_instances, compressed_copy(inst_path, fmt))
+        _timed(stages, f"parse_netlist.{fmt}", c2v.parse_netlist, compressed_copy(net_path, fmt))
+    return stages
+
+
+def bench_route_scaling(inst_path, net_path, worker_counts):
+    """布线阶段按进程数分别计时；结果与进程数无关，只比较耗时"""
+    netlist = c2v.parse_netlist(net_path)
+    instances = c2v.complete_placement(c2v.parse_instances(inst_path), netlist)
+    pin_positions, bboxes = c2v.compute_placement(instances)
+    bus_nets = frozenset(bus["net"] for bus in c2v.plan_buses(bboxes))
+    net_to_points = c2v.collect_net_points(netlist, pin_positions)
+    config = c2v.route_config()
+    obstacles = c2v.route_obstacles(bboxes, config)
+    stages = {}
+    for workers in worker_counts:
+        _timed(stages, f"route.w{workers}", c2v.route_all_nets, net_to_points, bus_nets, workers, config, obstacles)
+    return stages
+
+
+def speedup(stages):
+    base = stages.get("route.w1")
+    return {k: base / v for k, v in stages.items() if base and k.startswith("route.w") and v > 0}
+
+
+def throughput(stages, inst_path, net_path):
+    """按解压后的字节数算 MB/s"""
+    size = {"parse_instances": os.path.getsize(inst_path), "parse_netlist": os.path.getsize(net_path)}
+    return {k: size[k.split(".")[0]] / v / 1e6 for k, v in stages.items()
+            if k.split(".")[0] in size and v > 0}
+
+
+def run(sizes, seed=0, renderer="null", repeat=1, data_dir=None, workers=None, formats=(), parse_workers=None,
+        missing=0.0, route_workers=()):
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), "c2v_bench")
+    results = {}
+    for n in sizes:
+        d = os.path.join(data_dir, f"{n}_{seed}" + (f"_m{missing:g}" if missing else ""))
+        inst_path = os.path.join(d, "inst_info.txt")
+        net_path = os.path.join(d, "netlist.txt")
+        if not (os.path.exists(inst_path) and os.path.exists(net_path)):
+            print(f"… 生成 {n} 个器件的合成设计")
+            gen_design.write_design(d, n, seed, missing=missing)
+        best = None
+        for _ in range(repeat):
+            with contextlib.redirect_stdout(io.StringIO()):
+                stages = bench_design(inst_path, net_path, renderer, workers, parse_workers)
+                stages.update(bench_compressed(inst_path, net_path, formats))
+                stages.update(bench_route_scaling(inst_path, net_path, route_workers))
+            best = stages if best is None else {k: min(v, stages[k]) for k, v in best.items()}
+        results[str(n)] = best
+        print(f"{n:>9} 器件  " + "  ".join(f"{k}={v:.3f}s" for k, v in best.items()))
+        if formats:
+            print(" " * 16 + "  ".join(f"{k}={v:.1f}MB/s"
+                                       for k, v in throughput(best, inst_path, net_path).items()))
+        if route_workers:
+            print(" " * 16 + "  ".join(f"{k}=×{v:.2f}" for k, v in speedup(best).items()))
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    regressions = []
+    for n, stages in results.items():
+        base = baseline.get(n)
+        if not base:
+            continue
+        for stage, t in stages.items():
+            b = base.get(stage)
+            if b is None or max(t, b) < MIN_SECONDS:
+                continue
+            if t > b * threshold:
+                regressions.append((n, stage, b, t))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="分阶段基准测试")
+    ap.add_argument("--sizes", default=",".join(map(str, SIZES)), help="逗号分隔的器件数")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--renderer", choices=sorted(RENDERERS), default="null")
+    ap.add_argument("--repeat", type=int, default=1, help="每个规模重复次数，取各阶段最小值")
+    ap.add_argument("--workers", type=int, default=None, help="布线进程数")
+    ap.add_argument("--parse-workers", type=int, default=None, help="网表解析进程数")
+    ap.add_argument("--data-dir", default=None, help="合成设计缓存目录")
+    ap.add_argument("--compress", default="", help="另外计时读压缩输入，逗号分隔：gz,xz,zst")
+    ap.add_argument("--missing", type=float, default=0.0, help="inst_info.txt 里漏掉的器件比例（测自动布局）")
+    ap.add_argument("--route-workers", default="", help="另外按这些进程数计时布线，逗号分隔：1,2,4")
+    ap.add_argument("--maze", action="store_true", help="用迷宫布线（只有它会分给多个进程）")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = ap.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    formats = [f for f in args.compress.split(",") if f]
+    route_workers = [int(w) for w in args.route_workers.split(",") if w]
+    c2v.MAZE_ROUTE = args.maze or c2v.MAZE_ROUTE
+    results = run(sizes, args.seed, args.renderer, args.repeat, args.data_dir, args.workers, formats,
+                  args.parse_workers, args.missing, route_workers)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"machine": platform.node(), "python": platform.python_version(),
+                       "renderer": args.renderer, "results": results}, f, indent=1)
+        print(f"💾 基线已保存: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"（没有基线 {args.baseline}，用 --save-baseline 生成）")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("renderer") != args.renderer:
+        print(f"⚠️  基线使用的渲染器是 {baseline.get('renderer')}，本次是 {args.renderer}，draw 阶段不可比")
+    regressions = compare(results, baseline["results"], args.threshold)
+    if not regressions:
+        print("✅ 没有发现性能回退")
+        return
+    print("❌ 性能回退：")
+    for n, stage, b, t in regressions:
+        print(f"  {n:>9} 器件  {stage:<16} {b:.3f}s -> {t:.3f}s  (×{t / b:.2f})")
+    raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
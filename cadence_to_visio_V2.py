@@ -1,12 +1,50 @@
+import io
+import os
 import re
-import win32com.client
+import sys
 import math
+import json
+import heapq
+import bisect
+import gc
+import hashlib
+import pickle
+import time
+from array import array
+from contextlib import nullcontext
+
+import instrument
 
 # === 配置 ===
 INPUT_FILE   = r"inst_info.txt"
 NETLIST_FILE = r"netlist.txt"
 STENCIL      = r"circuit.vss"  #这里要写circuit.vss的绝对路径，模具只能用这个
 SCALE        = 1  # 坐标缩放倍数
+DBU          = 1600  # 每个绘图单位的 DBU 数：Cadence 原理图 160 DBU/英寸 的 10 倍，1/16 网格坐标可精确表示
+BACKEND      = "visio"  # "visio" = 真实 Visio；"stub" = 本地替身（visio_stub.py），无需 Visio
+ROUTE_WORKERS = 1       # 布线进程数，1 = 串行；只在迷宫布线时分给多个进程，大设计可设为 os.cpu_count()
+PARSE_WORKERS = 1       # 网表解析进程数，1 = 串行；多 GB 的展平网表可设为 os.cpu_count()
+MERGE_WIRES  = True     # 同一网络中共线、相接的直线段合并成一条折线，只在真正的端点 Glue
+DRAFT        = False    # 草稿模式：不 Glue、斜线预先折成直角、样式走共享 Visio 样式、不写标签格式
+MAZE_ROUTE   = False    # 斜线用内置迷宫布线器绕开器件，画成固定的直角折线，不再交给 Visio 的连接线重排；纯 Python 计算，比只画虚线慢得多，见 README
+MAZE_PITCH   = DBU // 8 # 迷宫布线的网格间距（1/8 英寸）
+MAZE_EFFORT  = 20000    # 每个网络最多扩展的网格点数，超出后剩下的斜线仍按虚线交给 Visio
+ROUTE_CACHE  = None     # 布线结果缓存文件（sqlite），如 r"route_cache.db"；只在迷宫布线时使用，重跑时没变的网络直接取结果。None = 不缓存
+ROUTE_CACHE_ENTRIES = 1_000_000  # 缓存最多保留的网络数，超出按最久未用淘汰
+ROUTE_CACHE_MB      = 512        # 缓存文件里布线结果的总大小上限（MB）
+AUTO_PLACE   = True     # inst_info.txt 缺少的器件按连接关系自动布局（需要 numpy）
+PROFILE      = False    # 打印各阶段耗时与 COM 调用统计
+TRACE_FILE   = r"trace.json"  # PROFILE 时导出的 Chrome trace / Perfetto 文件
+SHOW_PARAMS  = False    # 器件标签后面附上尺寸参数（格式见 PARAM_LABELS）
+GENERATE_SYMBOLS = True  # 不在 DEVICE_LIBRARY 里的器件按引脚名生成方框符号，同样引脚的器件共用一个文档 master
+USE_LAYERS   = True     # 器件 / 标签 / 各总线 / 实线 / 虚线分图层，显示、锁定、改色只需写一次图层单元格
+VERIFY       = False    # 画完后回读 Glue 关系并与网表比对
+VERIFY_FILE  = r"verify.json"  # VERIFY 时写出的差异
+CONE_SEEDS   = []       # 只画这些网络 / 器件附近的电路，如 ["VWL2V", "NM1"]；空 = 整个设计
+CONE_HOPS    = 2        # 从种子向外扩展的跳数（网络 -> 器件算一跳）
+CONE_STOP_AT_SUPPLY = True  # 不经过电源 / 地网络向外扩展，否则一跳就覆盖整个设计
+WINDOW       = None     # 只画版图坐标窗口 (x1, y1, x2, y2) 内的器件（inst_info 的坐标单位）；None = 整个设计
+WINDOW_GRID  = 5.0      # 窗口查询用的空间索引格子边长（同上单位）
 
 # 不参与连线的网络与引脚
 EXCLUDED_NETS = {}
@@ -32,6 +70,33 @@ BUS_NETS = {
     }
 }
 
+# === 连线样式 ===
+WIRE_STYLES = {
+    "straight": {"RouteStyle": "16", "LinePattern": "1"},  # Straight，实线
+    "dashed":   {"RouteStyle": "64", "LinePattern": "2"},  # Orthogonal，虚线
+}
+
+# === 图层 ===
+LAYER_NAMES = {
+    "devices":  "Devices",
+    "labels":   "Labels",       # 标注形状，如视口裁剪的引出短线（器件标签是器件自身的文字，随器件图层）
+    "straight": "Wires",
+    "dashed":   "Dashed wires",
+}
+BUS_LAYER = "Bus {net}"  # BUS_NETS 里每个启用的总线网络一层（总线 + 引到总线的竖线）
+
+# 草稿模式下连线只套用这两个文档样式（每条线一次写入），样式内容取自 WIRE_STYLES
+DRAFT_STYLES = {"straight": "c2v_wire", "dashed": "c2v_wire_dashed"}
+
+# === 标签里的参数 ===
+# 按器件类型的模板，字段取网表里的原始写法（w/l/r/c/...）；mr 不为 1 时追加 ×mr
+PARAM_LABELS = {
+    "NMOS": "{w}/{l}",
+    "PMOS": "{w}/{l}",
+    "RES":  "{r}",
+    "Cap":  "{c}",
+}
+
 # === 统一的器件库 ===
 DEVICE_LIBRARY = {
     "NMOS": {
@@ -81,6 +146,7 @@ DEVICE_LIBRARY = {
         }
     },
     # === 新增 Unknown 器件 ===
+    # 匹配不上前缀的器件（标准单元、IP 等）在 GENERATE_SYMBOLS 时按引脚自动生成方框符号，见 box_symbol
     # "UNKNOWN": {
     #     "inst_prefix": [],
     #     "netlist_prefix": [],
@@ -97,89 +163,517 @@ DEVICE_LIBRARY = {
     # 以后你可以自己加新器件
 }
 
-def match_device_type(name, from_netlist=False):
+# === 整数坐标网格 ===
+# 所有几何量在读入时吸附到整数 DBU 网格，比较/哈希/排序都是精确的整数运算；
+# 只在交给 Visio 时才换算回绘图单位（英寸）。
+def to_dbu(v):
+    return int(round(v * DBU))
+
+def from_dbu(v):
+    return v / DBU
+
+
+def prefix_table(from_netlist=False):
     candidates = []
     for dev_type, cfg in DEVICE_LIBRARY.items():
         prefixes = cfg["netlist_prefix"] if from_netlist else cfg["inst_prefix"]
         for p in prefixes:
-            candidates.append((len(p), p, dev_type))
+            candidates.append((len(p), p.upper(), dev_type))
     # 按前缀长度从大到小排序
-    for _, p, dev_type in sorted(candidates, key=lambda x: -x[0]):
-        if name.upper().startswith(p.upper()):
+    return [(p, dev_type) for _, p, dev_type in sorted(candidates, key=lambda x: -x[0])]
+
+
+def match_device_type(name, from_netlist=False, table=None):
+    # 大文件逐行匹配时由调用方传入 prefix_table()，避免每行重新排序
+    name = name.upper()
+    for p, dev_type in table or prefix_table(from_netlist):
+        if name.startswith(p):
             return dev_type
     return "UNKNOWN"
 
 
+# === 器件参数（SI 后缀数值） ===
+# SPICE 写法，不区分大小写：M 是 milli，MEG 才是 mega
+SI_SUFFIX = {"t": 12, "g": 9, "meg": 6, "k": 3, "m": -3,
+             "u": -6, "n": -9, "p": -12, "f": -15, "a": -18}  # 10 的幂
+# 整个值都要匹配（2*wn 这样的表达式不算数值）；后缀后面的单位字母照 SPICE 的习惯忽略：10uF、1.2um
+_SI_RE = re.compile(r"([-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?)(meg|[tgkmunpfa])?[a-z]*", re.I)
+_si_cache = {}
+
+
+def parse_si(text):
+    """'121.357K' -> 121357.0，'800n' -> 8e-7；不是数值（表达式等）时返回 None"""
+    value = _si_cache.get(text, _si_cache)
+    if value is _si_cache:
+        m = _SI_RE.fullmatch(text)
+        if m:
+            num, exp = m.group(1), SI_SUFFIX.get((m.group(2) or "").lower(), 0)
+            # 拼成十进制指数再转 float，10u 得到 1e-05 而不是 9.999999999999999e-06
+            value = float(f"{num}e{exp}") if "e" not in num.lower() else float(num) * 10.0 ** exp
+        else:
+            value = None
+        _si_cache[text] = value
+    return value
+
+
+def annotate_params(netlist):
+    """给每个器件补上 "values"（参数数值）。
+    解析时参数字符串已经 intern，同一写法只换算一次，大网表里不同写法通常只有几百个"""
+    for text in {v for dev in netlist for v in dev["params"].values()}:
+        parse_si(text)
+    cache = _si_cache
+    for dev in netlist:
+        dev["values"] = {k: cache[v] for k, v in dev["params"].items() if cache[v] is not None}
+    return netlist
+
+
+# === 压缩输入 ===
+# 按文件头的魔数识别 gzip / xz / zstd，边读边解压（缓冲区大小固定），扩展名无所谓；
+# zstd 需要 pip install zstandard。其余情况按普通文本打开。
+MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+
+
+def compression_of(filename):
+    with open(filename, "rb") as f:
+        head = f.read(6)
+    for magic, kind in MAGIC.items():
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def open_text(filename):
+    kind = compression_of(filename)
+    if kind == "gzip":
+        import gzip
+        return gzip.open(filename, "rt")
+    if kind == "xz":
+        import lzma
+        return lzma.open(filename, "rt")
+    if kind == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(f"{filename} 是 zstd 压缩文件，需要 pip install zstandard") from e
+        raw = open(filename, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return open(filename, "r")
+
+
 # === 解析 inst_info.txt ===
-def parse_instances(filename):
+def _blocks(f):
+    # 逐行读，按空行分块，不把整个文件读进内存
+    block = []
+    for line in f:
+        if line.strip():
+            block.append(line)
+        elif block:
+            yield "".join(block)
+            block = []
+    if block:
+        yield "".join(block)
+
+
+def parse_instances(filename, window=None):
+    """window 为 window_dbu() 的结果时，边读边丢掉窗口外的器件"""
     instances = {}
-    with open(filename, "r") as f:
-        content = f.read()
-    blocks = content.strip().split("\n\n")
-    for block in blocks:
-        name_m   = re.search(r"Name:\s+(\S+)", block)
-        xy_m     = re.search(r"XY:\s+\((-?\d+\.?\d*)\s+(-?\d+\.?\d*)\)", block)
-        orient_m = re.search(r"Orient:\s+(\S+)", block)
-        if not (name_m and xy_m and orient_m):
+    with open_text(filename) as f:
+        for block in _blocks(f):
+            name_m   = re.search(r"Name:\s+(\S+)", block)
+            xy_m     = re.search(r"XY:\s+\((-?\d+\.?\d*)\s+(-?\d+\.?\d*)\)", block)
+            orient_m = re.search(r"Orient:\s+(\S+)", block)
+            if not (name_m and xy_m and orient_m):
+                continue
+            name   = name_m.group(1)
+            x      = to_dbu(float(xy_m.group(1)) * SCALE)
+            y      = to_dbu(float(xy_m.group(2)) * SCALE)
+            orient = orient_m.group(1)
+            if window and not in_window((x, y), window):
+                continue
+
+            dev_type = match_device_type(name, from_netlist=False)
+
+            instances[name] = {
+                "name": name,
+                "type": dev_type,
+                "xy": (x, y),
+                "orient": orient
+            }
+    return instances
+
+# === 解析 netlist.txt ===
+def _parse_lines(lines, subckt_pins, pending=None):
+    """逐行解析器件；subckt_pins 为 .SUBCKT 定义的端口名，未知器件（标准单元、IP）按它给引脚命名，读到定义时更新。
+    pending 不为 None 时（并行分块）记下本块里还没见到定义的未知器件序号，合并时再按前面各块的定义命名"""
+    table = prefix_table(from_netlist=True)
+    intern = sys.intern
+    count = 0
+    for line in lines:
+        line = line.strip()
+        if line[:7].upper() == ".SUBCKT":
+            parts = line.split()
+            if len(parts) > 1:
+                subckt_pins[parts[1].upper()] = [p for p in parts[2:] if "=" not in p]
+            continue
+        if not line or line.startswith("*") or line.startswith("."):
             continue
-        name   = name_m.group(1)
-        x      = float(xy_m.group(1)) * SCALE
-        y      = float(xy_m.group(2)) * SCALE
-        orient = orient_m.group(1)
+        tokens = line.split()
+        raw_name = tokens[0]  # e.g., CC1, CC0
 
-        dev_type = match_device_type(name, from_netlist=False)
+        dev_type = match_device_type(raw_name, table=table)
+        # 期望引脚数：来自 DEVICE_LIBRARY
+        if dev_type in DEVICE_LIBRARY:
+            pin_list = list(DEVICE_LIBRARY[dev_type]["pins"].keys())
+            pin_count = len(pin_list)
+            if len(tokens) < 1 + pin_count:
+                continue  # 行格式不足
+            pins = tokens[1:1+pin_count]                # 精确按数量取引脚
+            param_tokens = tokens[1+pin_count:]
+            # 剩余第一个不带 "=" 时当模型/值；R1 a b r=1k 这样没写模型的，参数从引脚后面开始
+            model = ""
+            if param_tokens and "=" not in param_tokens[0]:
+                model, param_tokens = param_tokens[0], param_tokens[1:]
+        else:
+            # 未知器件：XU1 A Y [/] INV [w=..]，去掉参数和 "/" 后最后一个是模型，其余是引脚
+            fields = [tok for tok in tokens[1:] if "=" not in tok and tok != "/"]
+            pins, model = (fields[:-1], fields[-1]) if len(fields) >= 3 else (fields, "")
+            if len(pins) < 2:
+                continue  # 行格式不足
+            param_tokens = tokens[1:]
+        # name = raw_name[1:] if raw_name.startswith("X") else raw_name
+        name = raw_name[1:]
+        # 已知器件用库里的 pin 名；未知器件用 .SUBCKT 的端口名，没有定义时生成 P1..Pn
+        if dev_type in DEVICE_LIBRARY:
+            pin_names = pin_list
+        else:
+            pin_names = subckt_pins.get(model.upper())
+            if pin_names is None and pending is not None:
+                pending.append(count)
+            if not pin_names or len(pin_names) != len(pins):
+                pin_names = [f"P{i+1}" for i in range(len(pins))]
 
-        instances[name] = {
+        pin_map = dict(zip(pin_names, pins))
+        # 参数 w=800n l=2u ... 原样保留（intern 后相同写法共用一个字符串），数值由 annotate_params 换算
+        params = {}
+        for tok in param_tokens:
+            key, eq, value = tok.partition("=")
+            if eq:
+                params[intern(key.lower())] = intern(value)
+        yield {
             "name": name,
             "type": dev_type,
-            "xy": (x, y),
-            "orient": orient
+            "pins": pin_map,
+            "model": model,
+            "params": params
         }
+        count += 1
+
+
+def iter_netlist(filename, workers=None):
+    """逐个器件产出，parse_netlist 的流式版本；workers > 1 且文件够大时分块并行解析，顺序与结果都不变"""
+    workers = workers or PARSE_WORKERS
+    if workers > 1 and compression_of(filename) is None and os.path.getsize(filename) >= PARSE_MIN_BYTES:
+        yield from _iter_netlist_parallel(filename, workers)
+        return
+    subckt_pins = {}
+    with open_text(filename) as f:
+        yield from _resolve_forward(_serial_chunks(f, subckt_pins), subckt_pins)
+
+
+def _serial_chunks(lines, subckt_pins):
+    # 每个器件一块，缺定义时下标为 [0]
+    pending = []
+    for dev in _parse_lines(lines, subckt_pins, pending):
+        yield [dev], [0] * len(pending)
+        pending.clear()
+
+
+def _name_box_pins(devices, subckt_pins):
+    """未知器件按 .SUBCKT 端口名重新命名引脚；没有定义或个数不符的保持 P1..Pn"""
+    for dev in devices:
+        pin_names = subckt_pins.get(dev["model"].upper())
+        if pin_names and len(pin_names) == len(dev["pins"]):
+            dev["pins"] = dict(zip(pin_names, dev["pins"].values()))
+
+
+def _resolve_forward(chunks, subckt_pins):
+    """chunks 逐块产出 (器件列表, 其中还没见到 .SUBCKT 定义的下标)。
+    出现第一个缺定义的器件之前边读边产出；之后的器件先攒着，读完整个文件再按全部定义补上引脚名一起产出，
+    定义写在使用之后（前向引用）也能对上，串行和并行解析结果相同"""
+    held, todo = [], []
+    for devices, pending in chunks:
+        if not (held or pending):
+            yield from devices
+            continue
+        todo.extend(len(held) + i for i in pending)
+        held.extend(devices)
+    _name_box_pins([held[i] for i in todo], subckt_pins)
+    yield from held
+
+
+def parse_netlist(filename, workers=None):
+    return list(iter_netlist(filename, workers))
+
+
+# === 并行解析网表 ===
+# 按字节把文件切成若干块，切点对齐到行首（解析本来就是逐行的，块内的 .SUBCKT / .ENDS 不影响结果），
+# 各进程自己 seek 读取并解析一块，结果按块的顺序拼接，与串行解析完全一致。
+# 唯一跨块的状态是 .SUBCKT 端口名：块内先用本块见到的定义，没见到的未知器件在合并时按前面各块的定义重新命名，
+# 前面各块也没有的（定义在后面）与串行解析一样交给 _resolve_forward，读完整个文件再补。
+# 压缩文件不能随机定位，仍按串行读取。
+# 子进程把一块的结果序列化成 bytes 传回，主进程反序列化并拼接这一块时暂停循环垃圾回收
+# （器件记录之间没有环，否则反复扫描新建的小字典比解析本身还慢），交给调用方之前恢复。
+PARSE_MIN_BYTES   = 8 << 20   # 小于它的文件串行解析，进程池的启动开销不划算
+PARSE_CHUNK_BYTES = 32 << 20  # 每块的字节数上限，限制单个进程的内存
+PARSE_CHUNKS_PER_WORKER = 8   # 每个进程分到的块数（文件小时按它切，块多负载均衡）
+
+
+def netlist_chunks(filename, n_chunks):
+    """把文件按字节切成约 n_chunks 块，切点对齐到下一行行首，返回 [(起始, 结束)]"""
+    size = os.path.getsize(filename)
+    step = max(1, size // max(1, n_chunks))
+    bounds = [0]
+    with open(filename, "rb") as f:
+        for i in range(1, n_chunks):
+            f.seek(max(i * step, bounds[-1] + 1) - 1)
+            f.readline()  # 跳到这一行的末尾
+            pos = f.tell()
+            if pos >= size:
+                break
+            bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _parse_range(filename, start, end):
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    subckt_pins, pending = {}, []
+    # 与 open(filename, "r") 相同的编码和换行处理
+    devices = list(_parse_lines(io.TextIOWrapper(io.BytesIO(data)), subckt_pins, pending))
+    return pickle.dumps((devices, subckt_pins, pending), pickle.HIGHEST_PROTOCOL)
+
+
+def _merge_chunk(data, subckt_pins):
+    """反序列化一块，按前面各块的 .SUBCKT 定义补上引脚名，并把本块的定义并进 subckt_pins；
+    返回 (器件列表, 前面各块也没有定义的器件下标)"""
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        devices, defs, pending = pickle.loads(data)
+        known = [i for i in pending if devices[i]["model"].upper() in subckt_pins]
+        _name_box_pins([devices[i] for i in known], subckt_pins)
+        subckt_pins.update(defs)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return devices, sorted(set(pending) - set(known))
+
+
+def _iter_netlist_parallel(filename, workers):
+    from concurrent.futures import ProcessPoolExecutor
+    size = os.path.getsize(filename)
+    ranges = netlist_chunks(filename, max(workers * PARSE_CHUNKS_PER_WORKER, -(-size // PARSE_CHUNK_BYTES)))
+    subckt_pins = {}
+    with ProcessPoolExecutor(workers) as pool:
+        chunks = pool.map(_parse_range, [filename] * len(ranges), [s for s, _ in ranges], [e for _, e in ranges])
+        yield from _resolve_forward((_merge_chunk(data, subckt_pins) for data in chunks), subckt_pins)
+
+# === 补全缺失器件的坐标 ===
+def complete_placement(instances, netlist):
+    if not AUTO_PLACE:
+        return instances
+    names = set(instances)
+    missing = sum(1 for dev in netlist if dev["name"] not in names)
+    if not missing:
+        return instances
+    try:
+        # 延迟导入，numpy 只在需要自动布局时才用到
+        from auto_place import auto_place
+    except ImportError as e:
+        print(f"[警告] {missing} 个器件没有坐标，自动布局需要 numpy: {e}")
+        return instances
+    with instrument.stage("auto_place"):
+        instances = auto_place(instances, netlist)
+    print(f"📐 已自动布局 {missing} 个缺少坐标的器件")
     return instances
 
-# === 解析 netlist.txt ===
-def parse_netlist(filename):
-    devices = []
-    with open(filename, "r") as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("*") or line.startswith("."):
-                continue
-            tokens = line.split()
-            raw_name = tokens[0]  # e.g., CC1, CC0
+# === 局部视图：网络锥 ===
+# 从种子网络（或器件）出发，在 "网络 - 器件" 的二部图上做 N 跳广度优先搜索，
+# 只保留搜到的器件，后面的布局、放置、布线都只处理这个子集。
+# 种子网络即使是电源也会展开；之后遇到电源网络（BUS_NETS、EXCLUDED_NETS）就不再经过它扩展。
+def supply_nets():
+    return {net.upper() for net in BUS_NETS} | {net.upper() for net in EXCLUDED_NETS}
 
-            dev_type = match_device_type(raw_name, from_netlist=True)
-            # 期望引脚数：来自 DEVICE_LIBRARY；未知器件则至少 2
-            if dev_type in DEVICE_LIBRARY:
-                pin_list = list(DEVICE_LIBRARY[dev_type]["pins"].keys())
-                pin_count = len(pin_list)
-            else:
-                pin_count = max(2, len(tokens) - 2)  # 兜底
 
-            if len(tokens) < 1 + pin_count:
-                continue  # 行格式不足
+def net_cone(netlist, seeds, hops=None, stop_nets=None):
+    """返回 N 跳以内的器件名集合；seeds 为网络名或器件名（不区分大小写）"""
+    hops = CONE_HOPS if hops is None else hops
+    stop_nets = supply_nets() if stop_nets is None and CONE_STOP_AT_SUPPLY else (stop_nets or set())
+    on_net = {}
+    by_name = {}
+    for dev in netlist:
+        by_name[dev["name"].upper()] = dev
+        for net in dev["pins"].values():
+            on_net.setdefault(net.upper(), []).append(dev)
 
-            pins = tokens[1:1+pin_count]                # 精确按数量取引脚
-            model = tokens[1+pin_count] if len(tokens) > 1+pin_count else ""  # 剩余第一个当模型/值
-            # name = raw_name[1:] if raw_name.startswith("X") else raw_name
-            name = raw_name[1:]
-            # 对未知器件，生成 P1..Pn 引脚名；已知器件用库里的 pin 名
-            if dev_type in DEVICE_LIBRARY:
-                pin_names = pin_list
-            else:
-                pin_names = [f"P{i+1}" for i in range(pin_count)]
-
-            pin_map = dict(zip(pin_names, pins))
-            devices.append({
-                "name": name,
-                "type": dev_type,
-                "pins": pin_map,
-                "model": model
-            })
-    return devices
+    picked = set()
+    frontier = set()
+    for seed in seeds:
+        seed = seed.upper()
+        if seed in on_net:
+            frontier.add(seed)  # 种子网络本身不受 stop_nets 限制
+        elif seed in by_name:
+            picked.add(by_name[seed]["name"])
+            frontier.update(net.upper() for net in by_name[seed]["pins"].values()
+                            if net.upper() not in stop_nets)
+        else:
+            print(f"[警告] 网表中没有网络或器件 {seed}")
+    seen_nets = set(frontier)
+
+    for _ in range(hops):
+        new = [dev for net in frontier for dev in on_net[net] if dev["name"] not in picked]
+        frontier = set()
+        for dev in new:
+            picked.add(dev["name"])
+            for net in dev["pins"].values():
+                net = net.upper()
+                if net not in seen_nets and net not in stop_nets:
+                    frontier.add(net)
+        seen_nets |= frontier
+        if not frontier:
+            break
+    return picked
+
+
+def cone_subset(instances, netlist, seeds=None, hops=None):
+    """按 net_cone 裁剪 (instances, netlist)；没有种子时原样返回"""
+    seeds = CONE_SEEDS if seeds is None else seeds
+    if not seeds:
+        return instances, netlist
+    picked = net_cone(netlist, seeds, hops)
+    netlist = [dev for dev in netlist if dev["name"] in picked]
+    instances = {name: inst for name, inst in instances.items() if name in picked}
+    print(f"🎯 {', '.join(seeds)} 周围 {CONE_HOPS if hops is None else hops} 跳：{len(netlist)} 个器件")
+    return instances, netlist
+
+
+# === 视口裁剪 ===
+# 只画版图坐标窗口内的器件。已经解析好的设计（常驻服务、cli）用网格空间索引查询，
+# 只遍历与窗口相交的格子；直接读文件时在解析中途就丢掉窗口外的器件，内存只和窗口内容有关。
+# 一端在窗口外的网络被裁断，在窗口内离边界最近的引脚上画一段引到窗口边界的短线，线上写网络名。
+def window_dbu(window):
+    x1, y1, x2, y2 = (to_dbu(v * SCALE) for v in window)
+    return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+
+def in_window(pt, win):
+    return win[0] <= pt[0] <= win[2] and win[1] <= pt[1] <= win[3]
+
+
+def build_grid(instances, cell=None):
+    """器件坐标的网格索引：{"cell": 格子边长 DBU, "buckets": {(gx, gy): [(序号, 器件名)]}}"""
+    cell = cell or to_dbu(WINDOW_GRID * SCALE)
+    buckets = {}
+    for i, (name, inst) in enumerate(instances.items()):
+        x, y = inst["xy"]
+        buckets.setdefault((x // cell, y // cell), []).append((i, name))
+    return {"cell": cell, "buckets": buckets}
+
+
+def query_grid(grid, instances, win):
+    cell, buckets = grid["cell"], grid["buckets"]
+    gx1, gy1, gx2, gy2 = win[0] // cell, win[1] // cell, win[2] // cell, win[3] // cell
+    if (gx2 - gx1 + 1) * (gy2 - gy1 + 1) > len(buckets):  # 窗口比设计还大：直接扫有器件的格子
+        cells = [k for k in buckets if gx1 <= k[0] <= gx2 and gy1 <= k[1] <= gy2]
+    else:
+        cells = [(gx, gy) for gx in range(gx1, gx2 + 1) for gy in range(gy1, gy2 + 1)]
+    found = []
+    for k in cells:
+        for i, name in buckets.get(k, ()):
+            if in_window(instances[name]["xy"], win):
+                found.append((i, name))
+    return [name for _, name in sorted(found)]  # 保持原来的器件顺序，与直接读文件的结果一致
+
+
+def _clip(netlist_iter, keep):
+    """按器件名 keep 过滤网表，同时找出被窗口裁断的网络；返回 (netlist, clipped)"""
+    netlist, inside, outside = [], set(), set()
+    for dev in netlist_iter:
+        if dev["name"] in keep:
+            netlist.append(dev)
+            inside.update(dev["pins"].values())
+        else:
+            outside.update(dev["pins"].values())
+    return netlist, inside & outside
+
+
+def window_subset(instances, netlist, window, grid=None):
+    """已解析的设计按窗口裁剪，返回 (instances, netlist, clipped)；grid 可复用 build_grid 的结果"""
+    win = window_dbu(window)
+    names = query_grid(grid or build_grid(instances), instances, win)
+    instances = {name: instances[name] for name in names}
+    netlist, clipped = _clip(netlist, instances)
+    return instances, netlist, clipped
+
+
+def load_window(inst_file, netlist_file, window, workers=None):
+    """直接从文件读出窗口内的设计，返回 (instances, netlist, clipped)"""
+    instances = parse_instances(inst_file, window_dbu(window))
+    netlist, clipped = _clip(iter_netlist(netlist_file, workers), instances)
+    print(f"🔲 窗口 {tuple(window)}：{len(instances)} 个器件，{len(clipped)} 个网络被裁断")
+    return instances, netlist, clipped
+
+
+def plan_stubs(net_to_points, clipped, win, bus_nets=()):
+    """被裁断网络的引出短线：[{"net", "pin": (器件, 类型, 引脚), "begin", "end"}]；总线网络不需要"""
+    stubs = []
+    for net in sorted(clipped):
+        if net.upper() in bus_nets or net not in net_to_points:
+            continue
+        best = None
+        for dev, dtype, pin, (x, y) in net_to_points[net]:
+            # 到四条边的距离，取最近的一条边
+            for d, end in ((x - win[0], (win[0], y)), (win[2] - x, (win[2], y)),
+                           (y - win[1], (x, win[1])), (win[3] - y, (x, win[3]))):
+                if best is None or d < best[0]:
+                    best = (d, (dev, dtype, pin), (x, y), end)
+        if best:
+            stubs.append({"net": net, "pin": best[1], "begin": best[2], "end": best[3]})
+    return stubs
+
+
+# === 器件几何（纯计算，不碰 COM） ===
+def compute_placement(instances, dev_types=None):
+    """返回 (pin_positions, bboxes)；dev_types 给定时只计算这些类型（通常是有模具的类型）"""
+    pin_positions = {}
+    bboxes = {}
+    for inst in instances.values():
+        dev_type = inst["type"]
+        cfg = DEVICE_LIBRARY.get(dev_type, None)
+        if not cfg or (dev_types is not None and dev_type not in dev_types):
+            continue
+        w, h = cfg["size"]
+        cx, cy = inst["xy"]
+        name = inst["name"]
+        orient = inst["orient"]
+        # 与 apply_orientation 一致：引脚随形状镜像/旋转，旋转 90° 时外框宽高互换
+        hw, hh, _ = orient_offset(orient, to_dbu(w/2), to_dbu(h/2))
+        hw, hh = abs(hw), abs(hh)
+        bboxes[name] = (cx - hw, cy - hh, cx + hw, cy + hh)
+        # 记录引脚坐标
+        for pin, (rx, ry) in cfg["pins"].items():
+            dx, dy, _ = orient_offset(orient, to_dbu(rx*w), to_dbu(ry*h))
+            pin_positions[f"{name}:{pin}"] = (cx + dx, cy + dy)
+    return pin_positions, bboxes
 
 # === 放置器件 ===
-def drop_with_label(page, master, inst, pin_positions, instances_map):
+def drop_with_label(page, master, inst, instances_map):
     dev_type = inst["type"]
     cfg = DEVICE_LIBRARY.get(dev_type, None)
     if not cfg:
@@ -189,25 +683,132 @@ def drop_with_label(page, master, inst, pin_positions, instances_map):
     name = inst["name"]
     orient = inst["orient"]
 
-    shp = page.Drop(master, cx, cy)
-    shp.Text = name
+    shp = page.Drop(master, from_dbu(cx), from_dbu(cy))
+    shp.Text = device_label(inst)
     shp.CellsU("Width").ResultIU  = w
     shp.CellsU("Height").ResultIU = h
-    # 文本位置与尺寸
-    shp.CellsU("TxtPinX").ResultIU   = shp.CellsU("Width").ResultIU + 0.20
-    shp.CellsU("TxtPinY").ResultIU   = shp.CellsU("Height").ResultIU / 2.0
-    shp.CellsU("TxtWidth").ResultIU  = 0.6
-    shp.CellsU("TxtHeight").ResultIU = 0.2
-
+    # 文本位置与尺寸由 place_labels / write_labels 统一批量写入
 
     apply_orientation(shp, orient)
     instances_map[name] = shp
+    return shp
 
-    # 记录引脚坐标
-    for pin, (rx, ry) in cfg["pins"].items():
-        pin_positions[f"{name}:{pin}"] = (cx + rx*w, cy + ry*h)
+def device_label(inst):
+    name = inst["name"]
+    params = inst.get("params")
+    template = PARAM_LABELS.get(inst["type"])
+    if not SHOW_PARAMS or not params or not template:
+        return name
+    try:
+        text = template.format_map(params)
+    except KeyError:
+        return name
+    mr = params.get("mr")
+    if mr and mr != "1":
+        text += f"×{mr}"
+    return f"{name} {text}"
 
-    return shp
+
+# === 未知器件的方框符号 ===
+# 引脚名（按网表顺序）就是符号的签名：一半引脚在左边，其余在右边，间距 BOX_PIN_PITCH。
+# 每个签名登记成 DEVICE_LIBRARY 里的一个类型（键即签名），布局、布线、Glue、核对都按已知器件处理；
+# 对应的 master 只生成一次，放在文档模具里按签名查找，成千上万个相同的单元共用它。
+BOX_PREFIX    = "BOX"
+BOX_WIDTH     = 0.5     # 方框宽度（英寸）
+BOX_PIN_PITCH = 0.125   # 引脚间距（英寸）
+SEC_CONNECTION_PTS = 7  # visSectionConnectionPts
+
+
+def box_type(pin_names):
+    return f"{BOX_PREFIX}({','.join(pin_names)})"
+
+
+def box_pins(dev_type):
+    """box_type 的逆运算；不是生成的类型时返回 None"""
+    if dev_type.startswith(BOX_PREFIX + "(") and dev_type.endswith(")"):
+        return dev_type[len(BOX_PREFIX) + 1:-1].split(",")
+    return None
+
+
+def box_symbol(pin_names):
+    left = (len(pin_names) + 1) // 2
+    rows = max(left, len(pin_names) - left)
+    w, h = BOX_WIDTH, (rows + 1) * BOX_PIN_PITCH
+    pins = {}
+    for i, pin in enumerate(pin_names):
+        side, row = (-0.5, i) if i < left else (0.5, i - left)
+        pins[pin] = (side, 0.5 - (row + 1) * BOX_PIN_PITCH / h)
+    return {"inst_prefix": [], "netlist_prefix": [], "master_name": None,
+            "size": (w, h), "pins": pins, "generated": True}
+
+
+def register_box(pin_names):
+    dev_type = box_type(pin_names)
+    if dev_type not in DEVICE_LIBRARY:
+        DEVICE_LIBRARY[dev_type] = box_symbol(pin_names)
+    return dev_type
+
+
+def attach_symbols(instances, netlist):
+    """未知器件改用生成的方框类型（网表和 inst_info 两边都改）；返回 instances"""
+    if not GENERATE_SYMBOLS:
+        return instances
+    for dev in netlist:
+        if dev["type"] in DEVICE_LIBRARY:
+            continue
+        dev["type"] = register_box(list(dev["pins"]))
+        inst = instances.get(dev["name"])
+        if inst is not None:
+            inst["type"] = dev["type"]
+    return instances
+
+
+def box_master_name(dev_type):
+    # 引脚很多的 IP 块签名太长，master 名改用签名的哈希
+    if len(dev_type) <= 64:
+        return dev_type
+    return f"{BOX_PREFIX}#{hashlib.sha1(dev_type.encode()).hexdigest()[:16]}"
+
+
+def box_master(doc, dev_type):
+    """取文档模具里签名为 dev_type 的 master，没有就画一个方框、加上连接点，拖进文档模具"""
+    name = box_master_name(dev_type)
+    try:
+        return doc.Masters.ItemU(name)
+    except Exception:
+        pass
+    cfg = DEVICE_LIBRARY[dev_type]
+    w, h = cfg["size"]
+    shp = doc.Pages(1).DrawRectangle(0, 0, w, h)
+    shp.AddSection(SEC_CONNECTION_PTS)
+    # 连接点顺序与 cfg["pins"] 一致，glue_to_pin 按序号找
+    for k, (rx, ry) in enumerate(cfg["pins"].values(), 1):
+        shp.AddRow(SEC_CONNECTION_PTS, -2, 153)  # visRowLast, visTagCnnctPt
+        shp.CellsU(f"Connections.X{k}").FormulaU = f"Width*{rx + 0.5:.10g}"
+        shp.CellsU(f"Connections.Y{k}").FormulaU = f"Height*{ry + 0.5:.10g}"
+    master = doc.Masters.Drop(shp, 0, 0)
+    master.Name = name
+    master.NameU = name
+    shp.Delete()
+    return master
+
+
+def add_box_masters(doc, masters, dev_types):
+    """masters 之外再加上这些生成类型的 master，返回新的映射"""
+    masters = dict(masters)
+    for dev_type in sorted(set(dev_types)):
+        if dev_type not in masters and DEVICE_LIBRARY.get(dev_type, {}).get("generated"):
+            masters[dev_type] = box_master(doc, dev_type)
+    return masters
+
+
+def attach_params(instances, netlist):
+    # 标签要用到的参数从网表挂到器件上（inst_info.txt 里没有参数）
+    for dev in netlist:
+        inst = instances.get(dev["name"])
+        if inst is not None:
+            inst["params"] = dev["params"]
+    return instances
 
 # === 方向应用到 Visio 形状 ===
 def apply_orientation(shape, orient):
@@ -230,6 +831,129 @@ def apply_orientation(shape, orient):
         shape.CellsU("FlipX").FormulaU = "1"
         shape.CellsU("Angle").ResultIU = math.pi/2
 
+# === 空间哈希 ===
+class SpatialHash:
+    """按固定大小的格子索引矩形 (x1, y1, x2, y2)，查询只看覆盖到的格子"""
+    def __init__(self, cell):
+        self.cell = cell
+        self.buckets = {}
+
+    def _cells(self, box):
+        x1, y1, x2, y2 = box
+        c = self.cell
+        for gx in range(int(x1 // c), int(x2 // c) + 1):
+            for gy in range(int(y1 // c), int(y2 // c) + 1):
+                yield (gx, gy)
+
+    def insert(self, box, item):
+        for key in self._cells(box):
+            self.buckets.setdefault(key, []).append((box, item))
+
+    def query(self, box):
+        x1, y1, x2, y2 = box
+        found = {}
+        for key in self._cells(box):
+            for b, item in self.buckets.get(key, ()):
+                if b[0] < x2 and x1 < b[2] and b[1] < y2 and y1 < b[3]:
+                    found[item] = b
+        return found
+
+
+# === 标签避让 ===
+LABEL_SIZE = (0.6, 0.2)  # TxtWidth, TxtHeight
+# 候选位置（形状局部坐标，原点在左下角）：右、左、上、下、右上、右下；第一个是原来的固定位置
+LABEL_CANDIDATES = [
+    lambda w, h: (w + 0.20, h / 2),
+    lambda w, h: (-0.20, h / 2),
+    lambda w, h: (w / 2, h + 0.15),
+    lambda w, h: (w / 2, -0.15),
+    lambda w, h: (w + 0.20, h / 2 + 0.25),
+    lambda w, h: (w + 0.20, h / 2 - 0.25),
+]
+
+
+def orient_offset(orient, dx, dy):
+    # 与 apply_orientation 一致：先镜像（局部坐标）再旋转
+    if orient in ("MY", "MYR90"):
+        dx = -dx
+    if orient in ("MX", "MXR90"):
+        dy = -dy
+    turns = {"R90": 1, "R180": 2, "R270": 3, "MXR90": 1, "MYR90": 1}.get(orient, 0)
+    for _ in range(turns):
+        dx, dy = -dy, dx
+    return dx, dy, turns % 2 == 1
+
+
+def _overlap(a, b):
+    return max(0, min(a[2], b[2]) - max(a[0], b[0])) * max(0, min(a[3], b[3]) - max(a[1], b[1]))
+
+
+def place_labels(instances, bboxes):
+    """为每个器件挑一个不压住其他器件和已放标签的文本位置，返回 {name: (TxtPinX, TxtPinY)}"""
+    index = SpatialHash(to_dbu(1.0))
+    for name, box in bboxes.items():
+        index.insert(box, ("dev", name))
+
+    tw, th = to_dbu(LABEL_SIZE[0]), to_dbu(LABEL_SIZE[1])
+    labels = {}
+    for name in bboxes:
+        inst = instances[name]
+        w, h = DEVICE_LIBRARY[inst["type"]]["size"]
+        cx, cy = inst["xy"]
+        best = None
+        for k, cand in enumerate(LABEL_CANDIDATES):
+            lx, ly = cand(w, h)
+            dx, dy, swap = orient_offset(inst["orient"], to_dbu(lx - w / 2), to_dbu(ly - h / 2))
+            hw, hh = (th // 2, tw // 2) if swap else (tw // 2, th // 2)
+            box = (cx + dx - hw, cy + dy - hh, cx + dx + hw, cy + dy + hh)
+            hits = index.query(box)
+            hits.pop(("dev", name), None)
+            cost = sum(_overlap(box, b) for b in hits.values())
+            if best is None or cost < best[0]:
+                best = (cost, box, (lx, ly))
+            if cost == 0:
+                break
+        index.insert(best[1], ("label", name))
+        labels[name] = best[2]
+    return labels
+
+
+def write_labels(page, shapes_map, labels):
+    # 所有标签的 TxtPinX/TxtPinY/TxtWidth/TxtHeight 用一次 SetResults 写入；
+    # 形状 ID 超出 MAX_BATCH_SID 的逐个写
+    sid_src, results = [], []
+    tw, th = LABEL_SIZE
+    for name, (lx, ly) in labels.items():
+        shp = shapes_map.get(name)
+        if shp is None:
+            continue
+        for cell, value in ((0, lx), (1, ly), (2, tw), (3, th)):
+            if shp.ID > MAX_BATCH_SID:
+                shp.CellsSRC(1, 12, cell).ResultIU = value  # 内部单位即英寸
+                continue
+            sid_src += [shp.ID, 1, 12, cell]  # visSectionObject, visRowTextXForm
+            results.append(value)
+    if not results:
+        return
+    page.SetResults(com_array(sid_src, "I2"), com_array(["in"] * len(results), "VARIANT"),
+                    com_array(results, "VARIANT"), 0)
+
+
+# SetResults / SetFormulas / GetFormulasU 的 SID_SRC 是 16 位整数数组（VT_I2），
+# 形状 ID 超过 32767 放不进去；这些形状回退到逐个 CellsSRC 读写，大设计上只是后画的一部分
+MAX_BATCH_SID = 32767
+
+
+def com_array(values, vartype):
+    # 批量接口需要类型明确的 SAFEARRAY；本地替身直接用元组
+    try:
+        import pythoncom
+        from win32com.client import VARIANT
+    except ImportError:
+        return tuple(values)
+    vt = {"I2": pythoncom.VT_I2, "R8": pythoncom.VT_R8, "VARIANT": pythoncom.VT_VARIANT}[vartype]
+    return VARIANT(pythoncom.VT_ARRAY | vt, tuple(values))
+
 # === MST 构造 ===
 def build_mst(points, candidate_edges=None):
     if candidate_edges is None:
@@ -257,50 +981,50 @@ def build_mst(points, candidate_edges=None):
     return mst
 
 
-def draw_net_lines(page, netlist, pin_positions, instances_map, bboxes):
+# === 总线位置（纯计算） ===
+def plan_buses(bboxes):
     if not bboxes:
-        return
+        return []
 
-    # 1) 计算器件全局边界
+    # 计算器件全局边界
     min_x = min(x1 for (x1, y1, x2, y2) in bboxes.values())
     max_x = max(x2 for (x1, y1, x2, y2) in bboxes.values())
     min_y = min(y1 for (x1, y1, x2, y2) in bboxes.values())
     max_y = max(y2 for (x1, y1, x2, y2) in bboxes.values())
 
-    margin_x = 1.0
-    margin_y = 1.0
+    margin_x = to_dbu(1.0)
+    margin_y = to_dbu(1.0)
     bus_left  = min_x - margin_x
     bus_right = max_x + margin_x
 
-    # 2) 绘制总线（由 BUS_NETS 配置驱动）
-    bus_lines = {}
+    buses = []
     offset = 0
     for net_name, cfg in BUS_NETS.items():
         if not cfg.get("enabled", True):  # 默认启用，除非显式设置为 False
             continue
 
-        label = cfg.get("label", net_name)
-        color = cfg.get("color", "RGB(0,0,0)")
-
         # 简单规则：第一个放在上边，第二个放在下边，其他依次往下排
         if offset == 0:
             y = max_y + margin_y
         elif offset == 1:
             y = min_y - margin_y
         else:
-            y = min_y - margin_y - (offset - 1) * 0.1
+            y = min_y - margin_y - (offset - 1) * to_dbu(0.1)
 
-        line = page.DrawLine(bus_left, y, bus_right, y)
-        line.Text = label
-        line.CellsU("LineWeight").FormulaU = "2 pt"
-        line.CellsU("LineColor").FormulaU  = color
-        line.CellsU("TxtPinX").FormulaU = "0"
-        line.CellsU("TxtPinY").FormulaU = "Height*0.5"
-
-        bus_lines[net_name.upper()] = line
+        buses.append({
+            "net": net_name.upper(),
+            "label": cfg.get("label", net_name),
+            "color": cfg.get("color", "RGB(0,0,0)"),
+            "x1": bus_left,
+            "x2": bus_right,
+            "y": y,
+        })
         offset += 1
+    return buses
+
 
-    # 3) 收集网络点
+# === 收集网络点 ===
+def collect_net_points(netlist, pin_positions):
     net_to_points = {}
     for dev in netlist:
         name = dev["name"]
@@ -312,166 +1036,1324 @@ def draw_net_lines(page, netlist, pin_positions, instances_map, bboxes):
             if key in pin_positions:
                 pt = pin_positions[key]
                 net_to_points.setdefault(net, []).append((name, dev_type, pin, pt))
+    return net_to_points
+
+
+def index_pins(pins):
+    # 坐标 -> 器件引脚；同一坐标有多个引脚时取第一个
+    pin_at = {}
+    for (dn, dt, pn, pt) in pins:
+        pin_at.setdefault(pt, (dn, dt, pn))
+    return pin_at
+
+
+# === 共线线段合并 ===
+def _merge_intervals(intervals):
+    merged = []
+    for a, b in sorted(intervals):
+        if merged and a <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], b)
+        else:
+            merged.append([a, b])
+    return merged
+
+
+def merge_collinear(segments):
+    """把直线段 [(p1, p2)] 合并成折线 [(p1, p2, ...)]：
+    先把同一行/列上重叠或相接的线段并成一段，再在只连两段的拐点处串成折线"""
+    horiz, vert, paths = {}, {}, []
+    for p1, p2 in segments:
+        if p1 == p2:
+            paths.append((p1, p2))  # 重合引脚，保持原样
+        elif p1[1] == p2[1]:
+            horiz.setdefault(p1[1], []).append(sorted((p1[0], p2[0])))
+        else:
+            vert.setdefault(p1[0], []).append(sorted((p1[1], p2[1])))
+
+    merged = []
+    for y in sorted(horiz):
+        merged += [((a, y), (b, y)) for a, b in _merge_intervals(horiz[y])]
+    for x in sorted(vert):
+        merged += [((x, a), (x, b)) for a, b in _merge_intervals(vert[x])]
 
-    # 4) 绘制连线
-    for net, pins in net_to_points.items():
-        if len(pins) < 1:
+    # 端点 -> 线段下标；度为 2 的端点是折线的拐点
+    ends = {}
+    for k, (a, b) in enumerate(merged):
+        ends.setdefault(a, []).append(k)
+        ends.setdefault(b, []).append(k)
+
+    used = [False] * len(merged)
+    def walk(start, k):
+        pts = [start]
+        while True:
+            used[k] = True
+            a, b = merged[k]
+            nxt = b if a == pts[-1] else a
+            pts.append(nxt)
+            cont = [j for j in ends[nxt] if not used[j]]
+            if len(ends[nxt]) != 2 or not cont:
+                return tuple(pts)
+            k = cont[0]
+
+    for pt in sorted(ends):
+        if len(ends[pt]) != 2:
+            for k in ends[pt]:
+                if not used[k]:
+                    paths.append(walk(pt, k))
+    for k in range(len(merged)):  # 只剩环
+        if not used[k]:
+            paths.append(walk(merged[k][0], k))
+    return paths
+
+
+# === 迷宫布线（纯计算） ===
+# 器件外框（外扩半个网格）是障碍，整个设计建一次、共用一份：
+#   - MAZE_PITCH 网格点的占用位图（按行、按列各存一份），网格点和网格线上的查询只是数组下标 / bytearray.find；
+#   - 按 1 英寸分桶的外框列表，给不在网格上的点（引脚所在的行 / 列）做精确判断。
+# 外扩后的外框至少一个网格宽，线段两端精确判断之后，中间只需查网格点，结果与逐个外框求交一致。
+# 每条斜边：引脚先沿离器件中心最远的方向引出一个网格到框外，
+# 先试两条 L 形，再试 Z 形（拐两次、总长仍是曼哈顿距离：L 形不通时它就是代价最小的路径），
+# 都被挡住（需要绕路）才在两端之间的局部网格上做 A*，代价 = 长度 + 拐弯罚分（加权 A*）。
+# A* 按行 / 列取出整条占用线（bytes），沿一个方向用 find 一次跳到下一个可能拐弯的点（跳点），
+# 不逐格入堆；找到的折线再把能换成 L 形的三段拉直。
+# 每个网络的扩展点数有上限，超出的边退回虚线。
+MAZE_BEND = 2  # 拐一次弯相当于多走几个网格
+MAZE_HALO = 8  # A* 的搜索范围：两端外框再外扩几个网格
+MAZE_WEIGHT = 1.2  # 估价放大倍数：路径最多长 20%，扩展的点数少几倍
+
+
+def build_obstacles(bboxes, pitch=None, cell=None):
+    """{"cell": 桶边长, "margin": 外扩, "buckets": {(gx, gy): [外框]},
+        "pitch": 网格间距, "origin": 位图左下角的网格序号 (gx0, gy0), "size": (nx, ny),
+        "rows": 按行展开的占用位图, "cols": 按列展开的同一张位图}"""
+    cell = cell or DBU
+    pitch = pitch or MAZE_PITCH
+    margin = pitch // 2
+    buckets = {}
+    spans = []
+    for box in bboxes.values():
+        x1, y1, x2, y2 = box
+        for gx in range((x1 - margin) // cell, (x2 + margin) // cell + 1):
+            for gy in range((y1 - margin) // cell, (y2 + margin) // cell + 1):
+                buckets.setdefault((gx, gy), []).append(box)
+        # 严格落在外扩后外框里的网格点序号范围
+        spans.append(((x1 - margin) // pitch + 1, -(-(x2 + margin) // pitch) - 1,
+                      (y1 - margin) // pitch + 1, -(-(y2 + margin) // pitch) - 1))
+    obst = {"cell": cell, "margin": margin, "buckets": buckets, "pitch": pitch,
+            "origin": (0, 0), "size": (0, 0), "rows": bytearray(), "cols": bytearray()}
+    if not spans:
+        return obst
+
+    gx0, gy0 = min(s[0] for s in spans), min(s[2] for s in spans)
+    nx = max(s[1] for s in spans) - gx0 + 1
+    ny = max(s[3] for s in spans) - gy0 + 1
+    rows, cols = bytearray(nx * ny), bytearray(nx * ny)
+    for a, b, c, d in spans:
+        if a > b or c > d:
             continue
+        run = b"\x01" * (b - a + 1)
+        for gy in range(c - gy0, d - gy0 + 1):
+            rows[gy * nx + a - gx0:gy * nx + b - gx0 + 1] = run
+        run = b"\x01" * (d - c + 1)
+        for gx in range(a - gx0, b - gx0 + 1):
+            cols[gx * ny + c - gy0:gx * ny + d - gy0 + 1] = run
+    obst.update(origin=(gx0, gy0), size=(nx, ny), rows=rows, cols=cols)
+    return obst
 
-        net_upper = net.upper()
-        # === 特殊处理：如果是总线 ===
-        if net_upper in bus_lines:
-            bus_line = bus_lines[net_upper]
-            for (dev, dtype, pin, pt) in pins:
-                # 在总线上添加一个连接点
-                sec = 10  # visSectionConnectionPts
-                row = bus_line.AddRow(sec, -1, 0)
-                bus_line.CellsSRC(sec, row, 0).ResultIU = pt[0] - bus_left
-                bus_line.CellsSRC(sec, row, 1).ResultIU = 0
-                bus_line.CellsSRC(sec, row, 2).FormulaU = "1"
-
-                # 创建竖线（只 Glue，不设坐标）
-                line = page.Drop(page.Application.ConnectorToolDataObject, 0, 0)
-                line.CellsU("ConFixedCode").FormulaU = "3"
-                line.CellsU("LineWeight").FormulaU = "1.2 pt"
-
-                # Glue 器件端
-                if dev and dtype in DEVICE_LIBRARY:
-                    shape = instances_map.get(dev)
-                    if shape:
-                        pin_list = list(DEVICE_LIBRARY[dtype]["pins"].keys())
-                        if pin in pin_list:
-                            idx = pin_list.index(pin) + 1
-                            try:
-                                conn_x = shape.CellsU(f"Connections.X{idx}")
-                                conn_y = shape.CellsU(f"Connections.Y{idx}")
-                                line.CellsU("BeginX").GlueTo(conn_x)
-                                line.CellsU("BeginY").GlueTo(conn_y)
-                            except Exception as e:
-                                print(f"[Glue] {dev}:{pin} 失败: {e}")
-
-                # Glue 总线端
-                try:
-                    conn_x = bus_line.CellsSRC(sec, row, 0)
-                    conn_y = bus_line.CellsSRC(sec, row, 1)
-                    line.CellsU("EndX").GlueTo(conn_x)
-                    line.CellsU("EndY").GlueTo(conn_y)
-                except Exception as e:
-                    print(f"[Glue] {net_upper} 总线端失败: {e}")
+
+NO_OBSTACLES = build_obstacles({})
+
+
+def route_obstacles(bboxes, config=None):
+    """按布线参数准备障碍；不做迷宫布线时返回 None"""
+    config = config or route_config()
+    return build_obstacles(bboxes, config["pitch"]) if config["maze"] else None
+
+
+def _blocked(obst, x, y):
+    m, cell = obst["margin"], obst["cell"]
+    for x1, y1, x2, y2 in obst["buckets"].get((x // cell, y // cell), ()):
+        if x1 - m < x < x2 + m and y1 - m < y < y2 + m:
+            return True
+    return False
+
+
+def _occupied(obst, x, y):
+    """网格点查位图，其余点按外框精确判断"""
+    p = obst["pitch"]
+    if x % p or y % p:
+        return _blocked(obst, x, y)
+    (gx0, gy0), (nx, ny) = obst["origin"], obst["size"]
+    i, j = x // p - gx0, y // p - gy0
+    return 0 <= i < nx and 0 <= j < ny and obst["rows"][j * nx + i] == 1
+
+
+def _run_blocked(obst, k, g, lo, hi):
+    """网格线 g 上序号 lo..hi 的网格点是否有被占用的；k = 0 为第 g 行，1 为第 g 列"""
+    (gx0, gy0), (nx, ny) = obst["origin"], obst["size"]
+    if k == 0:
+        bits, n, lines, g, lo, hi = obst["rows"], nx, ny, g - gy0, lo - gx0, hi - gx0
+    else:
+        bits, n, lines, g, lo, hi = obst["cols"], ny, nx, g - gx0, lo - gy0, hi - gy0
+    if not 0 <= g < lines:
+        return False
+    lo, hi = max(lo, 0), min(hi, n - 1)
+    return lo <= hi and bits.find(1, g * n + lo, g * n + hi + 1) >= 0
+
+
+def _boxes_along(obst, a, b):
+    cell, buckets = obst["cell"], obst["buckets"]
+    for gx in range(min(a[0], b[0]) // cell, max(a[0], b[0]) // cell + 1):
+        for gy in range(min(a[1], b[1]) // cell, max(a[1], b[1]) // cell + 1):
+            yield from buckets.get((gx, gy), ())
+
+
+def _segment_clear(obst, a, b):
+    """水平或竖直线段是否不穿过任何（外扩后的）器件外框"""
+    k = 0 if a[1] == b[1] else 1  # 沿 x（0）还是沿 y（1）
+    p = obst["pitch"]
+    lo, hi = min(a[k], b[k]), max(a[k], b[k])
+    if a[1 - k] % p == 0:
+        # 在网格线上：两端精确判断，中间的网格点查位图
+        if _occupied(obst, *a) or _occupied(obst, *b):
+            return False
+        return not _run_blocked(obst, k, a[1 - k] // p, -(-lo // p), hi // p)
+    m = obst["margin"]
+    lo_x, hi_x = min(a[0], b[0]), max(a[0], b[0])
+    lo_y, hi_y = min(a[1], b[1]), max(a[1], b[1])
+    for x1, y1, x2, y2 in _boxes_along(obst, a, b):
+        if lo_x < x2 + m and hi_x > x1 - m and lo_y < y2 + m and hi_y > y1 - m:
+            return False
+    return True
+
+
+def _reach(obst, a, b):
+    """从 a 沿水平或竖直方向朝 b 走，[a, t] 保持畅通的最远坐标 t（沿该轴，不超过 b；a 本身被挡时越过 a 往回）"""
+    k = 0 if a[1] == b[1] else 1
+    m = obst["margin"]
+    s, t, f = a[k], b[k], a[1 - k]
+    lo, hi = min(s, t), max(s, t)
+    for box in _boxes_along(obst, a, b):
+        if not box[1 - k] - m < f < box[3 - k] + m:
+            continue
+        blo, bhi = box[k] - m, box[2 + k] + m
+        if bhi <= lo or blo >= hi:
             continue
+        t = min(t, blo) if b[k] >= s else max(t, bhi)
+    return t
+
+
+def _escape(obst, pt, pitch):
+    """引脚引出到框外一个网格处的候选点：先沿远离器件中心的方向，再试另一个轴；
+    器件外框重叠时取引脚落在边上的那个器件；不在任何器件上时只有引脚本身"""
+    x, y = pt
+    cell = obst["cell"]
+    best = None
+    for x1, y1, x2, y2 in obst["buckets"].get((x // cell, y // cell), ()):
+        if x1 <= x <= x2 and y1 <= y <= y2:
+            dx = (2*x - x1 - x2) / max(1, x2 - x1)
+            dy = (2*y - y1 - y2) / max(1, y2 - y1)
+            if best is None or max(abs(dx), abs(dy)) > best[0]:
+                best = (max(abs(dx), abs(dy)), dx, dy, (x1, y1, x2, y2))
+    if best is None:
+        return [pt]
+    _, dx, dy, (x1, y1, x2, y2) = best
+    horiz = (x2 + pitch if dx > 0 else x1 - pitch, y)
+    vert = (x, y2 + pitch if dy > 0 else y1 - pitch)
+    return [horiz, vert] if abs(dx) > abs(dy) else [vert, horiz]
+
+
+def _span(pts, pad):
+    """点集的外框再外扩 pad"""
+    return (min(x for x, _ in pts) - pad, min(y for _, y in pts) - pad,
+            max(x for x, _ in pts) + pad, max(y for _, y in pts) + pad)
+
 
-        # === 普通网络：MST ===
-        if len(pins) < 2:
+def _simplify(pts):
+    out = []
+    for pt in pts:
+        if out and pt == out[-1]:
             continue
-        coords = [pt for _, _, _, pt in pins]
-        edges = build_mst(coords)
+        if len(out) >= 2 and (out[-2][0] == out[-1][0] == pt[0] or out[-2][1] == out[-1][1] == pt[1]):
+            out[-1] = pt  # 与前两点共线，去掉中间点
+        else:
+            out.append(pt)
+    return tuple(out)
+
+
+def _z_path(obst, e1, e2, pitch):
+    """e1 -> e2 的 Z 形折线（中间一段在网格线上，离两端中点最近的优先）；没有时返回 None"""
+    for k in (0, 1):  # k = 0：两头横、中间竖；1：两头竖、中间横
+        r1 = _reach(obst, e1, (e2[0], e1[1]) if k == 0 else (e1[0], e2[1]))
+        r2 = _reach(obst, e2, (e1[0], e2[1]) if k == 0 else (e2[0], e1[1]))
+        lo, hi = (r2, r1) if e2[k] >= e1[k] else (r1, r2)
+        first, last = -(-lo // pitch), hi // pitch
+        if first > last:
+            continue
+        mid = min(max((e1[k] + e2[k]) // (2 * pitch), first), last)
+        for g in sorted(range(first, last + 1), key=lambda g: abs(g - mid)):
+            c = g * pitch
+            p1, p2 = ((c, e1[1]), (c, e2[1])) if k == 0 else ((e1[0], c), (e2[0], c))
+            if _segment_clear(obst, p1, p2):
+                return (e1, p1, p2, e2)
+    return None
+
+
+def _axis(lo, hi, pitch, ends):
+    """[lo, hi] 内的网格坐标，再按序插入两端点的坐标"""
+    axis = list(range(-(-lo // pitch) * pitch, hi + 1, pitch))
+    for v in ends:
+        i = bisect.bisect_left(axis, v)
+        if i == len(axis) or axis[i] != v:
+            axis.insert(i, v)
+    return axis
+
+
+def _lattice_span(axis, pitch):
+    """axis 上网格点的 (首序号, 末序号, [(下标, 坐标) 不在网格上的点])；网格点不连续时返回 None"""
+    extra = [(i, v) for i, v in enumerate(axis) if v % pitch]
+    n = len(axis) - len(extra)
+    if not n:
+        return None
+    first = next(v for v in axis if v % pitch == 0) // pitch
+    last = next(v for v in reversed(axis) if v % pitch == 0) // pitch
+    return (first, last, extra) if last - first + 1 == n else None
+
+
+def _occupancy_line(obst, k, fixed, axis, span):
+    """一条网格线上各点的占用（bytes，1 为被挡）：k = 0 为 y = fixed 的一行、横坐标取 axis，
+    k = 1 为 x = fixed 的一列；span 为 _lattice_span(axis)。
+    fixed 在网格上时从位图整段切出，不在网格上的点逐个精确判断；否则按穿过这条线的外框精确涂色"""
+    p, m = obst["pitch"], obst["margin"]
+    if fixed % p or span is None:
+        out = bytearray(len(axis))
+        ends = ((axis[0], fixed), (axis[-1], fixed)) if k == 0 else ((fixed, axis[0]), (fixed, axis[-1]))
+        for box in _boxes_along(obst, *ends):
+            if box[1 - k] - m < fixed < box[3 - k] + m:
+                i0 = bisect.bisect_right(axis, box[k] - m)
+                i1 = bisect.bisect_left(axis, box[k + 2] + m)
+                if i0 < i1:
+                    out[i0:i1] = b"\x01" * (i1 - i0)
+        return bytes(out)
+    (gx0, gy0), (nx, ny) = obst["origin"], obst["size"]
+    if k == 0:
+        bits, n, lines, g, o = obst["rows"], nx, ny, fixed // p - gy0, gx0
+    else:
+        bits, n, lines, g, o = obst["cols"], ny, nx, fixed // p - gx0, gy0
+    first, last, extra = span
+    lo, hi = first - o, last - o
+    a, b = max(lo, 0), min(hi, n - 1)
+    if 0 <= g < lines and a <= b:
+        out = bytearray(a - lo) + bits[g * n + a:g * n + b + 1] + bytearray(hi - b)
+    else:
+        out = bytearray(hi - lo + 1)
+    for i, v in extra:
+        out.insert(i, _blocked(obst, v, fixed) if k == 0 else _blocked(obst, fixed, v))
+    return bytes(out)
+
+
+def _astar(obst, a, b, pitch, budget, touched=None):
+    """a、b 之间的局部网格上做 A*；返回 (拐点列表或 None, 扩展的点数)；
+    touched 不为 None 时追加查过障碍的网格点的外框。
+    每次扩展沿一个方向一直走到可能需要拐弯的点才入堆（跳点）：到达终点所在的行 / 列、
+    前方被挡、或者旁边一格由空变挡（停在变挡之前）/ 由挡变空（停在变空处）"""
+    halo = MAZE_HALO * pitch
+    axes = (_axis(min(a[0], b[0]) - halo, max(a[0], b[0]) + halo, pitch, (a[0], b[0])),
+            _axis(min(a[1], b[1]) - halo, max(a[1], b[1]) + halo, pitch, (a[1], b[1])))
+    xs, ys = axes
+    W, H = len(xs), len(ys)
+    spans = (_lattice_span(xs, obst["pitch"]), _lattice_span(ys, obst["pitch"]))
+    lines = {}
+    walls = (b"\x01" * W, b"\x01" * H)  # 局部网格外当作被挡
+
+    def line(k, t):
+        """第 t 行（k = 0）或第 t 列（k = 1）上各点的占用，bytes，1 为被挡"""
+        key = (k, t)
+        got = lines.get(key)
+        if got is None:
+            if not 0 <= t < (H, W)[k]:
+                return walls[k]
+            got = lines[key] = _occupancy_line(obst, k, axes[1 - k][t], axes[k], spans[k])
+        return got
+
+    # 节点 n = i * H + j，状态 = n * 5 + 来向 + 1（来向 -1 为起点）；来向 0..3 = +x, -x, +y, -y
+    ai, aj = bisect.bisect_left(xs, a[0]), bisect.bisect_left(ys, a[1])
+    bi, bj = bisect.bisect_left(xs, b[0]), bisect.bisect_left(ys, b[1])
+    start, goal = ai * H + aj, bi * H + bj
+    bx, by = b
+    bend = MAZE_BEND * pitch
+    weight = MAZE_WEIGHT
+
+    def jump(n, nd):
+        """从节点 n 沿 nd 方向走到下一个跳点，返回其序号；一步也走不了时返回 -1"""
+        i, j = divmod(n, H)
+        k, t, u = (0, j, i) if nd < 2 else (1, i, j)  # 沿第 t 行 / 列走，当前位置 u
+        here, side1, side2 = line(k, t), line(k, t + 1), line(k, t - 1)
+        target = (bi, bj)[k]
+        if nd % 2 == 0:
+            stop = here.find(1, u + 1)
+            stop = len(here) - 1 if stop < 0 else stop - 1
+            for side in (side1, side2):
+                q = side.find(b"\x00\x01", u + 1, stop + 1)  # 旁边将要被挡：停在变挡之前
+                if q >= 0:
+                    stop = q
+                q = side.find(b"\x01\x00", u, stop + 1)  # 旁边由挡变空：停在变空处
+                if q >= 0:
+                    stop = q + 1
+            if u < target < stop:
+                stop = target
+        else:
+            stop = here.rfind(1, 0, u) + 1
+            for side in (side1, side2):
+                q = side.rfind(b"\x01\x00", stop, u)
+                if q >= 0:
+                    stop = q + 1
+                q = side.rfind(b"\x00\x01", stop, u + 1)
+                if q >= 0:
+                    stop = q
+            if stop < target < u:
+                stop = target
+        if stop == u:
+            return -1
+        return stop * H + j if k == 0 else i * H + stop
+
+    def h(x, y, d):
+        # 曼哈顿距离 + 按当前走向至少还要拐的弯：终点在正前方（或就在此处）0 次，
+        # 在前方半平面或正侧方 1 次，在身后 2 次
+        ahead, side = ((bx - x, by - y), (x - bx, by - y), (by - y, bx - x), (y - by, bx - x))[d]
+        return abs(bx - x) + abs(by - y) + bend * (2 if ahead < 0 else 0 if side == 0 else 1)
+
+    best = {start * 5: 0}
+    came = {}
+    heap = [(weight * (abs(bx - a[0]) + abs(by - a[1]) + (bend if a[0] != bx and a[1] != by else 0)),
+             0, start, -1)]
+    i_lo = i_hi = ai
+    j_lo = j_hi = aj
+    used = 0
+
+    def done(path):
+        if touched is not None:
+            # 查过的格点不超出入过堆的点的外框再外扩一格（两侧和前方各看一格）
+            m = obst["margin"]
+            touched.append((xs[max(i_lo - 1, 0)] - m, ys[max(j_lo - 1, 0)] - m,
+                            xs[min(i_hi + 1, W - 1)] + m, ys[min(j_hi + 1, H - 1)] + m))
+        return path, used
+
+    heappop, heappush = heapq.heappop, heapq.heappush
+    while heap:
+        f, g, n, d = heappop(heap)
+        g = -g
+        if g > best.get(n * 5 + d + 1, g):
+            continue
+        if n == goal:
+            path = [n]
+            state = n * 5 + d + 1
+            while state in came:
+                state = came[state]
+                path.append(state // 5)
+            return done([(xs[k // H], ys[k % H]) for k in reversed(path)])
+        used += 1
+        if used > budget:
+            return done(None)
+        state = n * 5 + d + 1
+        x, y = xs[n // H], ys[n % H]
+        for nd in range(4):
+            if d >= 0 and nd == d ^ 1:
+                continue  # 不掉头
+            m = jump(n, nd)
+            if m < 0:
+                continue
+            i, j = divmod(m, H)
+            ng = g + abs(xs[i] - x) + abs(ys[j] - y) + (bend if d not in (-1, nd) else 0)
+            key = m * 5 + nd + 1
+            if ng < best.get(key, ng + 1):
+                best[key] = ng
+                came[key] = state
+                heappush(heap, (ng + weight * h(xs[i], ys[j], nd), -ng, m, nd))
+                i_lo, i_hi, j_lo, j_hi = min(i_lo, i), max(i_hi, i), min(j_lo, j), max(j_hi, j)
+    return done(None)
+
+
+def _straighten(obst, pts):
+    """去掉折线里多余的弯：任意相邻三段能换成一个畅通的 L 形时就换（总长不增加、少一个拐点），直到不能再换"""
+    pts = list(pts)
+    k = 0
+    while k + 3 < len(pts):
+        a, d = pts[k], pts[k + 3]
+        for corner in ((d[0], a[1]), (a[0], d[1])):
+            if _segment_clear(obst, a, corner) and _segment_clear(obst, corner, d):
+                pts[k + 1:k + 3] = [corner]
+                pts = list(_simplify(pts))
+                k = max(k - 2, 0)
+                break
+        else:
+            k += 1
+    return pts
+
+
+def maze_path(obst, p1, p2, pitch, budget, touched=None):
+    """p1 -> p2 绕开器件的直角折线；返回 (点序列或 None, 用掉的扩展点数)；
+    touched 不为 None 时追加查过障碍的范围 [(x1, y1, x2, y2)]，结果只取决于与这些范围相交的器件外框"""
+    m = obst["margin"]
+    c1, c2 = _escape(obst, p1, pitch), _escape(obst, p2, pitch)
+    if touched is not None:
+        touched += [_span([p1], 0), _span([p2], 0)] + [_span([e], m) for e in c1 + c2]
+    e1 = next((e for e in c1 if not _occupied(obst, *e)), None)
+    e2 = next((e for e in c2 if not _occupied(obst, *e)), None)
+    if e1 is None or e2 is None:
+        return None, 0
+    # 线探测：两条 L 形
+    for corner in ((e2[0], e1[1]), (e1[0], e2[1])):
+        if touched is not None:
+            touched += [_span([e1, corner], m), _span([corner, e2], m)]
+        if _segment_clear(obst, e1, corner) and _segment_clear(obst, corner, e2):
+            return _simplify((p1, e1, corner, e2, p2)), 0
+    # Z 形：查的都在两端点的外框以内
+    if touched is not None:
+        touched.append(_span([e1, e2], m))
+    path = _z_path(obst, e1, e2, pitch)
+    if path:
+        return _simplify((p1, *path, p2)), 0
+    if budget <= 0:
+        return None, 0
+    path, used = _astar(obst, e1, e2, pitch, budget, touched)
+    if not path:
+        return None, used
+    if touched is not None:
+        touched.append(_span(path, m))
+    return _simplify((p1, *_straighten(obst, _simplify(path)), p2)), used
+
+
+# === 单个网络布线（纯函数，可放进进程池） ===
+def route_config():
+    # 布线参数显式传给 route_net，进程池里的子进程看不到主进程对模块常量的修改
+    return {"merge": MERGE_WIRES, "draft": DRAFT,
+            "maze": MAZE_ROUTE, "pitch": MAZE_PITCH, "effort": MAZE_EFFORT}
+
+
+NO_TALLY = nullcontext()  # 不给 mst_time 时不计时
+
+
+def route_net(net, pins, bus_nets=(), config=None, obstacles=None, mst_time=None):
+    """返回 {"net", "pins", "bus", "wires", "maze"}；
+    wires = [(折线点序列, straight, 起点器件引脚, 终点器件引脚)]；
+    迷宫布线成功的斜边是固定的直角折线，按 straight 画；maze = 迷宫布线查过障碍的范围（布线缓存用）；
+    mst_time 为 instrument.tally，累加 MST 耗时"""
+    config = config or route_config()
+    routed = {"net": net, "pins": pins, "bus": net.upper() in bus_nets, "wires": [], "maze": []}
+    if routed["bus"] or len(pins) < 2:
+        return routed
+    pin_at = index_pins(pins)
+    wires, routed["maze"] = route_points([pt for _, _, _, pt in pins], config, obstacles, mst_time)
+    routed["wires"] = [(pts, straight, pin_at[pts[0]], pin_at[pts[-1]]) for pts, straight in wires]
+    return routed
+
+
+def route_points(coords, config, obstacles=None, mst_time=None):
+    """只按引脚坐标布线，返回 (wires, maze)；wires = [(折线点序列, straight)]，每条的两端都是引脚坐标"""
+    wires, maze = [], []
+    # === 普通网络：MST ===
+    # 每个网络一个 trace 事件的话大设计上有几十万个，只累加到调用方的 tally 里，每轮布线记一个
+    with mst_time or NO_TALLY:
+        mst = build_mst(coords)
+    straight, dashed = [], []
+    for p1, p2 in mst:
+        horiz = p1[1] == p2[1]
+        vert  = p1[0] == p2[0]
+        (straight if horiz or vert else dashed).append((p1, p2))
+
+    paths = merge_collinear(straight) if config["merge"] else straight
+    for pts in paths:
+        wires.append((tuple(pts), True))
+    budget = config["effort"]
+    for p1, p2 in dashed:
+        if config["maze"]:
+            path, used = maze_path(obstacles or NO_OBSTACLES, p1, p2, config["pitch"], budget, maze)
+            budget -= used
+            if path:
+                wires.append((path, True))
+                continue
+        # 草稿模式不交给 Visio 的连接线重排，直接折成先横后竖的直角折线
+        pts = (p1, (p2[0], p1[1]), p2) if config["draft"] else (p1, p2)
+        wires.append((pts, False))
+    return wires, maze
+
+
+# === 并行布线 ===
+# 子进程只需要引脚坐标：每块打包成两个整数数组（各网络的引脚数、坐标），结果也是一个整数数组
+# （每个网络：线数，每条线的点数、straight、坐标，迷宫布线查过的范围），主进程按坐标把器件引脚对回去。
+# 直线布线每个网络只要几十微秒，序列化进出进程池比布线本身还贵，所以只有迷宫布线才分给多个进程。
+CHUNKS_PER_WORKER = 8  # 每个进程分到的块数，块越多负载越均衡，调度开销也越大
+
+def net_route_cost(pins):
+    # MST 候选边数 ~ n²，用它估算单个网络的布线代价
+    return len(pins) * len(pins)
+
+
+def chunk_nets(items, n_chunks):
+    """把 [(net, pins)] 按顺序切成代价大致相等的连续块，返回 [(起始下标, 块)]"""
+    total = sum(net_route_cost(pins) for _, pins in items)
+    target = max(1, total // max(1, n_chunks))
+    chunks = []
+    start, cost = 0, 0
+    for i, (_, pins) in enumerate(items):
+        cost += net_route_cost(pins)
+        if cost >= target:
+            chunks.append((start, items[start:i+1]))
+            start, cost = i + 1, 0
+    if start < len(items):
+        chunks.append((start, items[start:]))
+    return chunks
+
+
+def route_chunk(chunk, bus_nets=(), config=None, obstacles=None):
+    config = config or route_config()
+    mst_time = instrument.tally("build_mst")
+    routed = [route_net(net, pins, bus_nets, config, obstacles, mst_time) for net, pins in chunk]
+    mst_time.emit()
+    return routed
+
+
+# 障碍网格在大设计上有几 MB，不随每个布线块发送：进程池用 init_route_worker 作 initializer，
+# 每个工作进程启动时收一份存进模块全局变量，块任务用 route_chunk_in_worker
+_worker_obstacles = None
+
+
+def init_route_worker(obstacles):
+    global _worker_obstacles
+    _worker_obstacles = obstacles
+
+
+def pack_nets(chunk, bus_nets=()):
+    """[(net, pins)] -> (各网络的引脚数, 坐标)；总线和单引脚网络不用布线，引脚数记 0"""
+    counts, coords = array("q"), array("q")
+    for net, pins in chunk:
+        if net.upper() in bus_nets or len(pins) < 2:
+            counts.append(0)
+            continue
+        counts.append(len(pins))
+        for _, _, _, pt in pins:
+            coords.extend(pt)
+    return counts, coords
+
+
+def route_packed(counts, coords, config=None, obstacles=None):
+    config = config or route_config()
+    mst_time = instrument.tally("build_mst")
+    out = array("q")
+    pos = 0
+    for n in counts:
+        wires, maze = [], []
+        if n:
+            flat = coords[pos:pos + 2 * n]
+            pos += 2 * n
+            wires, maze = route_points(list(zip(flat[::2], flat[1::2])), config, obstacles, mst_time)
+        out.append(len(wires))
+        for pts, straight in wires:
+            out.extend((len(pts), straight))
+            for pt in pts:
+                out.extend(pt)
+        out.append(len(maze))
+        for region in maze:
+            out.extend(region)
+    mst_time.emit()
+    return out
+
+
+def unpack_routes(chunk, bus_nets, out):
+    """route_packed 的结果还原成 route_net 的格式，与 chunk 对齐"""
+    results = []
+    pos = 0
+    for net, pins in chunk:
+        routed = {"net": net, "pins": pins, "bus": net.upper() in bus_nets, "wires": [], "maze": []}
+        n_wires = out[pos]
+        pos += 1
+        pin_at = index_pins(pins) if n_wires else None
+        for _ in range(n_wires):
+            n, straight = out[pos], out[pos + 1]
+            flat = out[pos + 2:pos + 2 + 2 * n]
+            pos += 2 + 2 * n
+            pts = tuple(zip(flat[::2], flat[1::2]))
+            routed["wires"].append((pts, bool(straight), pin_at[pts[0]], pin_at[pts[-1]]))
+        n_regions = out[pos]
+        pos += 1
+        routed["maze"] = [tuple(out[pos + 4 * k:pos + 4 * k + 4]) for k in range(n_regions)]
+        pos += 4 * n_regions
+        results.append(routed)
+    return results
+
+
+def route_chunk_in_worker(counts, coords, config=None):
+    """进程池里的块任务，参数和结果都是 pack_nets / route_packed 的整数数组"""
+    return route_packed(counts, coords, config, _worker_obstacles)
+
+
+def route_all_nets(net_to_points, bus_nets=(), workers=None, config=None, obstacles=None, cache=None):
+    """所有网络布线，结果按 net_to_points 的顺序返回，与进程数无关；
+    obstacles 为 build_obstacles 的结果，迷宫布线时使用；
+    cache 为布线缓存文件（默认 ROUTE_CACHE），命中的网络不再重算；不开迷宫布线时不用缓存"""
+    workers = workers or ROUTE_WORKERS
+    config = config or route_config()
+    items = list(net_to_points.items())
+    cache = route_cache_path(config, cache)
+    if not cache:
+        return _route_items(items, bus_nets, workers, config, obstacles)
+
+    db = open_route_cache(cache)
+    try:
+        results, keys = cache_lookup(db, items, bus_nets, config, obstacles)
+        todo = [i for i, routed in enumerate(results) if routed is None]
+        for i, routed in zip(todo, _route_items([items[i] for i in todo], bus_nets, workers, config, obstacles)):
+            results[i] = routed
+        misses = [i for i in todo if keys[i]]
+        cache_store(db, [(keys[i], results[i]) for i in misses], obstacles)
+        print_cache_stats(keys, len(misses))
+    finally:
+        db.close()
+    return results
+
+
+def route_cache_path(config, cache=None):
+    # 直线布线每个网络只要几十微秒，比查缓存（读出、解码、更新使用时间）还快，只有迷宫布线才值得缓存
+    return (cache or ROUTE_CACHE) if config["maze"] else None
+
+
+def print_cache_stats(keys, n_misses):
+    # keys 为 cache_lookup 返回的键，不进缓存的网络为 None
+    print(f"🗃️  布线缓存：命中 {sum(1 for k in keys if k) - n_misses} 个网络，未命中 {n_misses} 个")
+
+
+def _route_items(items, bus_nets, workers, config, obstacles):
+    if workers <= 1 or len(items) < 2 or not config["maze"]:
+        return route_chunk(items, bus_nets, config, obstacles)
+
+    from concurrent.futures import ProcessPoolExecutor
+    bus_nets = frozenset(bus_nets)
+    chunks = chunk_nets(items, workers * CHUNKS_PER_WORKER)
+    packed = [pack_nets(chunk, bus_nets) for _, chunk in chunks]
+    results = [None] * len(items)
+    with ProcessPoolExecutor(workers, initializer=init_route_worker, initargs=(obstacles,)) as pool:
+        routed_chunks = pool.map(route_chunk_in_worker, [c for c, _ in packed], [p for _, p in packed],
+                                 [config] * len(chunks))
+        for (start, chunk), out in zip(chunks, routed_chunks):
+            results[start:start + len(chunk)] = unpack_routes(chunk, bus_nets, out)
+    return results
+
+
+# === 布线缓存 ===
+# 每个网络的布线结果存进 sqlite，键 = 引脚坐标（整数 DBU，按顺序）+ 布线参数的哈希，与网络名、器件名无关；
+# 值只存折线几何，两端的器件引脚取回时按坐标重新对上（与 route_net 的做法相同）。
+# 迷宫布线的结果还取决于附近的器件：route_net 记下迷宫布线查过障碍的范围（引出点、L 形探测的线段、
+# A* 查过的网格点的外框），连同这些范围覆盖的障碍分桶的哈希一起存；取回时桶里的器件变了就当作未命中
+# （按桶比较比逐个外框粗一些，只会多几次未命中）。
+# 只有直线的网络与器件位置无关。
+# 每次命中或写入都更新使用时间，超出 ROUTE_CACHE_ENTRIES / ROUTE_CACHE_MB 时删掉最久未用的。
+ROUTE_CACHE_VERSION = 2  # 布线结果的算法变了就加一，旧缓存整体作废
+CACHE_QUERY_BATCH   = 500  # 一条 SELECT 里查询的键数（sqlite 的参数个数有上限）
+
+
+def open_route_cache(path):
+    import sqlite3
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE IF NOT EXISTS routes (key TEXT PRIMARY KEY, value TEXT, used REAL)")
+    db.execute("CREATE INDEX IF NOT EXISTS routes_used ON routes (used)")
+    return db
+
+
+def route_key(pins, config):
+    coords = [v for _, _, _, pt in pins for v in pt]
+    text = json.dumps([ROUTE_CACHE_VERSION, config, MAZE_BEND, MAZE_HALO, MAZE_WEIGHT, coords],
+                      sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def _bucket_table(obst):
+    """障碍分桶的二维前缀异或表：每个桶的 64 位哈希（含桶坐标和其中的外框）从左下角累积异或，
+    任意一块矩形里所有桶的异或只要查四个角"""
+    buckets = obst["buckets"]
+    if not buckets:
+        return 0, 0, 0, 0, [0]
+    gx0, gy0 = min(k[0] for k in buckets), min(k[1] for k in buckets)
+    nx, ny = max(k[0] for k in buckets) - gx0 + 1, max(k[1] for k in buckets) - gy0 + 1
+    code = {}
+    for key, boxes in buckets.items():
+        text = repr((key, sorted(tuple(box) for box in boxes)))
+        code[key[0] - gx0, key[1] - gy0] = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+    w = nx + 1
+    table = [0] * (w * (ny + 1))
+    for j in range(ny):
+        acc = 0
+        for i in range(nx):
+            acc ^= code.get((i, j), 0)
+            table[(j + 1) * w + i + 1] = table[j * w + i + 1] ^ acc
+    return gx0, gy0, nx, ny, table
+
+
+def _region_digest(obst, regions, table):
+    """regions 覆盖的分桶内容的哈希；table 为 _bucket_table(obst)，调用方每次查询 / 写入建一次"""
+    cell = obst["cell"]
+    gx0, gy0, nx, ny, t = table
+    w = nx + 1
+    parts = []
+    for x1, y1, x2, y2 in regions:
+        i1, i2 = max(x1 // cell - gx0, 0), min(x2 // cell - gx0, nx - 1)
+        j1, j2 = max(y1 // cell - gy0, 0), min(y2 // cell - gy0, ny - 1)
+        if i1 > i2 or j1 > j2:
+            parts.append(0)
+            continue
+        parts.append(t[(j2 + 1) * w + i2 + 1] ^ t[j1 * w + i2 + 1] ^ t[(j2 + 1) * w + i1] ^ t[j1 * w + i1])
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def cache_lookup(db, items, bus_nets, config, obstacles=None):
+    """返回 (结果, 键)，都与 items 对齐；没命中的结果为 None，总线和单引脚网络不进缓存（键为 None）"""
+    obst = obstacles or NO_OBSTACLES
+    keys = [None if net.upper() in bus_nets or len(pins) < 2 else route_key(pins, config)
+            for net, pins in items]
+    stored = {}
+    wanted = sorted({k for k in keys if k})
+    for i in range(0, len(wanted), CACHE_QUERY_BATCH):
+        batch = wanted[i:i + CACHE_QUERY_BATCH]
+        stored.update(db.execute(f"SELECT key, value FROM routes WHERE key IN ({','.join('?' * len(batch))})",
+                                 batch))
+
+    results, hits, table = [None] * len(items), set(), None
+    for i, ((net, pins), key) in enumerate(zip(items, keys)):
+        value = stored.get(key)
+        if value is None:
+            continue
+        value = json.loads(value)
+        if value["regions"]:
+            table = table or _bucket_table(obst)
+            if _region_digest(obst, value["regions"], table) != value["digest"]:
+                continue  # 附近的器件动过，迷宫布线的结果不能再用
+        pin_at = index_pins(pins)
+        wires = []
+        for flat, straight in value["wires"]:
+            pts = tuple(zip(flat[::2], flat[1::2]))
+            wires.append((pts, straight, pin_at[pts[0]], pin_at[pts[-1]]))
+        results[i] = {"net": net, "pins": pins, "bus": False, "wires": wires,
+                      "maze": [tuple(r) for r in value["regions"]]}
+        hits.add(key)
+    if hits:
+        db.executemany("UPDATE routes SET used = ? WHERE key = ?", [(time.time(), k) for k in hits])
+        db.commit()
+    return results, keys
+
+
+def cache_store(db, entries, obstacles=None):
+    """entries = [(键, route_net 的结果)]；写入后按 LRU 淘汰到上限以内"""
+    obst = obstacles or NO_OBSTACLES
+    rows = []
+    table = _bucket_table(obst) if any(routed["maze"] for _, routed in entries) else None
+    now = time.time()
+    for key, routed in entries:
+        regions = routed["maze"]
+        value = {"wires": [[[v for pt in pts for v in pt], straight] for pts, straight, _, _ in routed["wires"]],
+                 "regions": regions, "digest": _region_digest(obst, regions, table) if regions else None}
+        rows.append((key, json.dumps(value, separators=(",", ":")), now))
+    db.executemany("INSERT OR REPLACE INTO routes VALUES (?, ?, ?)", rows)
+
+    n, size = db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM routes").fetchone()
+    excess = max(n - ROUTE_CACHE_ENTRIES, math.ceil((size - ROUTE_CACHE_MB * 2**20) * n / size) if size else 0)
+    if excess > 0:
+        db.execute("DELETE FROM routes WHERE key IN (SELECT key FROM routes ORDER BY used LIMIT ?)", (excess,))
+    db.commit()
+
+
+# === 绘制（COM） ===
+def glue_to_pin(line, end, dev, dtype, pin, instances_map):
+    if dev and dtype in DEVICE_LIBRARY:
+        shape = instances_map.get(dev)
+        if shape:
+            pin_list = list(DEVICE_LIBRARY[dtype]["pins"].keys())
+            if pin in pin_list:
+                idx = pin_list.index(pin) + 1
+                try:
+                    conn_x = shape.CellsU(f"Connections.X{idx}")
+                    conn_y = shape.CellsU(f"Connections.Y{idx}")
+                    line.CellsU(f"{end}X").GlueTo(conn_x)
+                    line.CellsU(f"{end}Y").GlueTo(conn_y)
+                except Exception as e:
+                    print(f"[Glue] {dev}:{pin} 失败: {e}")
+
+
+def draw_buses(page, buses):
+    bus_lines = {}
+    for bus in buses:
+        y = from_dbu(bus["y"])
+        line = page.DrawLine(from_dbu(bus["x1"]), y, from_dbu(bus["x2"]), y)
+        line.Text = bus["label"]
+        line.CellsU("LineWeight").FormulaU = "2 pt"
+        line.CellsU("LineColor").FormulaU  = bus["color"]
+        line.CellsU("TxtPinX").FormulaU = "0"
+        line.CellsU("TxtPinY").FormulaU = "Height*0.5"
+        bus_lines[bus["net"]] = (line, bus["x1"], bus["y"])
+    return bus_lines
+
+
+def draw_stubs(page, stubs, instances_map, draft=False):
+    """被窗口裁断的网络：引脚到窗口边界的短线，线上写网络名；返回画出的线"""
+    lines = []
+    for stub in stubs:
+        (x1, y1), (x2, y2) = stub["begin"], stub["end"]
+        line = page.DrawLine(from_dbu(x1), from_dbu(y1), from_dbu(x2), from_dbu(y2))
+        line.Text = stub["net"]
+        if not draft:
+            glue_to_pin(line, "Begin", *stub["pin"], instances_map)
+        lines.append(line)
+    return lines
+
 
-        for p1, p2 in edges:
-            horiz = abs(p1[1]-p2[1]) < 1e-6
-            vert  = abs(p1[0]-p2[0]) < 1e-6
+def setup_draft_styles(doc, styles=None):
+    """在文档里建好草稿连线样式，返回 {"straight"/"dashed": 样式名}"""
+    styles = styles or WIRE_STYLES
+    for kind, name in DRAFT_STYLES.items():
+        style = doc.Styles.Add(name, "", 0, 1, 0)  # 只含线条格式
+        style.CellsU("LineWeight").FormulaU = "1.2 pt"
+        for cell, formula in styles[kind].items():
+            if cell != "RouteStyle":  # 草稿线是画出来的折线，不是连接线
+                style.CellsU(cell).FormulaU = formula
+    return dict(DRAFT_STYLES)
 
-            # line = page.Drop(page.Application.ConnectorToolDataObject, 0, 0)
-            line = page.DrawLine(p1[0], p1[1], p2[0], p2[1])
+
+def draw_routed_net(page, routed, instances_map, bus_lines, styles=None, draft_styles=None):
+    """画出一个网络，返回画出的线（总线网络按引脚顺序，其余按 wires 顺序）；
+    给定 draft_styles 时为草稿模式：只画几何、套共享样式，不 Glue"""
+    styles = styles or WIRE_STYLES
+    net_upper = routed["net"].upper()
+    lines = []
+    # === 特殊处理：如果是总线 ===
+    if routed["bus"]:
+        if net_upper not in bus_lines:
+            return lines
+        bus_line, bus_left, bus_y = bus_lines[net_upper]
+        for (dev, dtype, pin, pt) in routed["pins"]:
+            if draft_styles:
+                # 草稿：直接从引脚竖直画到总线
+                line = page.DrawLine(from_dbu(pt[0]), from_dbu(pt[1]), from_dbu(pt[0]), from_dbu(bus_y))
+                line.LineStyle = draft_styles["straight"]
+                lines.append(line)
+                continue
+
+            # 创建竖线（只 Glue，不设坐标）
+            line = page.Drop(page.Application.ConnectorToolDataObject, 0, 0)
             line.CellsU("ConFixedCode").FormulaU = "3"
             line.CellsU("LineWeight").FormulaU = "1.2 pt"
+            glue_to_bus(line, bus_line, bus_left, dev, dtype, pin, pt, instances_map)
+            lines.append(line)
+        return lines
 
-            if horiz or vert:
-                line.CellsU("RouteStyle").FormulaU = "16"  # Straight
-                line.CellsU("LinePattern").FormulaU = "1"   # 实线
-            else:
-                line.CellsU("RouteStyle").FormulaU = "64"  # Orthogonal
-                line.CellsU("LinePattern").FormulaU = "2"   # 虚线
-
-            # 自动 GlueTo
-            def find_dev_pin(pt, pins, tol=1e-4):
-                tx, ty = pt
-                for (dn, dt, pn, (x, y)) in pins:
-                    if abs(x - tx) < tol and abs(y - ty) < tol:
-                        return dn, dt, pn
-                return None, None, None
-
-            dev1, type1, pin1 = find_dev_pin(p1, pins)
-            dev2, type2, pin2 = find_dev_pin(p2, pins)
-
-            for dev, dtype, pin, end in [(dev1, type1, pin1, "Begin"),
-                                         (dev2, type2, pin2, "End")]:
-                if dev and dtype in DEVICE_LIBRARY:
-                    shape = instances_map.get(dev)
-                    if shape:
-                        pin_list = list(DEVICE_LIBRARY[dtype]["pins"].keys())
-                        if pin in pin_list:
-                            idx = pin_list.index(pin) + 1
-                            try:
-                                conn_x = shape.CellsU(f"Connections.X{idx}")
-                                conn_y = shape.CellsU(f"Connections.Y{idx}")
-                                line.CellsU(f"{end}X").GlueTo(conn_x)
-                                line.CellsU(f"{end}Y").GlueTo(conn_y)
-                            except Exception as e:
-                                print(f"[Glue] {dev}:{pin} 失败: {e}")
+    for pts, straight, (dev1, type1, pin1), (dev2, type2, pin2) in routed["wires"]:
+        # line = page.Drop(page.Application.ConnectorToolDataObject, 0, 0)
+        if len(pts) == 2:
+            (x1, y1), (x2, y2) = pts
+            line = page.DrawLine(from_dbu(x1), from_dbu(y1), from_dbu(x2), from_dbu(y2))
+        else:
+            xy = [from_dbu(v) for pt in pts for v in pt]
+            line = page.DrawPolyline(com_array(xy, "R8"), 8)  # visPolyline1D
+        lines.append(line)
+        if draft_styles:
+            line.LineStyle = draft_styles["straight" if straight else "dashed"]
+            continue
 
+        line.CellsU("ConFixedCode").FormulaU = "3"
+        line.CellsU("LineWeight").FormulaU = "1.2 pt"
 
-# === 主程序 ===
-def main():
-    # 启动 Visio
-    visio = win32com.client.Dispatch("Visio.Application")
-    visio.Visible = True
-    doc = visio.Documents.Add("")
-    page = visio.ActivePage
+        for cell, formula in styles["straight" if straight else "dashed"].items():
+            line.CellsU(cell).FormulaU = formula
 
-    # 打开模具库
-    stencil = visio.Documents.OpenEx(STENCIL, 64)
+        # 自动 GlueTo
+        glue_to_pin(line, "Begin", dev1, type1, pin1, instances_map)
+        glue_to_pin(line, "End", dev2, type2, pin2, instances_map)
+    return lines
+
+
+def glue_to_bus(line, bus_line, bus_left, dev, dtype, pin, pt, instances_map):
+    # 在总线上添加一个连接点；DrawLine 画出的线没有连接点节，第一次先加上
+    sec = SEC_CONNECTION_PTS
+    if not bus_line.SectionExists(sec, 0):
+        bus_line.AddSection(sec)
+    row = bus_line.AddRow(sec, -1, 0)
+    bus_line.CellsSRC(sec, row, 0).ResultIU = from_dbu(pt[0] - bus_left)
+    bus_line.CellsSRC(sec, row, 1).ResultIU = 0
+    bus_line.CellsSRC(sec, row, 2).FormulaU = "1"
+
+    # Glue 器件端
+    glue_to_pin(line, "Begin", dev, dtype, pin, instances_map)
+
+    # Glue 总线端
+    try:
+        conn_x = bus_line.CellsSRC(sec, row, 0)
+        conn_y = bus_line.CellsSRC(sec, row, 1)
+        line.CellsU("EndX").GlueTo(conn_x)
+        line.CellsU("EndY").GlueTo(conn_y)
+    except Exception as e:
+        print(f"[Glue] {bus_line.Text} 总线端失败: {e}")
+
+
+def finalize_nets(drawn, instances_map, bus_lines, nets=None):
+    """给草稿里选中的网络补上 Glue；drawn = [(routed, lines)]，nets 为 None 时处理全部，返回处理的网络数"""
+    wanted = None if nets is None else {n.upper() for n in nets}
+    count = 0
+    for routed, lines in drawn:
+        net_upper = routed["net"].upper()
+        if wanted is not None and net_upper not in wanted:
+            continue
+        if routed["bus"]:
+            if net_upper not in bus_lines:
+                continue
+            bus_line, bus_left, _ = bus_lines[net_upper]
+            for (dev, dtype, pin, pt), line in zip(routed["pins"], lines):
+                glue_to_bus(line, bus_line, bus_left, dev, dtype, pin, pt, instances_map)
+        else:
+            for (_, _, (dev1, type1, pin1), (dev2, type2, pin2)), line in zip(routed["wires"], lines):
+                line.CellsU("ConFixedCode").FormulaU = "3"
+                glue_to_pin(line, "Begin", dev1, type1, pin1, instances_map)
+                glue_to_pin(line, "End", dev2, type2, pin2, instances_map)
+        count += 1
+    return count
+
+
+def draw_net_lines(page, netlist, pin_positions, instances_map, bboxes, draft=False,
+                   layers=None, progress=None, cancel=None):
+    """返回 (drawn, bus_lines)，drawn = [(routed, 画出的线)]，供草稿模式之后 finalize_nets 使用；
+    先画总线，网络按引脚数从少到多分批画，每批写好图层；progress / cancel 见“渐进绘制”"""
+    if not bboxes or (cancel and cancel()):
+        return [], {}
+
+    buses = plan_buses(bboxes)
+    step = progress_meter(progress, "buses", len(buses))
+    with instrument.stage("draw_buses"):
+        bus_lines = draw_buses(page, buses)
+        if layers:
+            assign_layers(page, net_members([], bus_lines, layers))
+    step(len(bus_lines))
+    if cancel and cancel():
+        return [], bus_lines
+    bus_nets = {bus["net"] for bus in buses}
+    config = dict(route_config(), draft=draft)
+    draft_styles = setup_draft_styles(page.Document) if draft else None
+
+    with instrument.stage("route"):
+        net_to_points = collect_net_points(netlist, pin_positions)
+        step = progress_meter(progress, "route", len(net_to_points))
+        obstacles = route_obstacles(bboxes, config)
+        routed_nets = route_all_nets(net_to_points, bus_nets, config=config, obstacles=obstacles)
+        step(len(routed_nets))
+    # 小网络先画：同样的时间里图上能连好的网络最多，大网络（时钟、偏置）放在最后
+    routed_nets = sorted(routed_nets, key=lambda routed: len(routed["pins"]))
+    step = progress_meter(progress, "nets", len(routed_nets))
+    drawn = []
+    with instrument.stage("draw_nets"):
+        for batch in batches(routed_nets, RENDER_BATCH_NETS):
+            if cancel and cancel():
+                break
+            batch_drawn = [(routed, draw_routed_net(page, routed, instances_map, bus_lines, draft_styles=draft_styles))
+                           for routed in batch]
+            if layers:
+                assign_layers(page, net_members(batch_drawn, {}, layers))
+            drawn += batch_drawn
+            step(len(batch))
+    return drawn, bus_lines
+
+
+# === 图层 ===
+# 形状归属图层写在 LayerMember 单元格里（"0;2" 这样的图层序号列表），
+# 绘制时收集 (形状 ID, 图层序号)，每个阶段用一次 SetFormulas 批量写入。
+SRC_LAYER_MEMBER = (1, 6, 0)  # visSectionObject, visRowLayerMem, visLayerMember
+SRC_LINE_WEIGHT  = (1, 2, 0)  # visSectionObject, visRowLine, visLineWeight
+SRC_LINE_PATTERN = (1, 2, 2)  # visSectionObject, visRowLine, visLinePattern
+LAYER_CELLS = {"color": 2, "visible": 4, "print": 5, "lock": 7}  # visLayerColor / Visible / Print / Lock
+
+
+def ensure_layers(page):
+    """建好（或找回已有的）图层，返回 {类别或总线网络名: 图层序号}"""
+    names = dict(LAYER_NAMES)
+    for net, cfg in BUS_NETS.items():
+        if cfg.get("enabled", True):  # 与 plan_buses 一致，默认启用
+            names[net.upper()] = BUS_LAYER.format(net=cfg.get("label", net))
+    layers = {}
+    for key, name in names.items():
+        try:
+            layer = page.Layers.ItemU(name)
+        except Exception:
+            layer = page.Layers.Add(name)
+        layers[key] = layer.Index - 1  # LayerMember 里的序号从 0 开始
+    return layers
+
+
+def set_formulas(page, cells):
+    """cells = [(形状 ID, (Section, Row, Cell), 公式)]，一次 SetFormulas 写入；形状 ID 超出 MAX_BATCH_SID 的逐个写"""
+    sid_src, formulas = [], []
+    for sid, src, formula in cells:
+        if sid > MAX_BATCH_SID:
+            page.Shapes.ItemFromID(sid).CellsSRC(*src).FormulaU = formula
+            continue
+        sid_src += [sid, *src]
+        formulas.append(formula)
+    if not formulas:
+        return
+    page.SetFormulas(com_array(sid_src, "I2"), com_array(formulas, "VARIANT"), 8)  # visSetUniversalSyntax
+
+
+def assign_layers(page, members):
+    """members = [(形状 ID, 图层序号)]"""
+    set_formulas(page, [(sid, SRC_LAYER_MEMBER, f'"{idx}"') for sid, idx in members])
+
+
+def device_members(shapes_map, layers):
+    idx = layers["devices"]
+    return [(shape.ID, idx) for shape in shapes_map.values()]
+
+
+def net_members(drawn, bus_lines, layers):
+    members = [(line.ID, layers[net]) for net, (line, _, _) in bus_lines.items() if net in layers]
+    for routed, lines in drawn:
+        if routed["bus"]:
+            idx = layers.get(routed["net"].upper())
+            if idx is not None:
+                members += [(line.ID, idx) for line in lines]
+            continue
+        for (_, straight, _, _), line in zip(routed["wires"], lines):
+            members.append((line.ID, layers["straight" if straight else "dashed"]))
+    return members
+
+
+def set_layer(page, key, **cells):
+    """一次图层单元格写入：set_layer(page, "dashed", visible=0)；key 为类别或总线网络名"""
+    name = LAYER_NAMES.get(key) or BUS_LAYER.format(net=BUS_NETS.get(key, {}).get("label", key))
+    layer = page.Layers.ItemU(name)
+    for cell, value in cells.items():
+        layer.CellsC(LAYER_CELLS[cell]).FormulaU = str(value)
+
+
+def fix_dashed(page, drawn, layers=None):
+    """剩余虚线改为粗实线（并移到实线图层），按绘制时记下的形状一次批量写入；返回条数"""
+    cells, count = [], 0
+    for routed, lines in drawn:
+        if routed["bus"]:
+            continue
+        for (_, straight, _, _), line in zip(routed["wires"], lines):
+            if straight:
+                continue
+            sid = line.ID
+            cells += [(sid, SRC_LINE_PATTERN, "1"), (sid, SRC_LINE_WEIGHT, "1.2 pt")]
+            if layers:
+                cells.append((sid, SRC_LAYER_MEMBER, f'"{layers["straight"]}"'))
+            count += 1
+    set_formulas(page, cells)
+    return count
+
+
+# === 启动 Visio / 打开模具 ===
+def open_visio(backend=None):
+    backend = backend or BACKEND
+    if backend == "stub":
+        from visio_stub import StubApplication
+        return instrument.wrap_com(StubApplication())
+    # 延迟导入，解析/测试时不依赖 pywin32
+    import win32com.client
+    return instrument.wrap_com(win32com.client.Dispatch("Visio.Application"))
+
+
+def load_masters(visio, stencil_path=None):
+    stencil = visio.Documents.OpenEx(stencil_path or STENCIL, 64)
     # 根据 DEVICE_LIBRARY 里的 master_name 建立映射
     masters = {}
     for dev_type, cfg in DEVICE_LIBRARY.items():
+        if cfg.get("generated"):
+            continue  # 生成的方框符号不在模具里，由 add_box_masters 放进文档模具
         try:
             masters[dev_type] = stencil.Masters(cfg["master_name"])
         except Exception as e:
             print(f"[警告] 模具 {cfg['master_name']} 未找到: {e}")
+    return masters
 
-    # 解析输入文件
-    instances = parse_instances(INPUT_FILE)
-    netlist   = parse_netlist(NETLIST_FILE)
 
-    pin_positions = {}
-    bboxes = {}
+# === 渐进绘制 ===
+# 按优先级分批画：先器件，再总线，最后网络按引脚数从少到多；
+# 每批画完（连同标签、图层）报告一次进度 {"stage", "done", "total", "seconds", "rate"}，布线算完也报告一次；
+# cancel() 为真时在批与批之间停下，已画的每一批都是完整的，文档可以直接保存。
+RENDER_BATCH_DEVICES = 500  # 每批放置的器件数（render_journal 的检查点也按它分批）
+RENDER_BATCH_NETS    = 200  # 每批绘制的网络数
+STAGE_NAMES = {"devices": "器件", "buses": "总线", "route": "布线", "nets": "网络"}
+
+
+def print_progress(event):
+    print(f"⏳ {STAGE_NAMES.get(event['stage'], event['stage'])} {event['done']}/{event['total']}"
+          f"（{event['rate']:.0f} 个/s）")
+
+
+def progress_meter(progress, stage, total):
+    """返回 step(n)：又画完 n 个时调用，向 progress 报告累计数量和速率；progress 为 None 时什么也不做"""
+    t0 = time.perf_counter()
+    done = 0
+
+    def step(n):
+        nonlocal done
+        done += n
+        if progress:
+            dt = time.perf_counter() - t0
+            progress({"stage": stage, "done": done, "total": total,
+                      "seconds": round(dt, 3), "rate": done / dt if dt > 0 else 0.0})
+    return step
+
+
+def batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# === 放置 + 连线（一次完整绘制） ===
+def placeable_devices(instances, masters):
+    return [inst for inst in instances.values()
+            if inst["type"] in DEVICE_LIBRARY and inst["type"] in masters]
+
+
+def place_device_batches(page, instances, masters, bboxes=None, labels=True, layers=None, cancel=None):
+    """逐批放置器件，每批画完写标签和图层后 yield 这批的 {name: shape}；
+    调用方可以在批与批之间做别的事（流水线在这里让出事件循环）"""
+    todo = placeable_devices(instances, masters)
+    label_pos = {}
+    if labels:  # 草稿模式：标签保持模具默认位置
+        if bboxes is None:
+            bboxes = compute_placement(instances, masters)[1]
+        label_pos = place_labels(instances, bboxes)
+
+    for batch in batches(todo, RENDER_BATCH_DEVICES):
+        if cancel and cancel():
+            return
+        batch_shapes = {}
+        for inst in batch:
+            drop_with_label(page, masters[inst["type"]], inst, batch_shapes)
+        if label_pos:
+            write_labels(page, batch_shapes, {name: label_pos[name] for name in batch_shapes if name in label_pos})
+        if layers:
+            assign_layers(page, device_members(batch_shapes, layers))
+        yield batch_shapes
+
+
+def place_devices(page, instances, masters, bboxes=None, labels=True, layers=None, progress=None, cancel=None):
+    """分批放置器件，每批画完写标签和图层；progress / cancel 见“渐进绘制”"""
+    step = progress_meter(progress, "devices", len(placeable_devices(instances, masters)))
     shapes_map = {}
+    for batch_shapes in place_device_batches(page, instances, masters, bboxes, labels, layers, cancel):
+        shapes_map.update(batch_shapes)
+        step(len(batch_shapes))
+    return shapes_map
+
+
+def render_design(page, instances, netlist, masters, draft=None, window=None, clipped=(),
+                  progress=None, cancel=None):
+    """返回 (shapes_map, drawn, bus_lines)，后两者供草稿模式的 finalize_nets 使用；
+    window / clipped 来自 window_subset / load_window，给被裁断的网络画引出短线；
+    progress 接收进度事件（默认打印），cancel() 为真时在批与批之间停下，返回已画的部分"""
+    progress = progress or print_progress
+    cancel = cancel or (lambda: False)
+    draft = DRAFT if draft is None else draft
+    instances = attach_symbols(instances, netlist)
+    instances = attach_params(complete_placement(instances, netlist), netlist)
+    masters = add_box_masters(page.Document, masters, (inst["type"] for inst in instances.values()))
+    with instrument.stage("placement"):
+        pin_positions, bboxes = compute_placement(instances, masters)
+    layers = ensure_layers(page) if USE_LAYERS else None
 
     # 放置器件
-    for inst in instances.values():
-        dev_type = inst["type"]
-        cfg = DEVICE_LIBRARY.get(dev_type, None)
-        if not cfg or dev_type not in masters:
-            continue
-        master = masters[dev_type]
-        shp = drop_with_label(page, master, inst, pin_positions, shapes_map)
-        if shp:
-            w, h = cfg["size"]
-            cx, cy = inst["xy"]
-            bboxes[inst["name"]] = (cx - w/2, cy - h/2, cx + w/2, cy + h/2)
+    with instrument.stage("place_devices"):
+        shapes_map = place_devices(page, instances, masters, bboxes, not draft, layers, progress, cancel)
+    if cancel():
+        print(f"⏹️  已取消：放置了 {len(shapes_map)} 个器件")
+        return shapes_map, [], {}
     print("\n✅ 所有器件已放置完成")
-    print("➡️  开始自动连线...")
+    print("➡️  开始自动连线..." + ("（草稿模式，未 Glue）" if draft else ""))
+
+    drawn, bus_lines = draw_net_lines(page, netlist, pin_positions, shapes_map, bboxes, draft,
+                                      layers, progress, cancel)
+    if cancel():
+        print(f"⏹️  已取消：画了 {len(shapes_map)} 个器件、{len(bus_lines)} 条总线、{len(drawn)} 个网络")
+        return shapes_map, drawn, bus_lines
 
-    draw_net_lines(page, netlist, pin_positions, shapes_map, bboxes)
+    if window and clipped:
+        with instrument.stage("stubs"):
+            stubs = plan_stubs(collect_net_points(netlist, pin_positions), clipped,
+                               window_dbu(window), set(bus_lines))
+            lines = draw_stubs(page, stubs, shapes_map, draft)
+            if layers:
+                assign_layers(page, [(line.ID, layers["labels"]) for line in lines])
+        print(f"✂️  {len(lines)} 个被裁断的网络画了引出短线")
 
     print("✅ 连线完成")
+    return shapes_map, drawn, bus_lines
+
+
+# === 主程序 ===
+def main():
+    if PROFILE:
+        instrument.enable()
+
+    # 启动 Visio
+    with instrument.stage("open_visio"):
+        visio = open_visio()
+    visio.Visible = True
+    doc = visio.Documents.Add("")
+    page = visio.ActivePage
+
+    # 打开模具库
+    with instrument.stage("load_masters"):
+        masters = load_masters(visio)
+
+    # 解析输入文件
+    clipped = ()
+    if WINDOW:
+        with instrument.stage("parse_window"):
+            instances, netlist, clipped = load_window(INPUT_FILE, NETLIST_FILE, WINDOW)
+    else:
+        with instrument.stage("parse_instances"):
+            instances = parse_instances(INPUT_FILE)
+        with instrument.stage("parse_netlist"):
+            netlist   = parse_netlist(NETLIST_FILE)
+    with instrument.stage("cone"):
+        instances, netlist = cone_subset(instances, netlist)
+
+    with instrument.stage("render"):
+        shapes_map, drawn, bus_lines = render_design(page, instances, netlist, masters,
+                                                     window=WINDOW, clipped=clipped)
+
+    # === 草稿模式：按需补 Glue ===
+    if DRAFT:
+        picked = input("\n输入要补上 Glue 的网络（逗号分隔，* 为全部，回车跳过）: ").strip()
+        if picked:
+            nets = None if picked == "*" else [n.strip() for n in picked.split(",") if n.strip()]
+            with instrument.stage("finalize"):
+                count = finalize_nets(drawn, shapes_map, bus_lines, nets)
+            print(f"🔗 已为 {count} 个网络补上 Glue")
+
+    # === 回读连接关系，与网表比对 ===
+    if VERIFY:
+        import verify_drawing
+        with instrument.stage("verify"):
+            diff = verify_drawing.verify(page, netlist, shapes_map, drawn, bus_lines)
+        verify_drawing.print_report(diff)
+        with open(VERIFY_FILE, "w", encoding="utf-8") as f:
+            json.dump(diff, f, ensure_ascii=False, indent=1)
+        print(f"📝 核对结果已写出: {VERIFY_FILE}")
 
     # === 交互式处理虚线 ===
     choice = input("\n是否将剩余虚线改为粗实线？ [Y/N]: ").strip().lower()
     if choice == "y":
-        modified = 0
-        for shape in page.Shapes:
-            try:
-                if shape.OneD and shape.CellExistsU("LinePattern", 0):
-                    if int(shape.CellsU("LinePattern").ResultIU) == 2:  # 虚线
-                        shape.CellsU("LinePattern").FormulaU = "1"   # 改为实线
-                        shape.CellsU("LineWeight").FormulaU = "1.2 pt"
-                        modified += 1
-            except Exception:
-                pass
+        with instrument.stage("fix_dashed"):
+            # 只改绘制时记下的虚线，一次批量写入，不再逐个遍历页面上的形状
+            modified = fix_dashed(page, drawn, ensure_layers(page) if USE_LAYERS else None)
         print(f"✨ 已将 {modified} 条虚线改为实线")
     else:
         print("⚡ 保留虚线，不做修改")
 
+    if PROFILE:
+        instrument.print_summary()
+        instrument.write_trace(TRACE_FILE)
+        print(f"📈 trace 已写出: {TRACE_FILE}")
+
 
 
 if __name__ == "__main__":
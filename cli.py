@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+
+import cadence_to_visio_V2 as c2v
+import instrument
+
+# === 命令行入口 ===
+#   python cli.py parse  [--json out.json]           只解析，打印器件 / 网络统计
+#   python cli.py route  [-o plan.json.gz] [-j N]    解析 + 布局 + 布线（可写出绘图计划）
+#   python cli.py render [-o out.vsdx] [--stub] ...  完整绘制到 Visio（或本地替身）
+#   python cli.py stats  [--json sizing.json]        器件参数统计
+# parse / route / render 都可加 --cone VWL2V,NM1 --hops 2，只处理这些网络 / 器件附近的电路；
+# --window X1,Y1,X2,Y2 只处理版图坐标窗口内的器件。
+# render 画的过程中按一次 Ctrl-C 会在当前这批画完后停下，已画的部分照常保存；再按一次直接中断。
+# 输入文件、模具、进程数都从命令行给，不用改脚本里的常量。
+# 各子命令用到的模块在函数里才导入，win32com 只有 render 真正连 Visio 时才加载，
+# parse / route / stats 在没有 pywin32 的机器上也能用，启动只需几十毫秒。
+
+
+def _window(args):
+    return [float(v) for v in args.window.split(",")] if args.window else None
+
+
+def _load(args):
+    """返回 (instances, netlist, clipped)；clipped 为 --window 裁断的网络"""
+    clipped = ()
+    if args.window:
+        instances, netlist, clipped = c2v.load_window(args.inst_info, args.netlist, _window(args),
+                                                      args.parse_workers)
+    else:
+        netlist = c2v.parse_netlist(args.netlist, args.parse_workers)
+        instances = c2v.parse_instances(args.inst_info)
+    if args.cone:
+        instances, netlist = c2v.cone_subset(instances, netlist, [s for s in args.cone.split(",") if s],
+                                             args.hops)
+    return instances, netlist, clipped
+
+
+def cmd_parse(args):
+    instances, netlist, _ = _load(args)
+    by_type = {}
+    for dev in netlist:
+        by_type[dev["type"]] = by_type.get(dev["type"], 0) + 1
+    nets = {net for dev in netlist for net in dev["pins"].values()}
+    missing = sum(1 for dev in netlist if dev["name"] not in instances)
+    print(f"📄 {len(netlist)} 个器件，{len(nets)} 个网络，inst_info 中 {len(instances)} 个实例"
+          + (f"，{missing} 个缺少坐标" if missing else ""))
+    for dev_type, n in sorted(by_type.items(), key=lambda kv: -kv[1]):
+        print(f"  {dev_type:<10}{n:>10}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"instances": list(instances.values()), "netlist": netlist}, f, ensure_ascii=False)
+
+
+def cmd_route(args):
+    import drawing_plan
+    instances, netlist, _ = _load(args)
+    plan = drawing_plan.build_plan(instances, netlist, workers=args.workers)
+    wires = plan["wires"]
+    dashed = sum(1 for style in wires["style"] if style != "straight")
+    print(f"🧵 {len(plan['nets']['name'])} 个网络，{len(wires['net'])} 条连线（虚线 {dashed} 条），"
+          f"{len(plan['taps']['net'])} 个总线引脚")
+    if args.output:
+        drawing_plan.save_plan(plan, args.output)
+        print(f"✅ 绘图计划已写出: {args.output}")
+
+
+def _cancel_on_sigint():
+    """第一次 Ctrl-C 只置位返回的 Event，之后恢复默认处理"""
+    stop = threading.Event()
+
+    def handler(signum, frame):
+        stop.set()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        print("\n⏸️  收到 Ctrl-C，画完这一批后停止（再按一次直接中断）")
+
+    signal.signal(signal.SIGINT, handler)
+    return stop
+
+
+def cmd_render(args):
+    instances, netlist, clipped = _load(args)
+    visio = c2v.open_visio("stub" if args.stub else None)
+    visio.Visible = True
+    doc = visio.Documents.Add("")
+    page = doc.Pages(1)
+    masters = c2v.load_masters(visio, args.stencil)
+    stop = _cancel_on_sigint()
+    try:
+        shapes_map, drawn, bus_lines = c2v.render_design(page, instances, netlist, masters, args.draft or None,
+                                                         _window(args), clipped, cancel=stop.is_set)
+    finally:
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+    if stop.is_set():
+        # 只画了一部分，不补 Glue、不核对，保存已画的内容
+        if args.output:
+            doc.SaveAs(os.path.abspath(args.output))
+            print(f"💾 已保存画到一半的文档: {args.output}")
+        return False
+    if args.finalize:
+        nets = None if args.finalize == "*" else [n for n in args.finalize.split(",") if n]
+        print(f"🔗 已为 {c2v.finalize_nets(drawn, shapes_map, bus_lines, nets)} 个网络补上 Glue")
+    ok = True
+    if args.verify:
+        import verify_drawing
+        diff = verify_drawing.verify(page, netlist, shapes_map, drawn, bus_lines)
+        verify_drawing.print_report(diff)
+        with open(args.verify, "w", encoding="utf-8") as f:
+            json.dump(diff, f, ensure_ascii=False, indent=1)
+        ok = diff["ok"]
+    if args.output:
+        doc.SaveAs(os.path.abspath(args.output))
+        print(f"💾 已保存: {args.output}")
+    return ok
+
+
+def cmd_stats(args):
+    import device_params
+    netlist = c2v.annotate_params(c2v.parse_netlist(args.netlist))
+    models, nets = device_params.model_stats(netlist), device_params.net_stats(netlist)
+    device_params.print_report(models, nets, args.top)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"models": models, "nets": nets}, f, ensure_ascii=False, indent=1)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="CDL 网表 -> Visio 原理图")
+    ap.add_argument("--profile", action="store_true", help="打印各阶段耗时与 COM 调用统计")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    def inputs(p):
+        p.add_argument("--inst-info", default=c2v.INPUT_FILE)
+        p.add_argument("--netlist", default=c2v.NETLIST_FILE)
+        p.add_argument("--parse-workers", type=int, default=None, help="网表解析进程数（大文件分块并行）")
+        p.add_argument("--cone", default=None, metavar="NETS", help="只处理这些网络 / 器件附近的电路，逗号分隔")
+        p.add_argument("--hops", type=int, default=None, help="--cone 扩展的跳数")
+        p.add_argument("--window", default=None, metavar="X1,Y1,X2,Y2", help="只处理版图坐标窗口内的器件")
+
+    p = sub.add_parser("parse", help="只解析输入文件")
+    inputs(p)
+    p.add_argument("--json", default=None, help="把解析结果写成 JSON")
+    p.set_defaults(fn=cmd_parse)
+
+    p = sub.add_parser("route", help="解析 + 布局 + 布线，不需要 Visio")
+    inputs(p)
+    p.add_argument("-j", "--workers", type=int, default=None, help="布线进程数")
+    p.add_argument("--route-cache", default=None, metavar="DB", help="布线缓存文件（迷宫布线时生效），没变的网络直接取上次的结果")
+    p.add_argument("--maze", action="store_true", help="斜线用迷宫布线绕开器件（慢）")
+    p.add_argument("-o", "--output", default=None, help="写出绘图计划（.json / .json.gz）")
+    p.set_defaults(fn=cmd_route)
+
+    p = sub.add_parser("render", help="绘制到 Visio")
+    inputs(p)
+    p.add_argument("--stencil", default=None)
+    p.add_argument("--stub", action="store_true", help="使用本地替身，不启动 Visio")
+    p.add_argument("--draft", action="store_true", help="草稿模式：不 Glue，不写标签格式")
+    p.add_argument("--finalize", default=None, help="草稿画完后补 Glue 的网络，逗号分隔，* 为全部")
+    p.add_argument("--verify", default=None, metavar="DIFF_JSON", help="回读连接关系并与网表比对")
+    p.add_argument("--route-cache", default=None, metavar="DB", help="布线缓存文件（迷宫布线时生效），没变的网络直接取上次的结果")
+    p.add_argument("--maze", action="store_true", help="斜线用迷宫布线绕开器件（慢）")
+    p.add_argument("-o", "--output", default=None)
+    p.set_defaults(fn=cmd_render)
+
+    p = sub.add_parser("stats", help="器件参数统计")
+    p.add_argument("--netlist", default=c2v.NETLIST_FILE)
+    p.add_argument("--top", type=int, default=20)
+    p.add_argument("--json", default=None)
+    p.set_defaults(fn=cmd_stats)
+
+    args = ap.parse_args(argv)
+    instrument.enable(args.profile or c2v.PROFILE)
+    if getattr(args, "route_cache", None):
+        c2v.ROUTE_CACHE = args.route_cache
+    if getattr(args, "maze", False):
+        c2v.MAZE_ROUTE = True
+    t0 = time.perf_counter()
+    with instrument.stage(args.cmd):
+        ok = args.fn(args)
+    print(f"⏱️  {args.cmd} 用时 {time.perf_counter() - t0:.3f}s")
+    if instrument.ENABLED:
+        instrument.print_summary()
+    if ok is False:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
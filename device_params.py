@@ -0,0 +1,107 @@
+import argparse
+import json
+
+import cadence_to_visio_V2 as c2v
+
+# === 器件参数统计 ===
+# 基于 annotate_params 换算好的数值（dev["values"]）做尺寸报表：
+#   按模型（cell 名）：个数、总并联数 mr、各参数的最小/最大/平均值、MOS 总栅宽 Σw·mr
+#   按网络：引脚数、栅极负载 Σw·mr / Σw·l·mr（接在 G 上的 MOS）、
+#           漏/源扩散宽度 Σw·mr（接在 D/S 上的 MOS）、电容 Σc·mr、电阻个数
+# 都是对器件列表的一次遍历。
+
+MOS_TYPES = ("NMOS", "PMOS")
+
+
+def model_stats(netlist):
+    stats = {}
+    for dev in netlist:
+        values = dev["values"]
+        mr = values.get("mr", 1.0)
+        s = stats.get(dev["model"])
+        if s is None:
+            s = stats[dev["model"]] = {"type": dev["type"], "count": 0, "m": 0.0,
+                                       "total_w": 0.0, "params": {}}
+        s["count"] += 1
+        s["m"] += mr
+        if dev["type"] in MOS_TYPES:
+            s["total_w"] += values.get("w", 0.0) * mr
+        for key, v in values.items():
+            p = s["params"].get(key)
+            if p is None:
+                s["params"][key] = {"min": v, "max": v, "sum": v}
+            else:
+                p["min"] = min(p["min"], v)
+                p["max"] = max(p["max"], v)
+                p["sum"] += v
+    for s in stats.values():
+        for p in s["params"].values():
+            p["mean"] = p.pop("sum") / s["count"]
+    return stats
+
+
+def net_stats(netlist):
+    stats = {}
+    for dev in netlist:
+        values = dev["values"]
+        mr = values.get("mr", 1.0)
+        mos = dev["type"] in MOS_TYPES
+        for pin, net in dev["pins"].items():
+            s = stats.get(net)
+            if s is None:
+                s = stats[net] = {"pins": 0, "gate_w": 0.0, "gate_area": 0.0,
+                                  "diff_w": 0.0, "cap": 0.0, "res": 0}
+            s["pins"] += 1
+            if mos and pin == "G":
+                w = values.get("w", 0.0)
+                s["gate_w"] += w * mr
+                s["gate_area"] += w * values.get("l", 0.0) * mr
+            elif mos and pin in ("D", "S"):
+                s["diff_w"] += values.get("w", 0.0) * mr
+            elif dev["type"] == "Cap":
+                s["cap"] += values.get("c", 0.0) * mr
+            elif dev["type"] == "RES":
+                s["res"] += 1
+    return stats
+
+
+def format_si(value):
+    """数值 -> SI 后缀写法（3 位有效数字），与网表写法一致：1.2u、91K"""
+    if value == 0:
+        return "0"
+    for suffix, exp in sorted([*c2v.SI_SUFFIX.items(), ("", 0)], key=lambda kv: -kv[1]):
+        if abs(value) >= 10.0 ** exp * 0.9995:
+            return f"{value / 10.0 ** exp:.3g}{suffix.upper() if exp > 0 else suffix}"
+    return f"{value:.3g}"
+
+
+def print_report(models, nets, top=20):
+    print(f"\n{'模型':<20}{'类型':<6}{'个数':>8}{'Σmr':>8}{'Σw·mr':>10}  参数范围")
+    for model, s in sorted(models.items(), key=lambda kv: -kv[1]["count"]):
+        ranges = "  ".join(f"{k}={format_si(p['min'])}~{format_si(p['max'])}"
+                           for k, p in s["params"].items() if k != "mr")
+        print(f"{model:<20}{s['type']:<8}{s['count']:>8}{s['m']:>8g}{format_si(s['total_w']):>10}  {ranges}")
+
+    print(f"\n{'网络':<20}{'引脚':>6}{'栅宽':>10}{'栅面积':>10}{'扩散宽':>10}{'电容':>10}  （按栅极负载取前 {top} 个）")
+    for net, s in sorted(nets.items(), key=lambda kv: -kv[1]["gate_area"])[:top]:
+        print(f"{net:<20}{s['pins']:>6}{format_si(s['gate_w']):>10}{format_si(s['gate_area']):>10}"
+              f"{format_si(s['diff_w']):>10}{format_si(s['cap']):>10}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="器件参数统计（按模型 / 按网络）")
+    ap.add_argument("--netlist", default=c2v.NETLIST_FILE)
+    ap.add_argument("--top", type=int, default=20, help="网络表显示的行数")
+    ap.add_argument("--json", default=None, help="把统计写成 JSON")
+    args = ap.parse_args()
+
+    netlist = c2v.annotate_params(c2v.parse_netlist(args.netlist))
+    models, nets = model_stats(netlist), net_stats(netlist)
+    print_report(models, nets, args.top)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"models": models, "nets": nets}, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import gzip
+import json
+import os
+import time
+
+import cadence_to_visio_V2 as c2v
+
+# === 绘图计划（drawing plan） ===
+# 把“算”和“画”拆开：build 阶段只做解析、几何和布线（纯 Python，可在 Linux 批量跑），
+# 结果写成按列存放的 JSON（文件名以 .gz 结尾时自动 gzip）；
+# replay 阶段在装有 Visio 的机器上读取计划，只负责把形状推给 Visio。
+#
+# 结构（每张表都是 列名 -> 列表，同一下标为一行）：
+#   devices: name / type / x / y / orient / label_x / label_y（标签在形状局部坐标中的位置）/
+#            params（网表里的参数原始写法 {"w": "800n", ...}）
+#   buses:   net / label / color / x1 / x2 / y
+#   nets:    name / bus                         —— 绘制顺序
+#   taps:    net / dev / pin / x / y            —— 总线网络上的器件引脚
+#   wires:   net / path / style / begin_dev / begin_pin / end_dev / end_pin
+#            path 为展平的折线坐标 [x1, y1, x2, y2, ...]
+#   styles:  样式名 -> {Cell: Formula}
+# dev 列是 devices 表的下标，-1 表示该端点不 Glue。
+# 坐标均为整数 DBU（顶层 "dbu" 字段记录每个绘图单位的 DBU 数）。
+
+PLAN_VERSION = 5
+
+
+def _table(*cols):
+    return {c: [] for c in cols}
+
+
+def _add_row(table, *values):
+    for col, v in zip(table.values(), values):
+        col.append(v)
+
+
+def build_plan(instances, netlist, dev_types=None, workers=None):
+    instances = c2v.attach_symbols(instances, netlist)
+    instances = c2v.attach_params(c2v.complete_placement(instances, netlist), netlist)
+    pin_positions, bboxes = c2v.compute_placement(instances, dev_types)
+    buses = c2v.plan_buses(bboxes)
+    bus_nets = frozenset(bus["net"] for bus in buses)
+    net_to_points = c2v.collect_net_points(netlist, pin_positions) if bboxes else {}
+
+    plan = {
+        "version": PLAN_VERSION,
+        "dbu": c2v.DBU,
+        "devices": _table("name", "type", "x", "y", "orient", "label_x", "label_y", "params"),
+        "buses":   _table("net", "label", "color", "x1", "x2", "y"),
+        "nets":    _table("name", "bus"),
+        "taps":    _table("net", "dev", "pin", "x", "y"),
+        "wires":   _table("net", "path", "style", "begin_dev", "begin_pin", "end_dev", "end_pin"),
+        "styles":  c2v.WIRE_STYLES,
+    }
+
+    labels = c2v.place_labels(instances, bboxes)
+    dev_index = {}
+    for inst in instances.values():
+        if inst["name"] not in bboxes:
+            continue
+        dev_index[inst["name"]] = len(dev_index)
+        _add_row(plan["devices"], inst["name"], inst["type"],
+                 inst["xy"][0], inst["xy"][1], inst["orient"], *labels[inst["name"]],
+                 inst.get("params", {}))
+
+    for bus in buses:
+        _add_row(plan["buses"], bus["net"], bus["label"], bus["color"],
+                 bus["x1"], bus["x2"], bus["y"])
+
+    for routed in c2v.route_all_nets(net_to_points, bus_nets, workers,
+                                     obstacles=c2v.route_obstacles(bboxes)):
+        if not routed["bus"] and not routed["wires"]:
+            continue
+        net_i = len(plan["nets"]["name"])
+        _add_row(plan["nets"], routed["net"], routed["bus"])
+        if routed["bus"]:
+            for dev, _, pin, (x, y) in routed["pins"]:
+                _add_row(plan["taps"], net_i, dev_index.get(dev, -1), pin, x, y)
+            continue
+        for pts, straight, (dev1, _, pin1), (dev2, _, pin2) in routed["wires"]:
+            _add_row(plan["wires"], net_i, [v for pt in pts for v in pt],
+                     "straight" if straight else "dashed",
+                     dev_index.get(dev1, -1), pin1, dev_index.get(dev2, -1), pin2)
+    return plan
+
+
+def _open(filename, mode):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, mode + "t", encoding="utf-8")
+    return open(filename, mode, encoding="utf-8")
+
+
+def save_plan(plan, filename):
+    with _open(filename, "w") as f:
+        json.dump(plan, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_plan(filename):
+    with _open(filename, "r") as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"不支持的绘图计划版本: {plan.get('version')}")
+    if plan["dbu"] != c2v.DBU:
+        raise ValueError(f"绘图计划的 DBU ({plan['dbu']}) 与当前配置 ({c2v.DBU}) 不一致")
+    return plan
+
+
+def _rows(table):
+    return zip(*table.values())
+
+
+# === 回放：按计划绘制 ===
+def replay_plan(page, plan, masters):
+    devices = plan["devices"]
+    names, types = devices["name"], devices["type"]
+
+    # 计划里的方框类型（未知器件）在这里重新登记，master 在文档模具里找或现做
+    for dev_type in set(types):
+        if c2v.box_pins(dev_type):
+            c2v.register_box(c2v.box_pins(dev_type))
+    masters = c2v.add_box_masters(page.Document, masters, types)
+
+    layers = c2v.ensure_layers(page) if c2v.USE_LAYERS else None
+    shapes_map = {}
+    labels = {}
+    for name, dev_type, x, y, orient, label_x, label_y, params in _rows(devices):
+        if dev_type not in masters:
+            continue
+        inst = {"name": name, "type": dev_type, "xy": (x, y), "orient": orient, "params": params}
+        c2v.drop_with_label(page, masters[dev_type], inst, shapes_map)
+        labels[name] = (label_x, label_y)
+    c2v.write_labels(page, shapes_map, labels)
+    if layers:
+        c2v.assign_layers(page, c2v.device_members(shapes_map, layers))
+    print("\n✅ 所有器件已放置完成")
+    print("➡️  开始自动连线...")
+
+    buses = [dict(zip(plan["buses"], row)) for row in _rows(plan["buses"])]
+    bus_lines = c2v.draw_buses(page, buses)
+
+    def end(dev, pin):
+        return (names[dev], types[dev], pin) if dev >= 0 else (None, None, None)
+
+    # 计划里各表的行按网络顺序排列，逐个网络取出对应的行
+    taps = list(_rows(plan["taps"]))
+    wires = list(_rows(plan["wires"]))
+    ti = wi = 0
+    drawn = []
+    for net_i, (net, is_bus) in enumerate(_rows(plan["nets"])):
+        routed = {"net": net, "bus": is_bus, "pins": [], "wires": []}
+        while ti < len(taps) and taps[ti][0] == net_i:
+            _, dev, pin, x, y = taps[ti]
+            routed["pins"].append(end(dev, pin) + ((x, y),))
+            ti += 1
+        while wi < len(wires) and wires[wi][0] == net_i:
+            _, path, style, d1, pin1, d2, pin2 = wires[wi]
+            pts = tuple(zip(path[0::2], path[1::2]))
+            routed["wires"].append((pts, style == "straight", end(d1, pin1), end(d2, pin2)))
+            wi += 1
+        drawn.append((routed, c2v.draw_routed_net(page, routed, shapes_map, bus_lines, plan["styles"])))
+    if layers:
+        c2v.assign_layers(page, c2v.net_members(drawn, bus_lines, layers))
+
+    print("✅ 连线完成")
+    return shapes_map
+
+
+def main():
+    ap = argparse.ArgumentParser(description="生成 / 回放绘图计划")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("build", help="解析 + 布线，写出绘图计划（不需要 Visio）")
+    p.add_argument("--inst-info", default=c2v.INPUT_FILE)
+    p.add_argument("--netlist", default=c2v.NETLIST_FILE)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("-o", "--output", required=True)
+
+    p = sub.add_parser("replay", help="把绘图计划推给 Visio")
+    p.add_argument("plan")
+    p.add_argument("--stub", action="store_true", help="使用本地替身，不启动 Visio")
+    p.add_argument("-o", "--output", default=None)
+
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    if args.cmd == "build":
+        plan = build_plan(c2v.parse_instances(args.inst_info),
+                          c2v.parse_netlist(args.netlist), workers=args.workers)
+        save_plan(plan, args.output)
+        print(f"✅ 绘图计划已写出: {args.output}（{len(plan['devices']['name'])} 个器件，"
+              f"{len(plan['wires']['net'])} 条连线，{time.perf_counter() - t0:.3f}s）")
+        return
+
+    plan = load_plan(args.plan)
+    visio = c2v.open_visio("stub" if args.stub else None)
+    visio.Visible = True
+    doc = visio.Documents.Add("")
+    masters = c2v.load_masters(visio)
+    replay_plan(visio.ActivePage, plan, masters)
+    print(f"⏱️  回放用时 {time.perf_counter() - t0:.3f}s")
+    if args.output:
+        doc.SaveAs(os.path.abspath(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import math
+import os
+import random
+
+# === 合成设计生成器 ===
+# 按随机种子生成一对互相匹配的 CDL 网表和 inst_info.txt，格式与 Virtuoso 导出的一致，
+# 用于基准测试和规模回归。可配置器件数、器件类型比例、网络扇出分布、方向分布和总线网络；
+# missing 为 inst_info.txt 里故意漏掉的器件比例（只在网表里出现，测自动布局）。
+# 同样的参数 + 种子得到逐字节相同的文件。
+
+ORIENTS = ["R0", "R90", "R180", "R270", "MX", "MY", "MXR90", "MYR90"]
+
+DEVICE_MIX = {"NMOS": 0.45, "PMOS": 0.35, "RES": 0.12, "Cap": 0.08}
+
+# 类型 -> (inst 名前缀, 网表名前缀, cell 名, 引脚数, 参数模板)
+DEVICE_FORMS = {
+    "NMOS": ("NM", "XNM", "n25ll_ckt", 4, "mr={mr} l={l} w={w}"),
+    "PMOS": ("PM", "XPM", "p25ll_ckt", 4, "mr={mr} l={l} w={w}"),
+    "RES":  ("R",  "XR",  "rpposab_2t_ckt", 2, "r={r} w={w} l={l} mr={mr}"),
+    "Cap":  ("C",  "CC",  "mimcap_ckt", 2, "c={c} mr={mr}"),
+}
+
+LENGTHS = ["350n", "400n", "1.2u", "1.8u", "2.4u", "2.8u", "8u", "10u"]
+WIDTHS  = ["800n", "1u", "1.2u", "2u", "2.8u", "4u", "10u", "12u"]
+RES     = ["313.755", "10K", "91.0181K", "121.357K"]
+CAPS    = ["10f", "100f", "1p", "2.5p"]
+
+PITCH = 1.25     # 器件间距（与示例 inst_info 的量级一致）
+GRID  = 0.0625   # 坐标网格（1/16）
+
+
+def _fmt(v):
+    # 1/16 网格最多 4 位小数，%g 在大坐标下会截断有效数字
+    return f"{v:.4f}".rstrip("0").rstrip(".")
+
+
+def sample_fanout(rng, dist, mean, max_fanout):
+    if dist == "uniform":
+        n = rng.randint(2, max(2, int(2 * mean) - 2))
+    elif dist == "powerlaw":
+        # Pareto 尾部：大部分网络很小，少量网络扇出很大
+        alpha = mean / max(mean - 2.0, 0.1)
+        n = int(2 * (1.0 - rng.random()) ** (-1.0 / alpha))
+    else:  # geometric
+        p = 1.0 / max(mean - 1.0, 1.0)
+        n = 2 + int(math.log(1.0 - rng.random()) / math.log(1.0 - p)) if p < 1 else 2
+    return max(2, min(n, max_fanout))
+
+
+def generate(n_devices, seed=0, mix=None, fanout="geometric", mean_fanout=3.0,
+             max_fanout=64, orient_weights=None, bus_nets=("VDDA", "VSSA"), bus_prob=0.7, missing=0.0):
+    """返回 (inst_info 文本行列表, 网表文本行列表)"""
+    rng = random.Random(seed)
+    mix = mix or DEVICE_MIX
+    types = list(mix)
+    weights = [mix[t] for t in types]
+    orient_weights = orient_weights or [8, 1, 1, 1, 2, 2, 1, 1]
+    vdd, vss = (list(bus_nets) + [None, None])[:2]
+
+    # 1) 器件类型、方向、坐标
+    dev_types = rng.choices(types, weights, k=n_devices)
+    orients = rng.choices(ORIENTS, orient_weights, k=n_devices)
+    cols = max(1, int(math.sqrt(n_devices)))
+    counters = {t: 0 for t in types}
+    names = []
+    for t in dev_types:
+        names.append(f"{DEVICE_FORMS[t][0]}{counters[t]}")
+        counters[t] += 1
+
+    # 2) 引脚槽位：体端和一部分源端接电源/地，其余进入信号网络
+    pins = []      # 每个器件的网络名列表
+    slots = []     # (器件下标, 引脚下标) 待分配信号网络
+    for i, t in enumerate(dev_types):
+        n_pins = DEVICE_FORMS[t][3]
+        nets = [None] * n_pins
+        if t in ("NMOS", "PMOS"):
+            rail = vss if t == "NMOS" else vdd
+            if rail:
+                nets[3] = rail
+                if rng.random() < bus_prob:
+                    nets[2] = rail
+        pins.append(nets)
+        slots.extend((i, k) for k in range(n_pins) if nets[k] is None)
+    rng.shuffle(slots)
+
+    # 3) 按扇出分布把槽位切成信号网络
+    pos, net_id = 0, 0
+    while pos < len(slots):
+        size = sample_fanout(rng, fanout, mean_fanout, max_fanout)
+        if len(slots) - pos - size == 1:
+            size += 1  # 不留单引脚网络
+        for i, k in slots[pos:pos + size]:
+            pins[i][k] = f"net{net_id}"
+        pos += size
+        net_id += 1
+
+    # 4) 输出；漏掉的器件用单独的随机数挑，不影响其余内容
+    dropped = set(random.Random(seed).sample(range(n_devices), int(n_devices * missing))) if missing else set()
+    inst_lines, net_lines = [], []
+    ports = [n for n in bus_nets if n]
+    net_lines.append(f".SUBCKT SYNTH_{n_devices}_{seed} " + " ".join(ports))
+    for i, t in enumerate(dev_types):
+        inst_prefix, net_prefix, cell, _, param_tpl = DEVICE_FORMS[t]
+        name = names[i]
+        x = (i % cols) * PITCH + rng.randint(0, 3) * GRID
+        y = -(i // cols) * PITCH - rng.randint(0, 3) * GRID
+        params = param_tpl.format(mr=rng.choice((1, 1, 2, 4)), l=rng.choice(LENGTHS),
+                                  w=rng.choice(WIDTHS), r=rng.choice(RES), c=rng.choice(CAPS))
+        net_lines.append(f"{net_prefix}{name[len(inst_prefix):]} {' '.join(pins[i])} {cell} {params}")
+        if i in dropped:
+            continue
+        inst_lines.append(f"Name: {name}  Cell: {cell}")
+        inst_lines.append(f"  XY: ({_fmt(x)} {_fmt(y)})")
+        inst_lines.append(f"  Orient: {orients[i]}")
+        inst_lines.append(f"  BBox: (({_fmt(x - 0.4)} {_fmt(y - 0.3)}) ({_fmt(x + 0.4)} {_fmt(y + 0.3)}))")
+        inst_lines.append("")
+    net_lines.append(".ENDS")
+    return inst_lines, net_lines
+
+
+def write_design(out_dir, n_devices, seed=0, **kwargs):
+    os.makedirs(out_dir, exist_ok=True)
+    inst_lines, net_lines = generate(n_devices, seed, **kwargs)
+    inst_path = os.path.join(out_dir, "inst_info.txt")
+    net_path = os.path.join(out_dir, "netlist.txt")
+    with open(inst_path, "w") as f:
+        f.write("\n".join(inst_lines))
+    with open(net_path, "w") as f:
+        f.write("\n".join(net_lines) + "\n")
+    return inst_path, net_path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="生成合成的 CDL 网表 + inst_info.txt")
+    ap.add_argument("n_devices", type=int)
+    ap.add_argument("-o", "--out-dir", default="synth")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--fanout", choices=["geometric", "uniform", "powerlaw"], default="geometric")
+    ap.add_argument("--mean-fanout", type=float, default=3.0)
+    ap.add_argument("--max-fanout", type=int, default=64)
+    ap.add_argument("--bus-nets", default="VDDA,VSSA", help="逗号分隔：电源,地；留空表示没有总线")
+    ap.add_argument("--bus-prob", type=float, default=0.7, help="MOS 源端接电源/地的比例")
+    ap.add_argument("--missing", type=float, default=0.0, help="inst_info.txt 里漏掉的器件比例")
+    args = ap.parse_args()
+
+    bus_nets = tuple(n for n in args.bus_nets.split(",") if n)
+    inst_path, net_path = write_design(args.out_dir, args.n_devices, args.seed,
+                                       fanout=args.fanout, mean_fanout=args.mean_fanout,
+                                       max_fanout=args.max_fanout, bus_nets=bus_nets,
+                                       bus_prob=args.bus_prob, missing=args.missing)
+    print(f"✅ 已生成 {args.n_devices} 个器件: {inst_path}, {net_path}")
+
+
+if __name__ == "__main__":
+    main()
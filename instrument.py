@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+import time
+import types
+
+# === 计时与 COM 调用统计 ===
+# stage(name)    —— 包住一个流水线阶段，记录耗时并生成 trace 事件
+# tally(name)    —— 同一个小阶段反复进出（如每个网络的 MST）时只累加耗时，emit() 时合成一个事件
+# wrap_com(obj)  —— 给 Visio 对象套一层代理，按方法/属性名统计调用次数和耗时
+# 关闭时 stage() 返回共享的空上下文、wrap_com() 原样返回对象，开销只有一次函数调用，
+# 可以常开在生产环境里。
+# 结果可以打印成汇总表（summary），也可以导出为 Chrome trace / Perfetto 可读的 JSON。
+# 注意：进程池里执行的阶段（并行布线）记录在子进程中，不会出现在主进程的统计里。
+
+ENABLED = False
+
+_lock = threading.Lock()
+_events = []   # (name, cat, start_ns, dur_ns, tid)
+_stats = {}    # (cat, name) -> [次数, 总耗时 ns]
+_t0 = time.perf_counter_ns()
+
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+
+def reset():
+    global _t0
+    with _lock:
+        _events.clear()
+        _stats.clear()
+        _t0 = time.perf_counter_ns()
+
+
+def _record(cat, name, start, dur, event=True):
+    with _lock:
+        s = _stats.get((cat, name))
+        if s is None:
+            s = _stats[(cat, name)] = [0, 0]
+        s[0] += 1
+        s[1] += dur
+        if event:
+            _events.append((name, cat, start, dur, threading.get_ident()))
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def emit(self):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        _record("stage", self.name, self.start, end - self.start)
+        return False
+
+
+def stage(name):
+    return _Stage(name) if ENABLED else _NULL_STAGE
+
+
+class _Tally:
+    __slots__ = ("name", "first", "start", "total")
+
+    def __init__(self, name):
+        self.name = name
+        self.first = None
+        self.total = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        if self.first is None:
+            self.first = self.start
+        return self
+
+    def __exit__(self, *exc):
+        self.total += time.perf_counter_ns() - self.start
+        return False
+
+    def emit(self):
+        # 一个事件：起点为第一次进入，时长为各次之和；没进入过则不记
+        if self.first is not None:
+            _record("stage", self.name, self.first, self.total)
+        self.first, self.total = None, 0
+
+
+def tally(name):
+    return _Tally(name) if ENABLED else _NULL_STAGE
+
+
+# === COM 代理 ===
+_PLAIN = (int, float, str, bool, bytes, type(None), tuple, dict)
+# COM 对象本身也可调用（默认方法 Item），只能按“绑定方法”区分方法和属性
+_METHODS = (types.MethodType, types.BuiltinMethodType)
+
+
+def _unwrap(v):
+    return v._obj if isinstance(v, _ComProxy) else v
+
+
+def _wrap(v):
+    return v if isinstance(v, _PLAIN) else _ComProxy(v)
+
+
+class _ComProxy:
+    __slots__ = ("_obj",)
+
+    def __init__(self, obj):
+        object.__setattr__(self, "_obj", obj)
+
+    def __getattr__(self, name):
+        start = time.perf_counter_ns()
+        attr = getattr(self._obj, name)
+        if isinstance(attr, _METHODS):
+            return _ComMethod(attr, name)
+        _record("com", f"{name} (get)", start, time.perf_counter_ns() - start, event=False)
+        return _wrap(attr)
+
+    def __setattr__(self, name, value):
+        start = time.perf_counter_ns()
+        setattr(self._obj, name, _unwrap(value))
+        _record("com", f"{name} (set)", start, time.perf_counter_ns() - start, event=False)
+
+    def __call__(self, *args):
+        start = time.perf_counter_ns()
+        result = self._obj(*[_unwrap(a) for a in args])
+        _record("com", "Item", start, time.perf_counter_ns() - start, event=False)
+        return _wrap(result)
+
+    def __iter__(self):
+        for item in self._obj:
+            yield _wrap(item)
+
+    def __len__(self):
+        return len(self._obj)
+
+    def __bool__(self):
+        return True
+
+
+class _ComMethod:
+    __slots__ = ("fn", "name")
+
+    def __init__(self, fn, name):
+        self.fn = fn
+        self.name = name
+
+    def __call__(self, *args):
+        start = time.perf_counter_ns()
+        result = self.fn(*[_unwrap(a) for a in args])
+        _record("com", self.name, start, time.perf_counter_ns() - start, event=False)
+        return _wrap(result)
+
+
+def wrap_com(obj):
+    return _ComProxy(obj) if ENABLED else obj
+
+
+# === 输出 ===
+def summary():
+    with _lock:
+        rows = [(cat, name, n, ns) for (cat, name), (n, ns) in _stats.items()]
+    rows.sort(key=lambda r: (r[0] != "stage", -r[3]))
+    return rows
+
+
+def print_summary():
+    rows = summary()
+    if not rows:
+        return
+    print(f"\n{'类别':<7}{'名称':<28}{'次数':>10}{'总耗时(ms)':>14}{'平均(us)':>12}")
+    for cat, name, n, ns in rows:
+        print(f"{cat:<9}{name:<30}{n:>12}{ns / 1e6:>16.3f}{ns / n / 1e3:>14.2f}")
+
+
+def write_trace(filename):
+    pid = os.getpid()
+    with _lock:
+        events = [{"name": name, "cat": cat, "ph": "X", "pid": pid, "tid": tid,
+                   "ts": (start - _t0) / 1e3, "dur": dur / 1e3}
+                  for name, cat, start, dur, tid in _events]
+        # COM 调用只做聚合，放进 metadata 里随 trace 一起保存
+        com = {name: {"count": n, "total_ms": ns / 1e6}
+               for (cat, name), (n, ns) in _stats.items() if cat == "com"}
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                   "metadata": {"com_calls": com}}, f, ensure_ascii=False)
@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cadence_to_visio_V2 as c2v
+
+# === 流水线引擎 ===
+# 解析 → 布线 → 绘制 三段重叠执行：
+#   1) 两个输入文件在进程池里并发解析；
+#   2) 各网络按引脚数切块后在进程池里布线，结果按网络顺序送进有界队列；
+#      开了布线缓存（ROUTE_CACHE，只在迷宫布线时生效）时命中的网络不进进程池，直接按顺序入队，未命中的算完后写回缓存；
+#   3) 事件循环所在线程是唯一碰 COM 的线程，分批放器件（批间让出事件循环，布线结果陆续进队列），
+#      放完后消费队列绘制连线。
+# 草稿模式、局部视图（cone）、视口裁剪（window）、进度和取消与 render_design 相同；
+# 网络按网表顺序绘制（边布线边画），不像 render_design 那样按引脚数排序。
+# 队列有界，布线最多领先绘制 QUEUE_SIZE 个网络加上 2 × WORKERS 个在途块，
+# 内存不会随设计规模堆积。
+
+WORKERS    = os.cpu_count() or 1
+QUEUE_SIZE = 64
+
+
+async def _route_producer(loop, pool, items, cached, keys, bus_nets, config, queue, workers, cancel):
+    """cached / keys 与 items 对齐（cache_lookup 的结果），cached 为 None 的网络送进进程池；
+    cancel() 为真后不再提交新块，已提交的取回后照常入队；返回新算出、要写回缓存的 [(键, 结果)]"""
+    # 提交窗口内的布线块，按提交顺序取回结果，与缓存命中的网络按下标合流，保证绘制顺序与串行版本一致
+    # 布线块出错时也要放入结束标记，否则 _drawer 会一直等下去；异常由 _drawer 经 await producer 抛给调用方
+    todo = [i for i, routed in enumerate(cached) if routed is None]
+    chunks = c2v.chunk_nets([items[i] for i in todo], workers * c2v.CHUNKS_PER_WORKER)
+    ready = {i: routed for i, routed in enumerate(cached) if routed is not None}
+    fresh = []
+    pending = deque()
+    nxt = 0
+
+    async def flush():
+        nonlocal nxt
+        while nxt in ready:
+            await queue.put(ready.pop(nxt))
+            nxt += 1
+
+    async def collect():
+        start, chunk, fut = pending.popleft()
+        for k, routed in enumerate(c2v.unpack_routes(chunk, bus_nets, await fut)):
+            i = todo[start + k]
+            ready[i] = routed
+            if keys[i]:
+                fresh.append((keys[i], routed))
+        await flush()
+
+    try:
+        # 先把第一窗口的块交给进程池再入队命中的网络：放置器件期间队列满了也不耽误布线
+        for start, chunk in chunks:
+            if cancel():
+                break
+            fut = loop.run_in_executor(pool, c2v.route_chunk_in_worker, *c2v.pack_nets(chunk, bus_nets), config)
+            pending.append((start, chunk, fut))
+            if len(pending) >= workers * 2:
+                await collect()
+        while pending:
+            await collect()
+        await flush()
+    finally:
+        for _, _, fut in pending:
+            fut.cancel()
+        await queue.put(None)
+    return fresh
+
+
+async def _drawer(page, queue, producer, shapes_map, bus_lines, draft_styles, step, cancel):
+    # 取消后不再画，但要把队列取空，生产者才能放入结束标记
+    drawn = []
+    n = 0
+    while True:
+        routed = await queue.get()
+        if routed is None:
+            await producer  # 生产者出错时在这里抛出
+            step(n)
+            return drawn
+        if cancel():
+            continue
+        drawn.append((routed, c2v.draw_routed_net(page, routed, shapes_map, bus_lines, draft_styles=draft_styles)))
+        n += 1
+        if n == c2v.RENDER_BATCH_NETS:
+            step(n)
+            n = 0
+
+
+async def run_pipeline(page, masters, inst_file=None, netlist_file=None, workers=None, queue_size=None,
+                       draft=None, window=None, cone=None, hops=None, progress=None, cancel=None):
+    """与 render_design 一样返回 (shapes_map, drawn, bus_lines)；
+    draft / window 为 None 时取 DRAFT / WINDOW，cone（种子网络 / 器件）/ hops 见 cone_subset，
+    progress / cancel 见 render_design"""
+    loop = asyncio.get_running_loop()
+    workers = workers or WORKERS
+    draft = c2v.DRAFT if draft is None else draft
+    window = c2v.WINDOW if window is None else window
+    progress = progress or c2v.print_progress
+    cancel = cancel or (lambda: False)
+    inst_file, netlist_file = inst_file or c2v.INPUT_FILE, netlist_file or c2v.NETLIST_FILE
+    clipped = ()
+    with ProcessPoolExecutor(workers) as pool:
+        # 1) 并发解析；给了窗口时解析中途就丢掉窗口外的器件
+        if window:
+            instances, netlist, clipped = await loop.run_in_executor(
+                pool, c2v.load_window, inst_file, netlist_file, window)
+        else:
+            instances, netlist = await asyncio.gather(
+                loop.run_in_executor(pool, c2v.parse_instances, inst_file),
+                loop.run_in_executor(pool, c2v.parse_netlist, netlist_file),
+            )
+    instances, netlist = c2v.cone_subset(instances, netlist, cone, hops)
+
+    # 2) 几何是纯计算，算完立刻开始布线，和下面的放置并行
+    instances = c2v.attach_symbols(instances, netlist)
+    instances = c2v.attach_params(c2v.complete_placement(instances, netlist), netlist)
+    masters = c2v.add_box_masters(page.Document, masters, (inst["type"] for inst in instances.values()))
+    pin_positions, bboxes = c2v.compute_placement(instances, masters)
+    buses = c2v.plan_buses(bboxes)
+    bus_nets = frozenset(bus["net"] for bus in buses)
+    net_to_points = c2v.collect_net_points(netlist, pin_positions) if bboxes else {}
+    config = dict(c2v.route_config(), draft=draft)
+    obstacles = c2v.route_obstacles(bboxes, config)
+    items = list(net_to_points.items())
+    cached, keys = [None] * len(items), [None] * len(items)
+    cache = c2v.route_cache_path(config)
+    if cache:
+        db = c2v.open_route_cache(cache)
+        try:
+            cached, keys = c2v.cache_lookup(db, items, bus_nets, config, obstacles)
+        finally:
+            db.close()
+
+    # 布线用单独的进程池：障碍网格在每个工作进程启动时发送一次
+    with ProcessPoolExecutor(workers, initializer=c2v.init_route_worker, initargs=(obstacles,)) as pool:
+        queue = asyncio.Queue(maxsize=queue_size or QUEUE_SIZE)
+        producer = asyncio.ensure_future(
+            _route_producer(loop, pool, items, cached, keys, bus_nets, config, queue, workers, cancel))
+        await asyncio.sleep(0)  # 让生产者先跑到第一次等待，把第一窗口的布线块交给进程池
+
+        # 3) 放置器件、画总线（COM，单线程）；每批之间让出事件循环，
+        #    生产者取回已完成的块、补交新的块，布线与放置真正重叠
+        layers = c2v.ensure_layers(page) if c2v.USE_LAYERS else None
+        step = c2v.progress_meter(progress, "devices", len(c2v.placeable_devices(instances, masters)))
+        shapes_map = {}
+        for batch_shapes in c2v.place_device_batches(page, instances, masters, bboxes, not draft, layers, cancel):
+            shapes_map.update(batch_shapes)
+            step(len(batch_shapes))
+            await asyncio.sleep(0)
+        bus_lines = {}
+        if not cancel():
+            print("\n✅ 所有器件已放置完成")
+            print("➡️  开始自动连线..." + ("（草稿模式，未 Glue）" if draft else ""))
+            bus_lines = c2v.draw_buses(page, buses)
+            c2v.progress_meter(progress, "buses", len(buses))(len(bus_lines))
+
+        draft_styles = c2v.setup_draft_styles(page.Document) if draft else None
+        step = c2v.progress_meter(progress, "nets", len(items))
+        drawn = await _drawer(page, queue, producer, shapes_map, bus_lines, draft_styles, step, cancel)
+        if cache:
+            fresh = producer.result()
+            db = c2v.open_route_cache(cache)
+            try:
+                c2v.cache_store(db, fresh, obstacles)
+            finally:
+                db.close()
+            c2v.print_cache_stats(keys, len(fresh))
+        if layers:
+            c2v.assign_layers(page, c2v.net_members(drawn, bus_lines, layers))
+    if cancel():
+        print(f"⏹️  已取消：画了 {len(shapes_map)} 个器件、{len(bus_lines)} 条总线、{len(drawn)} 个网络")
+        return shapes_map, drawn, bus_lines
+
+    if window and clipped:
+        stubs = c2v.plan_stubs(net_to_points, clipped, c2v.window_dbu(window), set(bus_lines))
+        lines = c2v.draw_stubs(page, stubs, shapes_map, draft)
+        if layers:
+            c2v.assign_layers(page, [(line.ID, layers["labels"]) for line in lines])
+        print(f"✂️  {len(lines)} 个被裁断的网络画了引出短线")
+    print(f"✅ 连线完成（{len(drawn)} 个网络）")
+    return shapes_map, drawn, bus_lines
+
+
+def main():
+    ap = argparse.ArgumentParser(description="流水线方式生成 Visio 原理图")
+    ap.add_argument("--inst-info", default=c2v.INPUT_FILE)
+    ap.add_argument("--netlist", default=c2v.NETLIST_FILE)
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    ap.add_argument("--route-cache", default=c2v.ROUTE_CACHE, metavar="DB", help="布线缓存文件（迷宫布线时生效），没变的网络直接取上次的结果")
+    ap.add_argument("--draft", action="store_true", help="草稿模式：不 Glue，不写标签格式")
+    ap.add_argument("--cone", default=None, metavar="NETS", help="只处理这些网络 / 器件附近的电路，逗号分隔")
+    ap.add_argument("--hops", type=int, default=None, help="--cone 扩展的跳数")
+    ap.add_argument("--window", default=None, metavar="X1,Y1,X2,Y2", help="只处理版图坐标窗口内的器件")
+    ap.add_argument("--stub", action="store_true", help="使用本地替身，不启动 Visio")
+    ap.add_argument("-o", "--output", default=None)
+    args = ap.parse_args()
+
+    c2v.ROUTE_CACHE = args.route_cache
+    visio = c2v.open_visio("stub" if args.stub else None)
+    visio.Visible = True
+    doc = visio.Documents.Add("")
+    page = visio.ActivePage
+    masters = c2v.load_masters(visio)
+
+    t0 = time.perf_counter()
+    asyncio.run(run_pipeline(page, masters, args.inst_info, args.netlist, args.workers, args.queue_size,
+                             args.draft or None,
+                             [float(v) for v in args.window.split(",")] if args.window else None,
+                             [s for s in args.cone.split(",") if s] if args.cone else None, args.hops))
+    print(f"⏱️  用时 {time.perf_counter() - t0:.3f}s")
+    if args.output:
+        doc.SaveAs(os.path.abspath(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import argparse
+import json
+import hmac
+import os
+import pickle
+import queue
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import cadence_to_visio_V2 as c2v
+import instrument
+
+# === 常驻渲染服务 ===
+# Visio、模具 master 和解析结果常驻内存，渲染任务通过本地 TCP 端口提交。
+# 协议：每行一个 JSON 请求，服务端每个请求回一行 JSON。
+#   {"token": "...", "inst_info": "...", "netlist": "...", "output": "out.vsdx", "close": true,
+#    "draft": false, "window": [x1, y1, x2, y2]}
+# 本机其他用户也能连上回环端口，所以每次启动生成一个随机令牌，写进只有本用户可读的令牌文件
+# （token_path(port)），每个请求都要带上，不对的一律拒绝。submit() 自动读令牌文件。
+# 同一份设计反复按窗口查看时，器件的网格空间索引和解析结果一起缓存。
+#   {"cmd": "progress"}   当前任务最近一次的进度事件（器件 / 总线 / 网络画了多少、速率）
+#   {"cmd": "cancel"}     当前任务画完这一批后停下，已画的部分照常保存，响应里 "cancelled": true
+#   {"cmd": "shutdown"}
+# 并发请求按到达顺序排队，由唯一的 COM 工作线程依次处理。
+
+HOST             = "127.0.0.1"
+PORT             = 47821
+PARSE_CACHE_SIZE = 32  # 缓存的解析结果份数（按文件路径+mtime+大小）
+TOKEN_DIR        = os.path.expanduser("~")
+
+
+def token_path(port=PORT):
+    return os.path.join(TOKEN_DIR, f".render_daemon.{port}.token")
+
+
+def write_token(port=PORT):
+    """生成本次会话的令牌，写入令牌文件（权限 0600），返回令牌"""
+    token = secrets.token_hex(16)
+    path = token_path(port)
+    if os.path.exists(path):
+        os.remove(path)  # 旧文件的权限可能更宽，不沿用
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+    return token
+
+
+def read_token(port=PORT):
+    with open(token_path(port)) as f:
+        return f.read().strip()
+
+
+class RenderService:
+    def __init__(self, backend=None, stencil=None, visible=True):
+        self.backend = backend
+        self.stencil = stencil
+        self.visible = visible
+        self.jobs = queue.Queue()
+        self.parse_cache = OrderedDict()
+        self.grid_cache = OrderedDict()
+        self.current = None  # 正在画的任务：{"stop": Event, "progress": 最近的进度事件}
+        self.ready = threading.Event()
+        self.error = None  # 工作线程启动 Visio / 加载模具时的异常，由 start() 抛出
+        self.worker = threading.Thread(target=self._run, name="visio-worker", daemon=True)
+
+    def start(self):
+        self.worker.start()
+        self.ready.wait()
+        if self.error:
+            raise self.error
+
+    def stop(self):
+        self.jobs.put((None, None))
+        self.worker.join()
+
+    def submit(self, job):
+        fut = Future()
+        self.jobs.put((job, fut))
+        return fut.result()
+
+    # progress / cancel 在连接线程里调用，只读写 current，不碰 COM 对象
+    def progress(self):
+        current = self.current
+        return {"ok": True, "running": current is not None,
+                "progress": current and current["progress"]}
+
+    def cancel(self):
+        current = self.current
+        if current:
+            current["stop"].set()
+        return {"ok": True, "running": current is not None}
+
+    # COM 对象只能在创建它的线程里使用，所以 Visio 在工作线程里启动
+    def _run(self):
+        try:
+            if (self.backend or c2v.BACKEND) != "stub":
+                import pythoncom
+                pythoncom.CoInitialize()
+            self.visio = c2v.open_visio(self.backend)
+            self.visio.Visible = self.visible
+            self.masters = c2v.load_masters(self.visio, self.stencil)
+        except Exception as e:
+            self.error = e
+            return
+        finally:
+            self.ready.set()
+        while True:
+            job, fut = self.jobs.get()
+            if job is None:
+                break
+            try:
+                fut.set_result(self._render(job))
+            except Exception as e:
+                fut.set_result({"ok": False, "error": f"{type(e).__name__}: {e}"})
+
+    def _parsed(self, filename, parser):
+        """返回 (解析结果, 是否命中缓存, 缓存键)；
+        缓存里存的是 pickle 后的字节串，每个任务拿到自己的一份，渲染时改动器件 / 网络不会带进下一个任务"""
+        st = os.stat(filename)
+        key = (parser.__name__, os.path.abspath(filename), st.st_mtime_ns, st.st_size)
+        hit = key in self.parse_cache
+        if hit:
+            self.parse_cache.move_to_end(key)
+            return pickle.loads(self.parse_cache[key]), hit, key
+        result = parser(filename)
+        self.parse_cache[key] = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        if len(self.parse_cache) > PARSE_CACHE_SIZE:
+            self.parse_cache.popitem(last=False)
+        return result, hit, key
+
+    def _grid(self, key, instances):
+        # 网格里只有器件序号和名字，按解析缓存键复用，对同一份文件的每个副本都适用
+        if key in self.grid_cache:
+            self.grid_cache.move_to_end(key)
+            return self.grid_cache[key]
+        grid = c2v.build_grid(instances)
+        self.grid_cache[key] = grid
+        if len(self.grid_cache) > PARSE_CACHE_SIZE:
+            self.grid_cache.popitem(last=False)
+        return grid
+
+    def _render(self, job):
+        instrument.reset()
+        t0 = time.perf_counter()
+        with instrument.stage("parse"):
+            instances, hit_i, key = self._parsed(job.get("inst_info", c2v.INPUT_FILE), c2v.parse_instances)
+            netlist, hit_n, _ = self._parsed(job.get("netlist", c2v.NETLIST_FILE), c2v.parse_netlist)
+        window, clipped = job.get("window"), ()
+        if window:
+            instances, netlist, clipped = c2v.window_subset(instances, netlist, window,
+                                                            self._grid(key, instances))
+        t_parse = time.perf_counter() - t0
+
+        doc = self.visio.Documents.Add("")
+        page = doc.Pages(1)
+        current = {"stop": threading.Event(), "progress": None}
+
+        def progress(event):
+            current["progress"] = event
+            c2v.print_progress(event)
+
+        self.current = current
+        try:
+            with instrument.stage("render"):
+                shapes_map, _, _ = c2v.render_design(page, instances, netlist, self.masters,
+                                                     job.get("draft"), window, clipped,
+                                                     progress, current["stop"].is_set)
+        finally:
+            self.current = None
+        cancelled = current["stop"].is_set()
+
+        output = job.get("output")
+        if output:
+            doc.SaveAs(os.path.abspath(output))
+        if job.get("close", bool(output)):
+            doc.Close()
+        result = {
+            "ok": not cancelled,
+            "cancelled": cancelled,
+            "devices": len(shapes_map),
+            "parse_cached": hit_i and hit_n,
+            "parse_seconds": round(t_parse, 6),
+            "seconds": round(time.perf_counter() - t0, 6),
+            "output": output,
+        }
+        if instrument.ENABLED:
+            result["profile"] = [{"cat": cat, "name": name, "count": n, "ms": ns / 1e6}
+                                 for cat, name, n, ns in instrument.summary()]
+        return result
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            if not raw.strip():
+                continue
+            try:
+                job = json.loads(raw)
+            except ValueError as e:
+                self._reply({"ok": False, "error": f"bad request: {e}"})
+                continue
+            token = job.pop("token", None) if isinstance(job, dict) else None
+            if not isinstance(token, str) or not hmac.compare_digest(token, self.server.token):
+                self._reply({"ok": False, "error": "unauthorized"})
+                return
+            if job.get("cmd") == "progress":
+                self._reply(self.server.service.progress())
+                continue
+            if job.get("cmd") == "cancel":
+                self._reply(self.server.service.cancel())
+                continue
+            if job.get("cmd") == "shutdown":
+                self._reply({"ok": True})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            self._reply(self.server.service.submit(job))
+
+    def _reply(self, obj):
+        self.wfile.write((json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+class RenderServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, service, token, host=HOST, port=PORT):
+        super().__init__((host, port), _JobHandler)
+        self.service = service
+        self.token = token
+
+
+def serve(backend=None, stencil=None, host=HOST, port=PORT, visible=True):
+    service = RenderService(backend, stencil, visible)
+    service.start()
+    token = write_token(port)
+    try:
+        with RenderServer(service, token, host, port) as server:
+            print(f"🟢 渲染服务已启动 {host}:{server.server_address[1]}（令牌文件 {token_path(port)}）")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    finally:
+        os.remove(token_path(port))
+    service.stop()
+    print("⏹️  渲染服务已停止")
+
+
+def submit(job, host=HOST, port=PORT, timeout=None, token=None):
+    job = dict(job, token=token or read_token(port))
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall((json.dumps(job) + "\n").encode("utf-8"))
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="常驻 Visio 渲染服务")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("serve", help="启动服务")
+    p.add_argument("--stub", action="store_true", help="使用本地替身，不启动 Visio")
+    p.add_argument("--stencil", default=None)
+    p.add_argument("--port", type=int, default=PORT)
+    p.add_argument("--profile", action="store_true", help="每个任务的响应里附带阶段耗时与 COM 调用统计")
+
+    p = sub.add_parser("submit", help="提交渲染任务")
+    p.add_argument("inst_info")
+    p.add_argument("netlist")
+    p.add_argument("-o", "--output", default=None)
+    p.add_argument("--draft", action="store_true", help="草稿模式：不 Glue，不写标签格式")
+    p.add_argument("--window", default=None, metavar="X1,Y1,X2,Y2", help="只画版图坐标窗口内的器件")
+    p.add_argument("--port", type=int, default=PORT)
+
+    p = sub.add_parser("progress", help="查看当前任务的进度")
+    p.add_argument("--port", type=int, default=PORT)
+
+    p = sub.add_parser("cancel", help="取消当前任务（画完这一批后停下）")
+    p.add_argument("--port", type=int, default=PORT)
+
+    p = sub.add_parser("shutdown", help="停止服务")
+    p.add_argument("--port", type=int, default=PORT)
+
+    args = ap.parse_args()
+    if args.cmd == "serve":
+        instrument.enable(args.profile or c2v.PROFILE)
+        serve("stub" if args.stub else None, args.stencil, port=args.port)
+    elif args.cmd == "submit":
+        job = {"inst_info": args.inst_info, "netlist": args.netlist}
+        if args.output:
+            job["output"] = args.output
+        if args.draft:
+            job["draft"] = True
+        if args.window:
+            job["window"] = [float(v) for v in args.window.split(",")]
+        print(json.dumps(submit(job, port=args.port), ensure_ascii=False))
+    else:
+        print(json.dumps(submit({"cmd": args.cmd}, port=args.port), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
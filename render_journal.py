@@ -0,0 +1,221 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import cadence_to_visio_V2 as c2v
+
+# === 断点续画 ===
+# 大 cell 分批绘制，每批画完先保存文档，再往日志（JSON lines）追加一条记录：
+#   {"type": "header", "version", "doc", "inputs"}   —— inputs 为输入文件内容和绘图设置的哈希
+#   {"type": "devices", "ids": {器件名: 形状 ID}}
+#   {"type": "labels"}
+#   {"type": "buses", "ids": {网络名: 形状 ID}}
+#   {"type": "nets", "ids": [[网络名, [形状 ID, ...]], ...]}
+#   {"type": "done"}
+# Visio 崩溃或 COM 超时后重新运行：输入没变就重新打开保存的文档，按日志里的形状 ID
+# 找回器件和总线，从最后一个检查点继续画。
+# 解析、布局、布线都是确定性的，重启时重新计算即可，不需要写进日志。
+# 保存之后、写日志之前崩溃的那一批形状不在日志里，续画时先删掉（总线上可能多出几个空连接点）。
+# 每批的大小与一次绘制相同：c2v.RENDER_BATCH_DEVICES / c2v.RENDER_BATCH_NETS。
+
+JOURNAL_VERSION = 1
+
+
+def journal_path(doc_path):
+    return doc_path + ".journal"
+
+
+def render_settings():
+    """影响器件、总线、连线画法的设置；任一项改了，已画的部分就和重算的结果对不上"""
+    # 运行中生成的方框 master 由网表决定，不算设置
+    library = {name: cfg for name, cfg in c2v.DEVICE_LIBRARY.items() if not cfg.get("generated")}
+    return {"scale": c2v.SCALE, "dbu": c2v.DBU, "library": library,
+            "bus_nets": c2v.BUS_NETS, "excluded_nets": c2v.EXCLUDED_NETS, "excluded_pins": c2v.EXCLUDED_PINS,
+            "generate_symbols": c2v.GENERATE_SYMBOLS, "auto_place": c2v.AUTO_PLACE,
+            "show_params": c2v.SHOW_PARAMS, "param_labels": c2v.PARAM_LABELS,
+            "layers": c2v.USE_LAYERS and c2v.LAYER_NAMES, "route": c2v.route_config()}
+
+
+def input_signature(*filenames):
+    h = hashlib.sha1()
+    for filename in filenames:
+        with open(filename, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    h.update(json.dumps(render_settings(), sort_keys=True, default=sorted).encode())
+    return h.hexdigest()
+
+
+def load_journal(path):
+    """读出日志记录；崩溃时写了一半的最后一行直接丢弃"""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
+
+
+class Journal:
+    def __init__(self, path, doc):
+        self.path = path
+        self.doc = doc
+        self.f = open(path, "a", encoding="utf-8")
+
+    def commit(self, record):
+        # 先保存文档，再记日志：日志里的形状一定已经落盘
+        self.doc.Save()
+        self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+
+
+def render_resumable(visio, masters, inst_file, netlist_file, doc_path, restart=False):
+    """分批绘制并记录检查点；返回 (doc, 本次新画的批数)"""
+    doc_path = os.path.abspath(doc_path)
+    jpath = journal_path(doc_path)
+    signature = input_signature(inst_file, netlist_file)
+
+    # 纯计算部分，重启时重算，结果与上次相同
+    netlist = c2v.parse_netlist(netlist_file)
+    instances = c2v.attach_symbols(c2v.parse_instances(inst_file), netlist)
+    instances = c2v.attach_params(c2v.complete_placement(instances, netlist), netlist)
+
+    records = [] if restart else load_journal(jpath)
+    header = records[0] if records else {}
+    if (header.get("type") != "header" or header.get("version") != JOURNAL_VERSION
+            or header.get("doc") != doc_path or header.get("inputs") != signature
+            or not os.path.exists(doc_path)):
+        records = []
+
+    device_ids, bus_ids, net_ids = {}, {}, {}
+    labels_done = done = False
+    if records:
+        for rec in records[1:]:
+            if rec["type"] == "devices":
+                device_ids.update(rec["ids"])
+            elif rec["type"] == "labels":
+                labels_done = True
+            elif rec["type"] == "buses":
+                bus_ids.update(rec["ids"])
+            elif rec["type"] == "nets":
+                net_ids.update((net, ids) for net, ids in rec["ids"])
+            elif rec["type"] == "done":
+                done = True
+        doc = visio.Documents.Open(doc_path)
+        page = doc.Pages(1)
+        # 删掉最后一个检查点之后才画出来的形状
+        known = set(device_ids.values()) | set(bus_ids.values())
+        known.update(i for ids in net_ids.values() for i in ids)
+        stale = [shape for shape in page.Shapes if shape.ID not in known]
+        for shape in stale:
+            shape.Delete()
+        print(f"♻️  从检查点继续：已有 {len(device_ids)} 个器件、{len(net_ids)} 个网络"
+              + (f"，删除 {len(stale)} 个未提交的形状" if stale else ""))
+        journal = Journal(jpath, doc)
+    else:
+        doc = visio.Documents.Add("")
+        page = doc.Pages(1)
+        doc.SaveAs(doc_path)
+        with open(jpath, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "header", "version": JOURNAL_VERSION,
+                                "doc": doc_path, "inputs": signature}) + "\n")
+        journal = Journal(jpath, doc)
+
+    # 方框 master 存在文档模具里：续画时按名字找回，新文档才现做
+    masters = c2v.add_box_masters(doc, masters, (inst["type"] for inst in instances.values()))
+    pin_positions, bboxes = c2v.compute_placement(instances, masters)
+    buses = c2v.plan_buses(bboxes) if bboxes else []
+    bus_nets = frozenset(bus["net"] for bus in buses)
+    net_to_points = c2v.collect_net_points(netlist, pin_positions) if bboxes else {}
+    routed_nets = c2v.route_all_nets(net_to_points, bus_nets, obstacles=c2v.route_obstacles(bboxes))
+
+    layers = c2v.ensure_layers(page) if c2v.USE_LAYERS else None
+    batches = 0
+    try:
+        if done:
+            print("✅ 日志显示已全部画完")
+            return doc, batches
+
+        # 1) 器件
+        shapes_map = {name: page.Shapes.ItemFromID(i) for name, i in device_ids.items()}
+        todo = [inst for inst in instances.values()
+                if inst["type"] in c2v.DEVICE_LIBRARY and inst["type"] in masters
+                and inst["name"] not in device_ids]
+        for batch in c2v.batches(todo, c2v.RENDER_BATCH_DEVICES):
+            ids = {}
+            batch_shapes = {}
+            for inst in batch:
+                shp = c2v.drop_with_label(page, masters[inst["type"]], inst, batch_shapes)
+                ids[inst["name"]] = shp.ID
+            shapes_map.update(batch_shapes)
+            if layers:
+                c2v.assign_layers(page, c2v.device_members(batch_shapes, layers))
+            journal.commit({"type": "devices", "ids": ids})
+            batches += 1
+
+        # 2) 标签（一次批量写入）
+        if not labels_done:
+            c2v.write_labels(page, shapes_map, c2v.place_labels(instances, bboxes))
+            journal.commit({"type": "labels"})
+            batches += 1
+
+        # 3) 总线
+        if bus_ids:
+            bus_lines = {bus["net"]: (page.Shapes.ItemFromID(bus_ids[bus["net"]]), bus["x1"], bus["y"])
+                         for bus in buses}
+        else:
+            bus_lines = c2v.draw_buses(page, buses)
+            if layers:
+                c2v.assign_layers(page, c2v.net_members([], bus_lines, layers))
+            journal.commit({"type": "buses", "ids": {net: line.ID for net, (line, _, _) in bus_lines.items()}})
+            batches += 1
+
+        # 4) 网络
+        todo = [routed for routed in routed_nets if routed["net"] not in net_ids]
+        for batch in c2v.batches(todo, c2v.RENDER_BATCH_NETS):
+            ids, drawn = [], []
+            for routed in batch:
+                lines = c2v.draw_routed_net(page, routed, shapes_map, bus_lines)
+                ids.append([routed["net"], [line.ID for line in lines]])
+                drawn.append((routed, lines))
+            if layers:
+                c2v.assign_layers(page, c2v.net_members(drawn, {}, layers))
+            journal.commit({"type": "nets", "ids": ids})
+            batches += 1
+
+        journal.commit({"type": "done"})
+    finally:
+        journal.close()
+    return doc, batches
+
+
+def main():
+    ap = argparse.ArgumentParser(description="分批绘制，崩溃后从检查点继续")
+    ap.add_argument("-o", "--output", required=True, help="Visio 文档路径（检查点即保存到这里）")
+    ap.add_argument("--inst-info", default=c2v.INPUT_FILE)
+    ap.add_argument("--netlist", default=c2v.NETLIST_FILE)
+    ap.add_argument("--restart", action="store_true", help="忽略已有日志，从头开始")
+    ap.add_argument("--stub", action="store_true", help="使用本地替身，不启动 Visio")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    visio = c2v.open_visio("stub" if args.stub else None)
+    visio.Visible = True
+    masters = c2v.load_masters(visio)
+    _, batches = render_resumable(visio, masters, args.inst_info, args.netlist,
+                                  args.output, args.restart)
+    print(f"✅ 完成，本次提交 {batches} 个检查点，用时 {time.perf_counter() - t0:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
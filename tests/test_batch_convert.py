@@ -0,0 +1,31 @@
+import contextlib
+import io
+import os
+
+import batch_convert
+import gen_design
+
+_compute_cell = batch_convert.compute_cell
+
+
+def _crash_on_bad(job, out_dir=None):
+    # 模拟解析器把工作进程整个带崩（段错误、被 OOM killer 杀掉）
+    if job["cell"] == "bad":
+        os._exit(1)
+    return _compute_cell(job, out_dir)
+
+
+def test_worker_crash_fails_only_the_crashing_cell(tmp_path, monkeypatch):
+    jobs = []
+    for cell in ("a", "bad", "b", "c"):
+        inst_info, netlist = gen_design.write_design(str(tmp_path / cell), 20, seed=1)
+        jobs.append({"cell": cell, "netlist": netlist, "inst_info": inst_info})
+    # 进程池用 fork 启动，子进程里同样是替换后的函数
+    monkeypatch.setattr(batch_convert, "compute_cell", _crash_on_bad)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = batch_convert.run_batch(jobs, str(tmp_path / "out"), workers=2)
+
+    assert [r["cell"] for r in results] == ["a", "bad", "b", "c"]
+    assert [r["ok"] for r in results] == [True, False, True, True]
+    assert results[1]["error"].startswith("BrokenProcessPool")
+    assert sorted(os.listdir(tmp_path / "out")) == [f"{c}.plan.json.gz" for c in "abc"]
@@ -0,0 +1,33 @@
+import cadence_to_visio_V2 as c2v
+from visio_stub import StubApplication
+
+# Visio 类型库 VisSectionIndices 里的取值
+VIS_SECTION_CONNECTION_PTS = 7
+VIS_SECTION_FIRST_COMPONENT = 10  # 几何节，不是连接点
+
+
+def _bus(page):
+    bus = {"net": "VDD", "label": "VDD", "color": "RGB(255,0,0)",
+           "x1": 0, "x2": c2v.to_dbu(4.0), "y": c2v.to_dbu(3.0)}
+    return c2v.draw_buses(page, [bus])["VDD"]
+
+
+def test_connection_section_matches_visio():
+    assert c2v.SEC_CONNECTION_PTS == VIS_SECTION_CONNECTION_PTS
+
+
+def test_bus_taps_go_in_connection_points_section():
+    page = StubApplication().Documents.Add("").Pages(1)
+    bus, left, y = _bus(page)
+    lines = []
+    for x in (1.0, 2.5):
+        line = page.DrawLine(x, 1.0, x, c2v.from_dbu(y))
+        c2v.glue_to_bus(line, bus, left, None, None, None, (c2v.to_dbu(x), y), {})
+        lines.append(line)
+
+    assert bus._rows == {VIS_SECTION_CONNECTION_PTS: 2}
+    assert VIS_SECTION_FIRST_COMPONENT not in bus._rows
+    for row, (x, line) in enumerate(zip((1.0, 2.5), lines)):
+        assert bus.CellsSRC(VIS_SECTION_CONNECTION_PTS, row, 0).ResultIU == x
+        assert line.glue["EndX"] == (bus.ID, f"{VIS_SECTION_CONNECTION_PTS}.{row}.0")
+        assert line.glue["EndY"] == (bus.ID, f"{VIS_SECTION_CONNECTION_PTS}.{row}.1")
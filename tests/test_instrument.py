@@ -0,0 +1,15 @@
+import cadence_to_visio_V2 as c2v
+import instrument
+
+
+def test_one_build_mst_event_per_routing_pass(monkeypatch):
+    monkeypatch.setattr(instrument, "ENABLED", True)
+    instrument.reset()
+    pins = lambda k: [(f"M{k}{i}", "D", f"M{k}{i}.D", (i * 100, i * 70 + k)) for i in range(4)]
+    items = [(f"N{k}", pins(k)) for k in range(50)]
+    config = dict(c2v.route_config(), maze=False)
+    c2v.route_chunk(items, (), config)
+    c2v.route_packed(*c2v.pack_nets(items), config)
+    rows = {name: n for cat, name, n, ns in instrument.summary() if cat == "stage"}
+    assert rows == {"build_mst": 2}
+    instrument.reset()
@@ -0,0 +1,44 @@
+import cadence_to_visio_V2 as c2v
+from visio_stub import StubApplication
+
+
+def _parse(tmp_path, text, workers=1):
+    path = tmp_path / "netlist.txt"
+    path.write_text(text)
+    return {dev["name"]: dev for dev in c2v.parse_netlist(str(path), workers)}
+
+
+def test_model_token_after_pins(tmp_path):
+    dev = _parse(tmp_path, "XR1 a b rppoly r=1k\n")["R1"]
+    assert dev["model"] == "rppoly"
+    assert dev["params"] == {"r": "1k"}
+
+
+def test_known_device_without_model_keeps_first_param(tmp_path):
+    devs = _parse(tmp_path, "XR1 a b r=1k\nCC1 a b c=1f m=2\n")
+    assert devs["R1"]["model"] == "" and devs["R1"]["params"] == {"r": "1k"}
+    assert devs["C1"]["model"] == "" and devs["C1"]["params"] == {"c": "1f", "m": "2"}
+    assert list(devs["R1"]["pins"].values()) == ["a", "b"]
+
+
+def test_forward_subckt_same_in_serial_and_parallel(tmp_path, monkeypatch):
+    # XU1 在 .SUBCKT INV 之前；NAND 没有定义，保持 P1..Pn
+    filler = "".join(f"XNM{i} d{i} g{i} s{i} b nch w=1u l=100n\n" for i in range(40))
+    text = ("XU1 a b INV\n" + filler + ".SUBCKT INV in out\n.ENDS\n"
+            + filler.replace("XNM", "XM") + "XU2 c d INV\nXU3 e f NAND\n")
+    serial = _parse(tmp_path, text, workers=1)
+    monkeypatch.setattr(c2v, "PARSE_MIN_BYTES", 0)
+    parallel = _parse(tmp_path, text, workers=2)
+    assert list(parallel) == list(serial)
+    assert parallel == serial
+    assert serial["U1"]["pins"] == {"in": "a", "out": "b"}
+    assert serial["U2"]["pins"] == {"in": "c", "out": "d"}
+    assert serial["U3"]["pins"] == {"P1": "e", "P2": "f"}
+
+
+def test_load_masters_skips_generated_boxes(capsys, monkeypatch):
+    monkeypatch.setattr(c2v, "DEVICE_LIBRARY", dict(c2v.DEVICE_LIBRARY))
+    box = c2v.register_box(["A", "B", "C"])
+    masters = c2v.load_masters(StubApplication())
+    assert box not in masters
+    assert "未找到" not in capsys.readouterr().out
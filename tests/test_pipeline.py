@@ -0,0 +1,62 @@
+import asyncio
+import contextlib
+import io
+
+import pytest
+
+import cadence_to_visio_V2 as c2v
+import gen_design
+import pipeline
+from visio_stub import StubApplication
+
+
+@pytest.fixture(scope="module")
+def files(tmp_path_factory):
+    return gen_design.write_design(str(tmp_path_factory.mktemp("d")), 200, seed=3)
+
+
+def _page():
+    visio = StubApplication()
+    return visio.Documents.Add("").Pages(1), c2v.load_masters(visio)
+
+
+def _summary(result):
+    shapes_map, drawn, bus_lines = result
+    return set(shapes_map), {routed["net"] for routed, _ in drawn}, set(bus_lines)
+
+
+@pytest.mark.parametrize("options", [
+    {"window": [0.0, -6.0, 5.0, 0.0]},
+    {"cone": ["net35"], "hops": 1},
+    {"draft": True},
+])
+def test_pipeline_honours_render_options(files, options):
+    inst_info, netlist = files
+    with contextlib.redirect_stdout(io.StringIO()):
+        page, masters = _page()
+        got = asyncio.run(pipeline.run_pipeline(page, masters, inst_info, netlist, workers=1, **options))
+        clipped = ()
+        if "window" in options:
+            instances, nets, clipped = c2v.load_window(inst_info, netlist, options["window"])
+        else:
+            instances, nets = c2v.parse_instances(inst_info), c2v.parse_netlist(netlist)
+        instances, nets = c2v.cone_subset(instances, nets, options.get("cone"), options.get("hops"))
+        page2, masters2 = _page()
+        want = c2v.render_design(page2, instances, nets, masters2, options.get("draft"),
+                                 options.get("window"), clipped)
+    assert _summary(got) == _summary(want)
+    assert len(page.Shapes) == len(page2.Shapes)
+    if options.get("draft"):
+        assert not any(line.glue for _, lines in got[1] for line in lines)
+
+
+def test_pipeline_stops_when_cancelled(files, monkeypatch):
+    monkeypatch.setattr(c2v, "RENDER_BATCH_DEVICES", 10)
+    placed = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        page, masters = _page()
+        shapes_map, drawn, bus_lines = asyncio.run(pipeline.run_pipeline(
+            page, masters, *files, workers=1, progress=lambda e: placed.append(e["done"]),
+            cancel=lambda: len(placed) >= 2))
+    assert len(shapes_map) == 20
+    assert drawn == [] and bus_lines == {}
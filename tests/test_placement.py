@@ -0,0 +1,48 @@
+import cadence_to_visio_V2 as c2v
+
+XY = (c2v.to_dbu(3.0), c2v.to_dbu(2.0))
+
+
+def _nmos(orient):
+    inst = {"name": "M1", "type": "NMOS", "xy": XY, "orient": orient}
+    return c2v.compute_placement({"M1": inst})
+
+
+def _offsets(pins):
+    return {pin.split(":")[1]: (x - XY[0], y - XY[1]) for pin, (x, y) in pins.items()}
+
+
+def _r0_offsets():
+    w, h = c2v.DEVICE_LIBRARY["NMOS"]["size"]
+    return {pin: (c2v.to_dbu(rx * w), c2v.to_dbu(ry * h))
+            for pin, (rx, ry) in c2v.DEVICE_LIBRARY["NMOS"]["pins"].items()}
+
+
+def _half_size():
+    w, h = c2v.DEVICE_LIBRARY["NMOS"]["size"]
+    return c2v.to_dbu(w / 2), c2v.to_dbu(h / 2)
+
+
+def test_r0_uses_library_offsets():
+    pins, boxes = _nmos("R0")
+    hw, hh = _half_size()
+    assert _offsets(pins) == _r0_offsets()
+    assert boxes["M1"] == (XY[0] - hw, XY[1] - hh, XY[0] + hw, XY[1] + hh)
+
+
+def test_r90_turns_pins_and_swaps_outline():
+    pins, boxes = _nmos("R90")
+    hw, hh = _half_size()
+    # 逆时针转 90°：(dx, dy) -> (-dy, dx)，栅极从左边转到下边
+    assert _offsets(pins) == {pin: (-dy, dx) for pin, (dx, dy) in _r0_offsets().items()}
+    assert _offsets(pins)["G"][1] < 0
+    assert boxes["M1"] == (XY[0] - hh, XY[1] - hw, XY[0] + hh, XY[1] + hw)
+
+
+def test_my_mirrors_pins_left_right():
+    pins, boxes = _nmos("MY")
+    hw, hh = _half_size()
+    # auto_place 用 MY 让栅极朝右，引脚必须跟着镜像
+    assert _offsets(pins) == {pin: (-dx, dy) for pin, (dx, dy) in _r0_offsets().items()}
+    assert _offsets(pins)["G"][0] > 0
+    assert boxes["M1"] == (XY[0] - hw, XY[1] - hh, XY[0] + hw, XY[1] + hh)
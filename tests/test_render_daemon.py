@@ -0,0 +1,51 @@
+import json
+import socket
+import threading
+
+import pytest
+
+import gen_design
+import render_daemon
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(render_daemon, "TOKEN_DIR", str(tmp_path))
+    service = render_daemon.RenderService("stub", visible=False)
+    service.start()
+    token = render_daemon.write_token(0)
+    with render_daemon.RenderServer(service, token, port=0) as srv:
+        thread = threading.Thread(target=srv.serve_forever, daemon=True)
+        thread.start()
+        yield srv, token
+        srv.shutdown()
+    service.stop()
+
+
+def _send(port, job):
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall((json.dumps(job) + "\n").encode("utf-8"))
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
+
+
+def test_requests_without_token_are_rejected(server, tmp_path):
+    srv, token = server
+    port = srv.server_address[1]
+    assert _send(port, {"cmd": "progress"}) == {"ok": False, "error": "unauthorized"}
+    assert _send(port, {"cmd": "progress", "token": "0" * len(token)})["error"] == "unauthorized"
+    assert render_daemon.submit({"cmd": "progress"}, port=port, token=token)["ok"]
+    assert render_daemon.read_token(0) == token
+
+
+def test_parse_cache_hands_out_copies(tmp_path):
+    inst_path, net_path = gen_design.write_design(str(tmp_path / "d"), 20, seed=1)
+    service = render_daemon.RenderService("stub")
+    first, hit, key = service._parsed(inst_path, render_daemon.c2v.parse_instances)
+    name = next(iter(first))
+    first[name]["xy"] = (-12345, -12345)
+    del first[name]
+    second, hit, _ = service._parsed(inst_path, render_daemon.c2v.parse_instances)
+    assert hit and name in second and second[name]["xy"] != (-12345, -12345)
+    third, _, _ = service._parsed(inst_path, render_daemon.c2v.parse_instances)
+    assert third == second and third is not second
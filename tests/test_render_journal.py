@@ -0,0 +1,31 @@
+import contextlib
+import io
+
+import pytest
+
+import cadence_to_visio_V2 as c2v
+import gen_design
+import render_journal
+from visio_stub import StubApplication
+
+
+def _render(files, doc):
+    visio = StubApplication()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return render_journal.render_resumable(visio, c2v.load_masters(visio), *files, doc)[1]
+
+
+@pytest.mark.parametrize("name, value", [
+    ("AUTO_PLACE", False),
+    ("GENERATE_SYMBOLS", False),
+    ("BUS_NETS", {}),
+    ("MAZE_ROUTE", True),
+])
+def test_changed_setting_restarts_journal(tmp_path, monkeypatch, name, value):
+    files = gen_design.write_design(str(tmp_path / "d"), 30, seed=1)
+    doc = str(tmp_path / "out.json")
+    assert _render(files, doc) > 0
+    assert _render(files, doc) == 0  # 日志显示已画完
+
+    monkeypatch.setattr(c2v, name, value)
+    assert _render(files, doc) > 0
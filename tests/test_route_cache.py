@@ -0,0 +1,45 @@
+import contextlib
+import io
+
+import pytest
+
+import cadence_to_visio_V2 as c2v
+import gen_design
+
+
+@pytest.fixture
+def design(tmp_path):
+    inst_path, net_path = gen_design.write_design(str(tmp_path / "d"), 300, seed=1)
+    netlist = c2v.parse_netlist(net_path)
+    return c2v.complete_placement(c2v.parse_instances(inst_path), netlist), netlist
+
+
+def _route(instances, netlist, maze, cache):
+    pin_positions, bboxes = c2v.compute_placement(instances)
+    bus_nets = frozenset(bus["net"] for bus in c2v.plan_buses(bboxes))
+    config = dict(c2v.route_config(), maze=maze)
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        routed = c2v.route_all_nets(c2v.collect_net_points(netlist, pin_positions), bus_nets, 1, config,
+                                    c2v.build_obstacles(bboxes) if maze else None, cache)
+    return [r["wires"] for r in routed], out.getvalue()
+
+
+def test_plain_routing_skips_cache(design, tmp_path):
+    db = tmp_path / "cache.db"
+    _route(*design, maze=False, cache=str(db))
+    assert not db.exists()
+
+
+def test_maze_cache_hits_and_invalidates(design, tmp_path):
+    instances, netlist = design
+    db = str(tmp_path / "cache.db")
+    fresh, _ = _route(instances, netlist, True, None)
+    assert _route(instances, netlist, True, db)[0] == fresh
+    warm, stats = _route(instances, netlist, True, db)
+    assert warm == fresh and "未命中 0 个" in stats
+
+    # 挪动一个器件：取回的结果必须与重新布线一致
+    name = sorted(instances)[len(instances) // 2]
+    x, y = instances[name]["xy"]
+    instances[name] = dict(instances[name], xy=(x + c2v.to_dbu(0.5), y))
+    assert _route(instances, netlist, True, db)[0] == _route(instances, netlist, True, None)[0]
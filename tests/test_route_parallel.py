@@ -0,0 +1,32 @@
+import pytest
+
+import cadence_to_visio_V2 as c2v
+import gen_design
+
+
+@pytest.fixture(scope="module")
+def nets(tmp_path_factory):
+    inst_path, net_path = gen_design.write_design(str(tmp_path_factory.mktemp("d")), 300, seed=2)
+    netlist = c2v.parse_netlist(net_path)
+    instances = c2v.complete_placement(c2v.parse_instances(inst_path), netlist)
+    pin_positions, bboxes = c2v.compute_placement(instances)
+    bus_nets = frozenset(bus["net"] for bus in c2v.plan_buses(bboxes))
+    return c2v.collect_net_points(netlist, pin_positions), bus_nets, bboxes
+
+
+@pytest.mark.parametrize("maze", [False, True])
+def test_packed_chunk_matches_route_net(nets, maze):
+    net_to_points, bus_nets, bboxes = nets
+    config = dict(c2v.route_config(), maze=maze)
+    obstacles = c2v.build_obstacles(bboxes) if maze else None
+    chunk = list(net_to_points.items())
+    out = c2v.route_packed(*c2v.pack_nets(chunk, bus_nets), config, obstacles)
+    assert c2v.unpack_routes(chunk, bus_nets, out) == c2v.route_chunk(chunk, bus_nets, config, obstacles)
+
+
+def test_parallel_maze_routing_matches_serial(nets):
+    net_to_points, bus_nets, bboxes = nets
+    config = dict(c2v.route_config(), maze=True)
+    obstacles = c2v.build_obstacles(bboxes)
+    serial = c2v.route_all_nets(net_to_points, bus_nets, 1, config, obstacles)
+    assert c2v.route_all_nets(net_to_points, bus_nets, 2, config, obstacles) == serial
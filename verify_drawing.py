@@ -0,0 +1,254 @@
+import argparse
+import bisect
+import hashlib
+import json
+import re
+import time
+
+import cadence_to_visio_V2 as c2v
+
+# === 连接关系回读与核对 ===
+# GlueTo 失败只会打印一行 [Glue] ... 失败，画完之后无从确认图和网表是否一致。
+# 这里把所有连线两端的公式用一次 GetFormulasU 批量读回，
+# 从 PAR(PNT(Sheet.N!Connections.Xk, ...)) 解析出粘到了哪个形状的第几个连接点，
+# 用并查集得到图上的实际网络，再和网表的网络按签名比对：
+#   签名 = 网络里各 "器件:引脚" 的 64 位哈希之和，与顺序无关，整体是线性时间；
+#   签名一致的网络直接通过，只有不一致的才展开成差异：
+#     open  —— 网表里的一个网络在图上断成了几块（缺连接）
+#     short —— 图上的一块连通了网表里的多个网络（多连接）
+#     unglued —— 有端点没粘上的连线形状 ID
+# 合并后的折线（MERGE_WIRES）只在两端 Glue，中途经过的引脚按绘制的几何计入（on_wire 计数）。
+
+_GLUE_RE = re.compile(r"Sheet\.(\d+)!Connections\.X(\d+)")
+
+SEC_OBJECT, ROW_XFORM_1D = 1, 4  # visSectionObject, visRowXForm1D
+CELL_BEGIN_X, CELL_END_X = 0, 2  # visX1D, visX2D
+
+
+def _pin_hash(pin):
+    return int.from_bytes(hashlib.blake2b(pin.encode(), digest_size=8).digest(), "little")
+
+
+def signature(pins):
+    return f"{sum(_pin_hash(p) for p in pins) & (2**64 - 1):016x}"
+
+
+def parse_glue(formula):
+    """端点公式 -> (形状 ID, 连接点序号)；没粘上时返回 None"""
+    m = _GLUE_RE.search(formula or "")
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+
+def readback(page, line_ids):
+    """一次批量调用读回所有连线两端：{连线 ID: (起点, 终点)}；形状 ID 超出 MAX_BATCH_SID 的逐个读"""
+    batched = [sid for sid in line_ids if sid <= c2v.MAX_BATCH_SID]
+    ends = {}
+    if batched:
+        sid_src = []
+        for sid in batched:
+            sid_src += [sid, SEC_OBJECT, ROW_XFORM_1D, CELL_BEGIN_X]
+            sid_src += [sid, SEC_OBJECT, ROW_XFORM_1D, CELL_END_X]
+        formulas = page.GetFormulasU(c2v.com_array(sid_src, "I2"))
+        ends = {sid: (formulas[2*i], formulas[2*i + 1]) for i, sid in enumerate(batched)}
+    for sid in line_ids:
+        if sid > c2v.MAX_BATCH_SID:
+            shp = page.Shapes.ItemFromID(sid)
+            ends[sid] = tuple(shp.CellsSRC(SEC_OBJECT, ROW_XFORM_1D, cell).FormulaU
+                              for cell in (CELL_BEGIN_X, CELL_END_X))
+    return {sid: (parse_glue(ends[sid][0]), parse_glue(ends[sid][1])) for sid in line_ids}
+
+
+def expected_nets(netlist, drawn_devices):
+    """网表连接关系（只看画出来的器件和可 Glue 的引脚）：{网络名: {"器件:引脚"}}"""
+    nets = {}
+    for dev in netlist:
+        name = dev["name"]
+        if name not in drawn_devices:
+            continue
+        pin_names = c2v.DEVICE_LIBRARY[dev["type"]]["pins"]
+        for pin, net in dev["pins"].items():
+            if pin.upper() in c2v.EXCLUDED_PINS or net.upper() in c2v.EXCLUDED_NETS or pin not in pin_names:
+                continue
+            nets.setdefault(net, set()).add(f"{name}:{pin}")
+    return {net: pins for net, pins in nets.items() if len(pins) >= 2}
+
+
+def interior_pins(routed):
+    """每条连线中途经过（不含两端）的引脚：[[(器件, 类型, 引脚)], ...]，与 routed["wires"] 对齐"""
+    rows, cols = {}, {}
+    for dev, dtype, pin, (x, y) in routed["pins"]:
+        rows.setdefault(y, []).append((x, dev, dtype, pin))
+        cols.setdefault(x, []).append((y, dev, dtype, pin))
+    for line in (rows, cols):
+        for k, entries in line.items():
+            entries.sort()
+            line[k] = ([e[0] for e in entries], entries)
+
+    result = []
+    for pts, _, _, _ in routed["wires"]:
+        found = {}
+        for (x1, y1), (x2, y2) in zip(pts, pts[1:]):
+            if y1 == y2:
+                key, lo, hi, line, fixed = y1, min(x1, x2), max(x1, x2), rows, 1
+            elif x1 == x2:
+                key, lo, hi, line, fixed = x1, min(y1, y2), max(y1, y2), cols, 0
+            else:
+                continue  # 斜线（虚线）中途不经过引脚
+            if key not in line:
+                continue
+            coords, entries = line[key]
+            for c, dev, dtype, pin in entries[bisect.bisect_left(coords, lo):bisect.bisect_right(coords, hi)]:
+                pt = (c, key) if fixed else (key, c)
+                if pt != pts[0] and pt != pts[-1]:
+                    found[(dev, pin)] = (dev, dtype, pin)
+        result.append(list(found.values()))
+    return result
+
+
+def drawn_nets(glue, device_ids, bus_ids, on_wire=()):
+    """由回读结果得到图上的网络：[{"器件:引脚"}]；device_ids = {形状 ID: (器件名, 类型)}，bus_ids = {形状 ID: 网络名}；
+    on_wire = [(连线 ID, (形状 ID, 连接点序号))] 为几何上经过的引脚"""
+    parent = {}
+
+    def find(x):
+        root = x
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def node(end):
+        sid, k = end
+        if sid in bus_ids:
+            return ("bus", sid)  # 总线上所有连接点属于同一网络
+        return ("pin", sid, k)
+
+    for line_id, ends in glue.items():
+        for end in ends:
+            if end:
+                parent[find(("line", line_id))] = find(node(end))
+    for line_id, end in on_wire:
+        parent[find(("line", line_id))] = find(node(end))
+
+    groups = {}
+    for x in list(parent):
+        if x[0] != "pin" or x[1] not in device_ids:
+            continue
+        name, dev_type = device_ids[x[1]]
+        pin_list = list(c2v.DEVICE_LIBRARY[dev_type]["pins"])
+        if x[2] <= len(pin_list):
+            groups.setdefault(find(x), set()).add(f"{name}:{pin_list[x[2] - 1]}")
+    return [pins for pins in groups.values() if len(pins) >= 2]
+
+
+def compare(expected, drawn):
+    by_sig = {signature(pins): net for net, pins in expected.items()}
+    matched = set()
+    leftover = []
+    for pins in drawn:
+        net = by_sig.get(signature(pins))
+        if net is not None and net not in matched:
+            matched.add(net)
+        else:
+            leftover.append(pins)
+
+    net_of = {pin: net for net, pins in expected.items() if net not in matched for pin in pins}
+    group_of = {}
+    for i, pins in enumerate(leftover):
+        for pin in pins:
+            group_of[pin] = i
+
+    opens = []
+    for net, pins in expected.items():
+        if net in matched:
+            continue
+        split = {}
+        for pin in sorted(pins):
+            split.setdefault(group_of.get(pin), []).append(pin)
+        if len(split) > 1 or None in split:  # 整个网络落在一块里的情况由 short 报告
+            opens.append({"net": net, "signature": signature(pins), "groups": list(split.values())})
+
+    shorts = []
+    for pins in leftover:
+        nets = sorted({net_of.get(pin) or "" for pin in pins})
+        if len(nets) > 1 or nets == [""]:
+            shorts.append({"nets": nets, "signature": signature(pins), "pins": sorted(pins)})
+    return matched, opens, shorts
+
+
+def verify(page, netlist, shapes_map, drawn, bus_lines):
+    """核对绘制结果；drawn / bus_lines 来自 render_design。返回可直接写成 JSON 的差异"""
+    # Glue 时用的是网表里的器件类型，引脚序号也按它换算
+    dev_types = {dev["name"]: dev["type"] for dev in netlist}
+    device_ids = {shape.ID: (name, dev_types[name]) for name, shape in shapes_map.items()
+                  if dev_types.get(name) in c2v.DEVICE_LIBRARY}
+    bus_ids = {line.ID: net for net, (line, _, _) in bus_lines.items()}
+    drawn_ids = [[line.ID for line in lines] for _, lines in drawn]
+    line_ids = [sid for ids in drawn_ids for sid in ids]
+
+    shape_of = {name: sid for sid, (name, _) in device_ids.items()}
+    on_wire = []
+    for (routed, _), ids in zip(drawn, drawn_ids):
+        if routed["bus"]:
+            continue
+        for line_id, pins in zip(ids, interior_pins(routed)):
+            for dev, dtype, pin in pins:
+                pin_list = list(c2v.DEVICE_LIBRARY[dtype]["pins"])
+                if dev in shape_of and pin in pin_list:
+                    on_wire.append((line_id, (shape_of[dev], pin_list.index(pin) + 1)))
+
+    glue = readback(page, line_ids)
+    expected = expected_nets(netlist, set(shape_of))
+    drawn_groups = drawn_nets(glue, device_ids, bus_ids, on_wire)
+    matched, opens, shorts = compare(expected, drawn_groups)
+    unglued = [sid for sid, (begin, end) in glue.items() if begin is None or end is None]
+    return {
+        "ok": not opens and not shorts,
+        "expected_nets": len(expected),
+        "drawn_nets": len(drawn_groups),
+        "matched": len(matched),
+        "on_wire": len(on_wire),
+        "open": opens,
+        "short": shorts,
+        "unglued": unglued,
+    }
+
+
+def print_report(diff):
+    print(f"\n🔍 网表 {diff['expected_nets']} 个网络，图上 {diff['drawn_nets']} 个，一致 {diff['matched']} 个")
+    for item in diff["open"]:
+        print(f"  ❌ 断开 {item['net']}: " + " | ".join(" ".join(g) for g in item["groups"]))
+    for item in diff["short"]:
+        print(f"  ❌ 短接 {', '.join(n or '(无)' for n in item['nets'])}: {' '.join(item['pins'])}")
+    if diff["unglued"]:
+        print(f"  ⚠️  {len(diff['unglued'])} 条连线有端点没粘上")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="绘制后回读连接关系，与网表比对")
+    ap.add_argument("--inst-info", default=c2v.INPUT_FILE)
+    ap.add_argument("--netlist", default=c2v.NETLIST_FILE)
+    ap.add_argument("--stub", action="store_true", help="使用本地替身，不启动 Visio")
+    ap.add_argument("-o", "--output", default="verify.json", help="差异 JSON")
+    args = ap.parse_args()
+
+    visio = c2v.open_visio("stub" if args.stub else None)
+    visio.Visible = True
+    doc = visio.Documents.Add("")
+    masters = c2v.load_masters(visio)
+    netlist = c2v.parse_netlist(args.netlist)
+    shapes_map, drawn, bus_lines = c2v.render_design(doc.Pages(1), c2v.parse_instances(args.inst_info),
+                                                     netlist, masters)
+    t0 = time.perf_counter()
+    diff = verify(doc.Pages(1), netlist, shapes_map, drawn, bus_lines)
+    print_report(diff)
+    print(f"⏱️  核对用时 {time.perf_counter() - t0:.3f}s")
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(diff, f, ensure_ascii=False, indent=1)
+    if not diff["ok"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,532 @@
+import json
+import os
+
+# === Visio 本地替身 ===
+# 只实现 cadence_to_visio_V2.py 用到的那一小部分 COM 对象模型，
+# 方便在没有 Visio 的机器上（或 Linux 上）跑通整个流程并检查输出。
+# SaveAs 会把记录下来的形状写成 JSON，便于比对。
+
+STUB_MASTERS = ["NMOS", "PMOS", "R", "C", "Unknown", "Line"]
+
+# (Section, Row, Cell) -> 单元格名，供 SetResults 等批量接口使用
+SRC_NAMES = {
+    (1, 12, 0): "TxtPinX",
+    (1, 12, 1): "TxtPinY",
+    (1, 12, 2): "TxtWidth",
+    (1, 12, 3): "TxtHeight",
+    (1, 4, 0): "BeginX",
+    (1, 4, 1): "BeginY",
+    (1, 4, 2): "EndX",
+    (1, 4, 3): "EndY",
+    (1, 6, 0): "LayerMember",
+    (1, 2, 0): "LineWeight",
+    (1, 2, 2): "LinePattern",
+}
+
+LAYER_CELL_NAMES = {0: "Name", 2: "Color", 3: "Status", 4: "Visible", 5: "Print",
+                    6: "Active", 7: "Lock", 8: "Snap", 9: "Glue", 10: "ColorTrans"}
+
+
+def _conn_ref(cell):
+    # 连接点单元格 -> Visio 公式里的写法：Connections.X2 / 第 3 行（CellsSRC 7.3.x，visSectionConnectionPts = 7）-> Connections.X4
+    if cell.name.startswith("Connections."):
+        k = cell.name[len("Connections.") + 1:]
+    else:
+        k = int(cell.name.split(".")[1]) + 1
+    sheet = f"Sheet.{cell.shape.ID}!Connections"
+    return f"PAR(PNT({sheet}.X{k},{sheet}.Y{k}))"
+
+
+def _values(arr):
+    # 真实后端传入的是 win32com VARIANT，替身只需要里面的值
+    return list(getattr(arr, "value", arr))
+
+
+def _sid_src(arr):
+    # 与 Visio 一样，SID_SRC 是 16 位整数，放不下的形状 ID 直接报错
+    sid_src = _values(arr)
+    if any(v > 32767 for v in sid_src[::4]):
+        raise OverflowError("SID_SRC 里的形状 ID 超出 16 位整数范围")
+    return sid_src
+
+
+class StubCell:
+    def __init__(self, shape, name):
+        self.shape = shape
+        self.FormulaU = ""
+        self.ResultIU = 0.0
+        self.glued_to = None
+        self.name = name
+
+    def __setattr__(self, key, value):
+        object.__setattr__(self, key, value)
+        if key in ("FormulaU", "ResultIU") and "name" in self.__dict__:
+            self.shape.cells[self.name] = value
+            if key == "FormulaU":
+                # 纯数字公式顺便算出结果，其余（如 "1.2 pt"）保持原样
+                try:
+                    object.__setattr__(self, "ResultIU", float(value))
+                except ValueError:
+                    pass
+
+    def GlueTo(self, cell):
+        self.glued_to = cell
+        self.shape.glue[self.name] = (cell.shape.ID, cell.name)
+        # 与 Visio 一样，端点公式变成对连接点的引用
+        self.FormulaU = _conn_ref(cell)
+
+
+class StubShape:
+    def __init__(self, page, shape_id, master=None, one_d=False):
+        self.page = page
+        self.ID = shape_id
+        self.Master = master
+        self.OneD = one_d
+        self.Text = ""
+        self.LineStyle = ""
+        self.cells = {}
+        self.glue = {}
+        self._cell_objs = {}
+        self._rows = {}
+
+    def CellsU(self, name):
+        cell = self._cell_objs.get(name)
+        if cell is None:
+            cell = self._cell_objs[name] = StubCell(self, name)
+        return cell
+
+    def CellExistsU(self, name, fexist_locally):
+        return name in self.cells
+
+    def SectionExists(self, section, fexist_locally):
+        return section in self._rows
+
+    def AddSection(self, section):
+        self._rows.setdefault(section, 0)
+        return section
+
+    def AddRow(self, section, row, tag):
+        # 与 Visio 一样，没有的节要先 AddSection
+        if section not in self._rows:
+            raise ValueError(f"形状 {self.ID} 没有第 {section} 节")
+        rows = self._rows[section]
+        self._rows[section] = rows + 1
+        return rows
+
+    def CellsSRC(self, section, row, column):
+        # 与批量接口写同一个单元格
+        return self.CellsU(SRC_NAMES.get((section, row, column), f"{section}.{row}.{column}"))
+
+    def Delete(self):
+        self.page.Shapes.remove(self)
+        del self.page._by_id[self.ID]
+
+    def to_dict(self):
+        d = {
+            "id": self.ID,
+            "master": self.Master.NameU if self.Master else None,
+            "one_d": self.OneD,
+            "text": self.Text,
+            "cells": self.cells,
+            "glue": {k: list(v) for k, v in self.glue.items()},
+            "points": getattr(self, "points", None),
+        }
+        if self.LineStyle:
+            d["line_style"] = self.LineStyle
+        return d
+
+
+class StubStyle:
+    def __init__(self, name):
+        self.Name = name
+        self.NameU = name
+        self.cells = {}
+        self.glue = {}
+        self._cell_objs = {}
+
+    CellsU = StubShape.CellsU
+
+
+class StubLayer:
+    def __init__(self, name, index):
+        self.Name = name
+        self.NameU = name
+        self.Index = index
+        self.cells = {}
+        self.glue = {}
+        self._cell_objs = {}
+
+    CellsU = StubShape.CellsU
+
+    def CellsC(self, column):
+        return self.CellsU(LAYER_CELL_NAMES[column])
+
+
+class StubLayers:
+    def __init__(self):
+        self._layers = []
+
+    def Add(self, name):
+        layer = StubLayer(name, len(self._layers) + 1)
+        self._layers.append(layer)
+        return layer
+
+    def ItemU(self, name):
+        for layer in self._layers:
+            if layer.NameU == name:
+                return layer
+        raise KeyError(name)
+
+    def __call__(self, index):
+        return self._layers[index - 1]
+
+    Item = __call__
+
+    @property
+    def Count(self):
+        return len(self._layers)
+
+
+class StubStyles:
+    def __init__(self):
+        self._styles = {}
+
+    def Add(self, name, based_on, includes_text, includes_line, includes_fill):
+        style = self._styles[name] = StubStyle(name)
+        return style
+
+    def __call__(self, name):
+        return self._styles[name]
+
+    Item = __call__
+
+
+class StubMaster:
+    def __init__(self, name, cells=None):
+        self.Name = name
+        self.NameU = name
+        self.cells = cells or {}
+
+
+class StubShapes(list):
+    def __init__(self, page):
+        super().__init__()
+        self.page = page
+
+    def ItemFromID(self, shape_id):
+        return self.page._by_id[shape_id]
+
+    @property
+    def Count(self):
+        return len(self)
+
+
+class StubPage:
+    def __init__(self, app):
+        self.Application = app
+        self.Shapes = StubShapes(self)
+        self.Layers = StubLayers()
+        self._by_id = {}
+        self._next_id = 1
+
+    def _load(self, shapes):
+        # 按 to_dict 的格式还原形状，ID 保持不变
+        for d in shapes:
+            self._next_id = d["id"]
+            shp = self._add(StubMaster(d["master"]) if d["master"] else None, d["one_d"])
+            shp.Text = d["text"]
+            shp.LineStyle = d.get("line_style", "")
+            for name, value in d["cells"].items():
+                cell = shp.CellsU(name)
+                if isinstance(value, str):
+                    cell.FormulaU = value
+                else:
+                    cell.ResultIU = value
+                if name.startswith("7."):  # 连接点行
+                    row = int(name.split(".")[1])
+                    shp._rows[7] = max(shp._rows.get(7, 0), row + 1)
+            shp.glue = {k: tuple(v) for k, v in d["glue"].items()}
+            if d.get("points") is not None:
+                shp.points = d["points"]
+
+    def _add(self, master=None, one_d=False):
+        shp = StubShape(self, self._next_id, master, one_d)
+        self._next_id += 1
+        self.Shapes.append(shp)
+        self._by_id[shp.ID] = shp
+        return shp
+
+    def DrawPolyline(self, xy, flags):
+        xy = _values(xy)
+        shp = self._add(one_d=bool(flags & 8))
+        shp.CellsU("BeginX").ResultIU = xy[0]
+        shp.CellsU("BeginY").ResultIU = xy[1]
+        shp.CellsU("EndX").ResultIU = xy[-2]
+        shp.CellsU("EndY").ResultIU = xy[-1]
+        shp.points = xy
+        return shp
+
+    def GetFormulasU(self, sid_src):
+        sid_src = _sid_src(sid_src)
+        return tuple(self._by_id[sid].CellsU(SRC_NAMES[(sec, row, col)]).FormulaU
+                     for sid, sec, row, col in zip(*[iter(sid_src)] * 4))
+
+    def SetFormulas(self, sid_src, formulas, flags):
+        sid_src, formulas = _sid_src(sid_src), _values(formulas)
+        for i, formula in enumerate(formulas):
+            sid, sec, row, col = sid_src[4*i:4*i + 4]
+            self._by_id[sid].CellsU(SRC_NAMES[(sec, row, col)]).FormulaU = formula
+
+    def SetResults(self, sid_src, units, results, flags):
+        sid_src, results = _sid_src(sid_src), _values(results)
+        for i, value in enumerate(results):
+            sid, sec, row, col = sid_src[4*i:4*i + 4]
+            self._by_id[sid].CellsU(SRC_NAMES[(sec, row, col)]).ResultIU = value
+
+    def Drop(self, obj, x, y):
+        if obj is self.Application.ConnectorToolDataObject:
+            return self._add(one_d=True)
+        shp = self._add(master=obj)
+        shp.CellsU("PinX").ResultIU = x
+        shp.CellsU("PinY").ResultIU = y
+        return shp
+
+    def DrawLine(self, x1, y1, x2, y2):
+        shp = self._add(one_d=True)
+        shp.CellsU("BeginX").ResultIU = x1
+        shp.CellsU("BeginY").ResultIU = y1
+        shp.CellsU("EndX").ResultIU = x2
+        shp.CellsU("EndY").ResultIU = y2
+        return shp
+
+    def DrawRectangle(self, x1, y1, x2, y2):
+        shp = self._add()
+        shp.CellsU("PinX").ResultIU = (x1 + x2) / 2
+        shp.CellsU("PinY").ResultIU = (y1 + y2) / 2
+        shp.CellsU("Width").ResultIU = abs(x2 - x1)
+        shp.CellsU("Height").ResultIU = abs(y2 - y1)
+        return shp
+
+
+class StubPages:
+    def __init__(self, app, doc):
+        page = app.page_class(app)
+        page.Document = doc
+        self._pages = [page]
+
+    def __call__(self, index):
+        return self._pages[index - 1]
+
+    Item = __call__
+
+
+class StubMasters:
+    def __init__(self, names):
+        self._masters = [StubMaster(n) for n in names]
+        self._dropped = []  # 由形状拖进文档模具生成的 master，随文档保存
+
+    def __call__(self, name):
+        for master in self._masters:
+            if master.NameU == name:
+                return master
+        raise KeyError(name)
+
+    Item = ItemU = __call__
+
+    def Drop(self, shape, x, y):
+        master = StubMaster(f"Master.{len(self._masters) + 1}", dict(getattr(shape, "cells", {})))
+        self._masters.append(master)
+        self._dropped.append(master)
+        return master
+
+    @property
+    def Count(self):
+        return len(self._masters)
+
+
+class StubDocument:
+    def __init__(self, app, path="", masters=()):
+        self.Application = app
+        self.FullName = path
+        self.Pages = StubPages(app, self)
+        self.Masters = StubMasters(masters)
+        self.Styles = StubStyles()
+        self.Saved = False
+
+    def SaveAs(self, path):
+        self.FullName = path
+        page = self.Pages(1)
+        with open(path, "w", encoding="utf-8") as f:
+            data = {"shapes": [s.to_dict() for s in page.Shapes]}
+            if self.Styles._styles:
+                data["styles"] = {n: s.cells for n, s in self.Styles._styles.items()}
+            if page.Layers._layers:
+                data["layers"] = {layer.NameU: layer.cells for layer in page.Layers._layers}
+            if self.Masters._dropped:
+                data["masters"] = {m.NameU: m.cells for m in self.Masters._dropped}
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        self.Saved = True
+
+    def Save(self):
+        self.SaveAs(self.FullName)
+
+    def Close(self):
+        self.Application.Documents._docs.remove(self)
+
+
+class StubDocuments:
+    def __init__(self, app):
+        self.app = app
+        self._docs = []
+
+    def Add(self, template):
+        doc = StubDocument(self.app)
+        self._docs.append(doc)
+        self.app.ActiveDocument = doc
+        self.app.ActivePage = doc.Pages(1)
+        return doc
+
+    def Open(self, path):
+        # 重新打开 SaveAs 写出的 JSON
+        doc = StubDocument(self.app, os.path.abspath(path))
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        doc.Pages(1)._load(data["shapes"])
+        for name, cells in data.get("layers", {}).items():
+            layer = doc.Pages(1).Layers.Add(name)
+            for cell, formula in cells.items():
+                layer.CellsU(cell).FormulaU = formula
+        for name, cells in data.get("masters", {}).items():
+            master = doc.Masters.Drop(None, 0, 0)
+            master.Name = master.NameU = name
+            master.cells = cells
+        for name, cells in data.get("styles", {}).items():
+            style = doc.Styles.Add(name, "", 0, 1, 0)
+            for cell, formula in cells.items():
+                style.CellsU(cell).FormulaU = formula
+        doc.Saved = True
+        self._docs.append(doc)
+        self.app.ActiveDocument = doc
+        self.app.ActivePage = doc.Pages(1)
+        return doc
+
+    def OpenEx(self, path, flags):
+        # 模具只记录路径，Masters 固定为 circuit.vss 里的名称
+        doc = StubDocument(self.app, os.path.abspath(path), STUB_MASTERS)
+        self._docs.append(doc)
+        return doc
+
+    @property
+    def Count(self):
+        return len(self._docs)
+
+
+class StubApplication:
+    page_class = StubPage
+
+    def __init__(self):
+        self.Visible = False
+        self.ActiveDocument = None
+        self.ActivePage = None
+        self.ConnectorToolDataObject = object()
+        self.Documents = StubDocuments(self)
+
+    def Quit(self):
+        self.Documents._docs.clear()
+
+
+# === 空渲染器 ===
+# 接受同样的调用但什么都不记录，基准测试用它衡量绘制代码本身（不含 Visio）的开销。
+class _NullCell:
+    FormulaU = ""
+    ResultIU = 0.0
+
+    def __setattr__(self, key, value):
+        pass
+
+    def GlueTo(self, cell):
+        pass
+
+
+class NullShape:
+    ID = 0
+    Text = ""
+    OneD = False
+    Master = None
+    _cell = _NullCell()
+
+    def __setattr__(self, key, value):
+        pass
+
+    def CellsU(self, name):
+        return self._cell
+
+    def CellsSRC(self, section, row, column):
+        return self._cell
+
+    def CellExistsU(self, name, fexist_locally):
+        return False
+
+    def SectionExists(self, section, fexist_locally):
+        return False
+
+    def AddSection(self, section):
+        return section
+
+    def AddRow(self, section, row, tag):
+        return 0
+
+    def Delete(self):
+        pass
+
+
+class _NullLayer:
+    Index = 1
+    _cell = _NullCell()
+
+    def CellsC(self, column):
+        return self._cell
+
+
+class _NullLayers:
+    _layer = _NullLayer()
+
+    def Add(self, name):
+        return self._layer
+
+    def ItemU(self, name):
+        return self._layer
+
+
+class NullPage:
+    Shapes = ()
+    Layers = _NullLayers()
+
+    def __init__(self, app):
+        self.Application = app
+        self._shape = NullShape()
+
+    def Drop(self, obj, x, y):
+        return self._shape
+
+    def DrawLine(self, x1, y1, x2, y2):
+        return self._shape
+
+    def DrawPolyline(self, xy, flags):
+        return self._shape
+
+    def DrawRectangle(self, x1, y1, x2, y2):
+        return self._shape
+
+    def GetFormulasU(self, sid_src):
+        return ("",) * (len(_values(sid_src)) // 4)
+
+    def SetFormulas(self, sid_src, formulas, flags):
+        pass
+
+    def SetResults(self, sid_src, units, results, flags):
+        pass
+
+
+class NullApplication(StubApplication):
+    page_class = NullPage